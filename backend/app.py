@@ -1,9 +1,24 @@
 from fastapi import FastAPI
-from backend.core.logging_config import logger
-from backend.core.database import Base, engine
-from backend.models import user, uploaded_file
-from backend.routers import file_upload, users, analysis
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from backend.core.logging_config import CORRELATION_ID_HEADER, CorrelationIdMiddleware, logger
+from backend.models import user, uploaded_file, content_blob, analysis_cache, analysis_job, revoked_token
+from backend.routers import file_upload, users, analysis, jobs, monitoring
+from backend.core.database import async_engine, engine
+from backend.core.content_blobs import collect_garbage
+from backend.core.job_queue import job_queue
+from backend.core.jwt_auth import token_denylist
+from backend.core.metrics import (METRICS_ENABLED, MetricsMiddleware, instrument_engine, render_metrics,
+                                  runtime_sampler)
+from backend.core.passwords import password_hasher
+from fastapi.concurrency import run_in_threadpool
+from backend.core.vision_backend import close_backends
 from fastapi.middleware.cors import CORSMiddleware
+from backend.scripts.migrate import upgrade_database
+import os
+
+# Schema changes are applied with `python -m backend.scripts.migrate`, or on startup when enabled
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "false").lower() == "true"
 
 app = FastAPI()
 
@@ -13,17 +28,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", CORRELATION_ID_HEADER],
 )
+if METRICS_ENABLED:
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+    app.add_middleware(MetricsMiddleware)
+app.add_middleware(CorrelationIdMiddleware)
 
 
 app.include_router(file_upload.router, prefix='/api', tags=['File Management'])
 app.include_router(users.router, prefix='/api', tags=['User Management'])
 app.include_router(analysis.router, prefix='/api', tags=['Analysis Management'])
+app.include_router(jobs.router, prefix='/api', tags=['Job Management'])
+app.include_router(monitoring.router, prefix='/api', tags=['Monitoring'])
+
+
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
 
-Base.metadata.create_all(bind=engine)
 
 @app.on_event("startup")
 async def startup():
     logger.info('Start up called')
+    if DB_AUTO_MIGRATE:
+        await run_in_threadpool(upgrade_database)
+    await token_denylist.start()
+    # Content left unreferenced by deletes interrupted before their collection finished
+    await run_in_threadpool(collect_garbage)
+    await job_queue.start()
+    if METRICS_ENABLED:
+        await runtime_sampler.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await runtime_sampler.stop()
+    await job_queue.stop()
+    await token_denylist.stop()
+    await close_backends()
+    password_hasher.shutdown()
+    await async_engine.dispose()
 
 # app.include_router(routers.home.router)
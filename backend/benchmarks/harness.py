@@ -0,0 +1,223 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+import httpx
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SERVER_START_TIMEOUT_SECONDS = 60
+RSS_SAMPLE_INTERVAL_SECONDS = 0.05
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_rss(pid: int) -> Optional[int]:
+    """Resident memory of the process in bytes, through psutil when installed, otherwise from /proc (Linux)."""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class Server:
+    """A uvicorn process serving ``app`` on a free local port, its output goes to ``log_path``."""
+
+    def __init__(self, app: str, env: Dict[str, str], log_path: str, ready_path: str = "/docs"):
+        self.app = app
+        self.env = env
+        self.log_path = log_path
+        self.ready_path = ready_path
+        self.port = free_port()
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        with open(self.log_path, "ab") as log:
+            self.process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", self.app, "--host", "127.0.0.1", "--port", str(self.port),
+                 "--log-level", "warning", "--no-access-log"],
+                stdout=log, stderr=subprocess.STDOUT, env=self.env,
+            )
+        deadline = time.monotonic() + SERVER_START_TIMEOUT_SECONDS
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.app} exited on startup, see {self.log_path}:\n{self.log_tail()}")
+            try:
+                if httpx.get(self.url + self.ready_path, timeout=1).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"{self.app} did not start in {SERVER_START_TIMEOUT_SECONDS}s:\n{self.log_tail()}")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+    def log_tail(self, lines: int = 20) -> str:
+        with open(self.log_path, errors="replace") as log:
+            return "".join(log.readlines()[-lines:])
+
+    def __enter__(self) -> "Server":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class RssMonitor:
+    """Samples the resident memory of a process in a background thread and keeps the peak."""
+
+    def __init__(self, pid: int, interval: float = RSS_SAMPLE_INTERVAL_SECONDS):
+        self.pid = pid
+        self.interval = interval
+        self.peak: Optional[int] = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        rss = process_rss(self.pid)
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "RssMonitor":
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+        self._sample()
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear interpolation between the closest ranks, as numpy.percentile does by default."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    requests: int
+    concurrency: int
+    seconds: float
+    latencies_ms: List[float] = field(repr=False)
+    errors: int = 0
+    error_samples: List[str] = field(default_factory=list)
+    peak_rss_bytes: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        latencies = sorted(self.latencies_ms)
+        return {
+            "requests": self.requests,
+            "concurrency": self.concurrency,
+            "errors": self.errors,
+            "error_samples": self.error_samples,
+            "seconds": round(self.seconds, 3),
+            "throughput_rps": round(self.requests / self.seconds, 2) if self.seconds else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50), 2),
+                "p95": round(percentile(latencies, 95), 2),
+                "p99": round(percentile(latencies, 99), 2),
+                "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                "max": round(latencies[-1], 2) if latencies else 0.0,
+            },
+            "peak_rss_mb": round(self.peak_rss_bytes / 2 ** 20, 1) if self.peak_rss_bytes is not None else None,
+        }
+
+
+async def run_load(name: str, send: Callable[[int], Awaitable[httpx.Response]], requests: int,
+                   concurrency: int) -> ScenarioResult:
+    """
+    Sends ``requests`` requests, ``send(index)`` each, from ``concurrency`` concurrent workers (closed loop: every
+    worker sends its next request once the previous one is answered). Responses with a status of 400 or above count
+    as errors.
+    """
+    latencies: List[float] = []
+    errors: List[str] = []
+    next_index = iter(range(requests))
+
+    async def worker():
+        for index in next_index:
+            started = time.perf_counter()
+            try:
+                response = await send(index)
+                error = f"{response.status_code} {response.text[:200]}" if response.status_code >= 400 else None
+            except httpx.HTTPError as e:
+                error = f"{type(e).__name__}: {e}"
+            latencies.append((time.perf_counter() - started) * 1000)
+            if error is not None:
+                errors.append(error)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    return ScenarioResult(name=name, requests=requests, concurrency=concurrency,
+                          seconds=time.perf_counter() - started, latencies_ms=latencies, errors=len(errors),
+                          error_samples=sorted(set(errors))[:5])
+
+
+def benchmark_env(directory: str, openai_url: str) -> Dict[str, str]:
+    """Environment of the app under test: a fresh database and blob store, the mock OpenAI and no rate limits."""
+    return {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(directory, 'benchmark.sqlite3')}",
+        "ASYNC_DATABASE_URL": "",
+        "DB_AUTO_MIGRATE": "true",
+        "BLOB_STORE_BACKEND": "local",
+        "BLOB_STORE_PATH": os.path.join(directory, "blobs"),
+        "SECRET_KEY": "benchmark",
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "VISION_BACKEND": "openai",
+        "OPENAI_REQUESTS_PER_MINUTE": "1000000",
+        "OPENAI_TOKENS_PER_MINUTE": "1000000000",
+        "LOGIN_RATE_PER_IP_PER_MINUTE": "1000000",
+        "LOGIN_RATE_PER_ACCOUNT_PER_MINUTE": "1000000",
+        "LOGIN_BURST_PER_IP": "1000000",
+        "LOGIN_BURST_PER_ACCOUNT": "1000000",
+        "UPLOAD_USER_QUOTA_BYTES": "0",
+        "LOG_FILE": os.path.join(directory, "app.log"),
+        "LOG_LEVEL": "WARNING",
+    }
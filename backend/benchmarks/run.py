@@ -0,0 +1,153 @@
+"""
+Benchmark suite of the API: boots backend.app:app with uvicorn against a temporary database and blob store, with
+backend/testing/mock_openai.py in place of OpenAI, runs the scenarios one after another and reports throughput,
+p50/p95/p99 latency and the peak RSS of the app per scenario. Results are written as JSON and compared against a
+baseline, the exit code is 1 when a scenario regressed by more than the tolerance.
+
+Usage:
+    python -m backend.benchmarks.run [--scenarios login_burst,list_files_1k] [--scale 0.2]
+                                     [--output results.json] [--baseline backend/benchmarks/baseline.json]
+                                     [--save-baseline] [--tolerance 0.2] [--openai-latency-ms 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import List, Optional
+import httpx
+from backend.benchmarks.harness import RssMonitor, Server, benchmark_env, run_load
+from backend.benchmarks.scenarios import SCENARIOS, BenchmarkContext, Scenario
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+SEED = 2024
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_scenarios(scenarios: List[Scenario], scale: float, app: Server) -> dict:
+    results = {}
+    limits = httpx.Limits(max_connections=max(scenario.concurrency for scenario in scenarios))
+    async with httpx.AsyncClient(base_url=app.url, limits=limits, timeout=60) as client:
+        context = BenchmarkContext(client, SEED)
+        for scenario in scenarios:
+            requests = max(1, int(scenario.requests * scale))
+            print(f"{scenario.name}: {scenario.description}, {requests} requests, concurrency "
+                  f"{scenario.concurrency}", flush=True)
+            if scenario.setup is not None:
+                await scenario.setup(context, requests)
+            with RssMonitor(app.process.pid) as rss:
+                result = await run_load(scenario.name, lambda index: scenario.send(context, index), requests,
+                                        scenario.concurrency)
+            result.peak_rss_bytes = rss.peak
+            results[scenario.name] = result.to_dict()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of the results against the baseline: latency, throughput or memory worse than the tolerance."""
+    regressions = []
+    for name, result in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        for percentile in ("p50", "p95", "p99"):
+            current, previous = result["latency_ms"][percentile], base["latency_ms"][percentile]
+            if current > previous * (1 + tolerance):
+                regressions.append(f"{name}: {percentile} latency {previous} -> {current} ms")
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput_rps']} -> {result['throughput_rps']} req/s")
+        current_rss, previous_rss = result["peak_rss_mb"], base["peak_rss_mb"]
+        if current_rss and previous_rss and current_rss > previous_rss * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {base['peak_rss_mb']} -> {result['peak_rss_mb']} MB")
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {result['errors']}")
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"\n{'scenario':<20}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'RSS MB':>9}")
+    for name, result in results["scenarios"].items():
+        latency = result["latency_ms"]
+        print(f"{name:<20}{result['throughput_rps']:>10}{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}"
+              f"{result['errors']:>8}{str(result['peak_rss_mb']):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API benchmark scenarios")
+    parser.add_argument("--scenarios", help="Comma separated names, all by default: "
+                                            + ", ".join(scenario.name for scenario in SCENARIOS))
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplies the request count of every scenario")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--openai-latency-ms", type=int, default=200)
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS
+    if args.scenarios:
+        names = args.scenarios.split(",")
+        unknown = set(names) - {scenario.name for scenario in SCENARIOS}
+        if unknown:
+            parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name in names]
+
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as directory:
+        mock_env = {**os.environ, "MOCK_OPENAI_LATENCY_MS": str(args.openai_latency_ms)}
+        with Server("backend.testing.mock_openai:app", mock_env, os.path.join(directory, "mock_openai.log"),
+                    ready_path="/stats") as mock_openai:
+            with Server("backend.app:app", benchmark_env(directory, mock_openai.url),
+                        os.path.join(directory, "app.log")) as app:
+                scenario_results = asyncio.run(run_scenarios(scenarios, args.scale, app))
+
+    results = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "scale": args.scale,
+            "openai_latency_ms": args.openai_latency_ms,
+        },
+        "scenarios": scenario_results,
+    }
+    print_table(results)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to store one")
+        return
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline["meta"].get("scale") != args.scale:
+        print(f"Baseline was measured at scale {baseline['meta'].get('scale')}, latencies may not be comparable")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\nRegressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
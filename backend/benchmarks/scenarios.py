@@ -0,0 +1,145 @@
+import io
+import math
+import random
+import zipfile
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+import httpx
+from PIL import Image
+
+PASSWORD = "benchmark-password"
+LOGIN_USERS = 20
+
+
+def noise_png(size_bytes: int, seed: int) -> bytes:
+    """A PNG of random pixels of about ``size_bytes``: noise does not compress, so every seed gives new content."""
+    side = max(8, int(math.sqrt(size_bytes / 3)))
+    generator = random.Random(seed)
+    image = Image.frombytes("RGB", (side, side), generator.randbytes(side * side * 3))
+    output = io.BytesIO()
+    image.save(output, format="PNG", compress_level=1)
+    return output.getvalue()
+
+
+def png_archive(seeds: range, size_bytes: int) -> bytes:
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+        for index, seed in enumerate(seeds):
+            archive.writestr(f"chart_{index:05d}.png", noise_png(size_bytes, seed))
+    return output.getvalue()
+
+
+class BenchmarkContext:
+    """HTTP client of the app under test and helpers preparing the data of a scenario outside the measurement."""
+
+    def __init__(self, client: httpx.AsyncClient, seed: int):
+        self.client = client
+        self.seed = seed
+        self.state: Dict[str, object] = {}
+        self._users = 0
+        self._next_seed = seed * 1000000
+
+    def seeds(self, count: int) -> range:
+        """Seeds not used before in this run, for images of new content."""
+        self._next_seed += count
+        return range(self._next_seed - count, self._next_seed)
+
+    async def create_user(self) -> str:
+        """Registers a new user and returns their email."""
+        self._users += 1
+        email = f"bench{self.seed}-{self._users}@example.com"
+        response = await self.client.post("/api/register", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        return email
+
+    async def login(self, email: str) -> Dict[str, str]:
+        response = await self.client.post("/api/login", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def seed_files(self, headers: Dict[str, str], count: int, size_bytes: int = 256) -> List[int]:
+        """Uploads ``count`` distinct images through the bulk import and returns their ids."""
+        archive = png_archive(self.seeds(count), size_bytes)
+        response = await self.client.post("/api/files/bulk", headers=headers, timeout=600,
+                                          files={"file": ("seed.zip", archive, "application/zip")})
+        response.raise_for_status()
+        summary = response.json()
+        if summary["created"] != count:
+            raise RuntimeError(f"Seeding created {summary['created']} of {count} files: {summary['error']}")
+        return [result["file_id"] for result in summary["results"]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    requests: int
+    concurrency: int
+    send: Callable[[BenchmarkContext, int], Awaitable[httpx.Response]]
+    setup: Optional[Callable[[BenchmarkContext, int], Awaitable[None]]] = None  # (context, requests), not measured
+
+
+# --- LOGIN ---
+async def setup_login(context: BenchmarkContext, requests: int):
+    context.state["login_emails"] = [await context.create_user() for _ in range(LOGIN_USERS)]
+
+
+async def send_login(context: BenchmarkContext, index: int) -> httpx.Response:
+    emails = context.state["login_emails"]
+    return await context.client.post("/api/login", json={"email": emails[index % len(emails)], "password": PASSWORD})
+
+
+# --- UPLOADS ---
+def upload_scenario(name: str, size_bytes: int, requests: int, concurrency: int) -> Scenario:
+    async def setup(context: BenchmarkContext, count: int):
+        context.state[name] = {
+            "headers": await context.login(await context.create_user()),
+            "images": [noise_png(size_bytes, seed) for seed in context.seeds(count)],
+        }
+
+    async def send(context: BenchmarkContext, index: int) -> httpx.Response:
+        state = context.state[name]
+        return await context.client.post("/api/files/upload", headers=state["headers"],
+                                         files={"file": (f"upload_{index}.png", state["images"][index], "image/png")})
+
+    return Scenario(name, f"Multipart upload of distinct {size_bytes // 1024} KB images", requests, concurrency,
+                    send, setup)
+
+
+# --- LISTING ---
+def listing_scenario(name: str, files: int, requests: int, concurrency: int) -> Scenario:
+    async def setup(context: BenchmarkContext, count: int):
+        headers = await context.login(await context.create_user())
+        await context.seed_files(headers, files)
+        context.state[name] = headers
+
+    async def send(context: BenchmarkContext, index: int) -> httpx.Response:
+        return await context.client.get("/api/user_files", headers=context.state[name])
+
+    return Scenario(name, f"First page of the file list of a user with {files} files, with thumbnails", requests,
+                    concurrency, send, setup)
+
+
+# --- ANALYSES ---
+async def setup_analyses(context: BenchmarkContext, requests: int):
+    headers = await context.login(await context.create_user())
+    # Noise images have unrelated perceptual hashes, every analysis reaches the (mock) model
+    context.state["analysis_file_ids"] = await context.seed_files(headers, requests, size_bytes=12288)
+
+
+async def send_analysis(context: BenchmarkContext, index: int) -> httpx.Response:
+    file_id = context.state["analysis_file_ids"][index]
+    return await context.client.post(f"/api/analyze_file/{file_id}", timeout=120)
+
+
+SCENARIOS = [
+    Scenario("login_burst", f"Concurrent logins of {LOGIN_USERS} users (bcrypt)", 200, 50, send_login, setup_login),
+    upload_scenario("upload_10kb", 10 * 1024, 200, 10),
+    upload_scenario("upload_1mb", 1024 * 1024, 50, 10),
+    upload_scenario("upload_5mb", 5 * 1024 * 1024, 20, 5),
+    listing_scenario("list_files_10", 10, 300, 20),
+    listing_scenario("list_files_1k", 1000, 300, 20),
+    listing_scenario("list_files_10k", 10000, 300, 20),
+    Scenario("analyze_concurrent", "Concurrent analyses of distinct images through the mock OpenAI", 100, 50,
+             send_analysis, setup_analyses),
+]
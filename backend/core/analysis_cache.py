@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from backend.core.logging_config import logger
+from backend.core.metrics import register_cache
+from backend.models.analysis_cache import AnalysisCacheEntry
+
+load_dotenv()
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "10000"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    # Default prompts are indented triple-quoted strings, whitespace differences must not cause cache misses
+    return " ".join(prompt.split())
+
+
+class AnalysisCache:
+    """
+    Persistent cache of model answers, stored in the ``analysis_cache`` table. Entries expire after ``ttl_seconds``
+    and the least recently used ones are evicted once there are more than ``max_entries``.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.near_duplicate_hits = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(file_hash: str, prompt: str, description: Optional[str], model: str, max_tokens: int) -> str:
+        key_data = json.dumps([file_hash, normalize_prompt(prompt), description, model, max_tokens])
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, db: Session, cache_key: str) -> Optional[str]:
+        entry = db.query(AnalysisCacheEntry).filter(AnalysisCacheEntry.cache_key == cache_key).first()
+        now = datetime.now()
+        if entry is None or entry.created_at + self.ttl < now:
+            if entry is not None:
+                db.delete(entry)
+                db.commit()
+            self._count(hit=False)
+            return None
+
+        entry.last_accessed_at = now
+        entry.hit_count += 1
+        result = entry.result
+        db.commit()
+        self._count(hit=True)
+        return result
+
+    def count_near_duplicate_hits(self, hits: int):
+        with self._lock:
+            self.near_duplicate_hits += hits
+
+    def get_many(self, db: Session, cache_keys: List[str], count: bool = True) -> Dict[str, str]:
+        """
+        Looks several keys up in one query, returns only the fresh hits. Lookups made with ``count=False`` do not
+        count as hits or misses.
+        """
+        if not cache_keys:
+            return {}
+        now = datetime.now()
+        entries = db.query(AnalysisCacheEntry).filter(AnalysisCacheEntry.cache_key.in_(cache_keys)).all()
+        results = {}
+        for entry in entries:
+            if entry.created_at + self.ttl >= now:
+                entry.last_accessed_at = now
+                entry.hit_count += 1
+                results[entry.cache_key] = entry.result
+        db.commit()
+        if count:
+            with self._lock:
+                self.hits += len(results)
+                self.misses += len(cache_keys) - len(results)
+        return results
+
+    def set(self, db: Session, cache_key: str, file_hash: str, model: str, result: str):
+        now = datetime.now()
+        db.merge(AnalysisCacheEntry(
+            cache_key=cache_key,
+            file_hash=file_hash,
+            model=model,
+            result=result,
+            created_at=now,
+            last_accessed_at=now,
+            hit_count=0,
+        ))
+        db.commit()
+        self.evict(db)
+
+    def set_many(self, db: Session, entries: List[dict]):
+        """Stores several results in one transaction, each entry has cache_key, file_hash, model and result."""
+        now = datetime.now()
+        for entry in entries:
+            db.merge(AnalysisCacheEntry(created_at=now, last_accessed_at=now, hit_count=0, **entry))
+        db.commit()
+        self.evict(db)
+
+    def evict(self, db: Session):
+        expired = (
+            db.query(AnalysisCacheEntry)
+            .filter(AnalysisCacheEntry.created_at < datetime.now() - self.ttl)
+            .delete(synchronize_session=False)
+        )
+        surplus = db.query(AnalysisCacheEntry).count() - self.max_entries
+        evicted = 0
+        if surplus > 0:
+            oldest = (
+                db.query(AnalysisCacheEntry.cache_key)
+                .order_by(AnalysisCacheEntry.last_accessed_at)
+                .limit(surplus)
+                .subquery()
+            )
+            evicted = (
+                db.query(AnalysisCacheEntry)
+                .filter(AnalysisCacheEntry.cache_key.in_(oldest.select()))
+                .delete(synchronize_session=False)
+            )
+        db.commit()
+        if expired or evicted:
+            with self._lock:
+                self.evictions += expired + evicted
+            logger.info("Analysis cache evicted %s expired and %s least recently used entries", expired, evicted)
+
+    def stats(self, db: Session) -> dict:
+        with self._lock:
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+            near_duplicate_hits = self.near_duplicate_hits
+        lookups = hits + misses
+        return {
+            "entries": db.query(AnalysisCacheEntry).count(),
+            "max_entries": self.max_entries,
+            "ttl_seconds": int(self.ttl.total_seconds()),
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "near_duplicate_hits": near_duplicate_hits,
+        }
+
+
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_TTL_SECONDS, ANALYSIS_CACHE_MAX_ENTRIES)
+register_cache("analysis", analysis_cache)
@@ -0,0 +1,309 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+from typing import Iterator, Optional
+from dotenv import load_dotenv
+from sqlalchemy import inspect
+from backend.core.database import SessionLocal
+from backend.core.logging_config import logger
+from backend.models.uploaded_file import UploadedFile
+
+load_dotenv()
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")  # "local" or "s3"
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", "./database/blobs")
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_PREFIX = os.getenv("S3_PREFIX", "blobs/")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://127.0.0.1:9000 for a local MinIO/moto server
+S3_REGION = os.getenv("S3_REGION")
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobNotFoundError(Exception):
+    pass
+
+
+class BlobStore:
+    """
+    Content-addressed storage for uploaded file bytes. Keys are SHA-256 hex digests (``UploadedFile.file_hash``),
+    optionally followed by a variant suffix.
+    """
+
+    def put(self, key: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def put_file(self, key: str, path: str) -> None:
+        """Stores the content of the file at ``path`` without reading it into memory. The file is consumed."""
+        raise NotImplementedError
+
+    def spool_directory(self) -> Optional[str]:
+        """Where uploads are spooled before ``put_file``, None for the system temporary directory."""
+        return None
+
+    def get(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def delete_variants(self, key: str) -> None:
+        """Deletes every derived blob stored as ``<key>.<variant>`` (thumbnails, resized copies)."""
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yields the bytes ``start..end`` (inclusive) of a blob in chunks, without loading it whole into memory."""
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Stores every blob as a single file under ``root``, sharded by the leading characters of the key
+    (``ab/cd/abcd...``) so that no directory grows beyond a few hundred entries.
+    """
+
+    def __init__(self, root: str, depth: int = 2, width: int = 2):
+        self.root = root
+        self.depth = depth
+        self.width = width
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        shards = [key[i * self.width:(i + 1) * self.width] for i in range(self.depth)]
+        return os.path.join(self.root, *shards, key)
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            return  # Content-addressed: same key means same bytes
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so readers never see a partially written blob
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_file(self, key: str, path: str) -> None:
+        target = self._path(key)
+        if os.path.exists(target):
+            os.remove(path)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            # Spool files live under the same root, so this is an atomic rename
+            os.replace(path, target)
+        except OSError:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".tmp-")
+            os.close(fd)
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, target)
+            os.remove(path)
+
+    def spool_directory(self) -> Optional[str]:
+        directory = os.path.join(self.root, ".spool")
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def get(self, key: str) -> bytes:
+        try:
+            with open(self._path(key), "rb") as blob_file:
+                return blob_file.read()
+        except FileNotFoundError:
+            raise BlobNotFoundError(key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def size(self, key: str) -> int:
+        try:
+            return os.path.getsize(self._path(key))
+        except FileNotFoundError:
+            raise BlobNotFoundError(key)
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        try:
+            blob_file = open(self._path(key), "rb")
+        except FileNotFoundError:
+            raise BlobNotFoundError(key)
+        with blob_file:
+            blob_file.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = blob_file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def delete_variants(self, key: str) -> None:
+        # Variants share the key prefix, so they always live in the same shard directory
+        directory = os.path.dirname(self._path(key))
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.startswith(f"{key}."):
+                self.delete(name)
+
+
+class S3BlobStore(BlobStore):
+    """
+    Stores blobs in an S3-compatible bucket. Setting ``endpoint_url`` points it at any compatible server,
+    e.g. a local MinIO or moto instance for development and tests.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region_name: Optional[str] = None):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("boto3 is required for BLOB_STORE_BACKEND=s3. Install it with 'pip install boto3'")
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client_error = ClientError
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region_name)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _is_not_found(self, error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def put(self, key: str, data: bytes) -> None:
+        if self.exists(key):
+            return
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def put_file(self, key: str, path: str) -> None:
+        try:
+            if not self.exists(key):
+                # Managed transfer, large files are sent as a multipart upload in bounded chunks
+                self.client.upload_file(path, self.bucket, self._key(key))
+        finally:
+            os.remove(path)
+
+    def get(self, key: str) -> bytes:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except self._client_error as e:
+            if self._is_not_found(e):
+                raise BlobNotFoundError(key)
+            raise
+        return response["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except self._client_error as e:
+            if self._is_not_found(e):
+                return False
+            raise
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def size(self, key: str) -> int:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))["ContentLength"]
+        except self._client_error as e:
+            if self._is_not_found(e):
+                raise BlobNotFoundError(key)
+            raise
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key), Range=byte_range)
+        except self._client_error as e:
+            if self._is_not_found(e):
+                raise BlobNotFoundError(key)
+            raise
+        yield from response["Body"].iter_chunks(chunk_size)
+
+    def delete_variants(self, key: str) -> None:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(f"{key}.")):
+            objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+
+
+@lru_cache(maxsize=1)
+def get_blob_store() -> BlobStore:
+    if BLOB_STORE_BACKEND == "local":
+        logger.info("Using local blob store at %s", BLOB_STORE_PATH)
+        return LocalBlobStore(BLOB_STORE_PATH)
+    if BLOB_STORE_BACKEND == "s3":
+        if not S3_BUCKET:
+            raise RuntimeError("S3_BUCKET is not set in environment variable")
+        logger.info("Using S3 blob store, bucket: %s, endpoint: %s", S3_BUCKET, S3_ENDPOINT_URL or "AWS")
+        return S3BlobStore(S3_BUCKET, prefix=S3_PREFIX, endpoint_url=S3_ENDPOINT_URL, region_name=S3_REGION)
+    raise RuntimeError(f"Unknown BLOB_STORE_BACKEND: {BLOB_STORE_BACKEND}")
+
+
+def legacy_file_data(uploaded_file) -> Optional[bytes]:
+    """
+    Bytes kept in the deferred legacy ``file_data`` column. Rows loaded by an ``AsyncSession`` cannot lazy load
+    outside the event loop, so the column is read with a short-lived sync session when it was not loaded.
+    """
+    if "file_data" not in inspect(uploaded_file).unloaded:
+        return uploaded_file.file_data
+    with SessionLocal() as db:
+        return db.query(UploadedFile.file_data).filter(UploadedFile.id == uploaded_file.id).scalar()
+
+
+def ensure_blob(uploaded_file) -> str:
+    """
+    Makes sure the bytes of an uploaded file are in the blob store, moving them out of the legacy
+    ``file_data`` column if needed. Returns the blob key. Legacy bytes that do not hash to ``file_hash`` are not
+    stored under it, like in scripts/migrate_blobs.py.
+    """
+    store = get_blob_store()
+    if not store.exists(uploaded_file.file_hash):
+        file_data = legacy_file_data(uploaded_file)
+        if not file_data:
+            raise BlobNotFoundError(uploaded_file.file_hash)
+        actual_hash = hashlib.sha256(file_data).hexdigest()
+        if actual_hash != uploaded_file.file_hash:
+            logger.error("File %s has hash %s, stored as %s, not moved to blob store", uploaded_file.id, actual_hash,
+                         uploaded_file.file_hash)
+            raise BlobNotFoundError(uploaded_file.file_hash)
+        store.put(uploaded_file.file_hash, file_data)
+    return uploaded_file.file_hash
+
+
+def read_file_data(uploaded_file) -> bytes:
+    """
+    Returns the bytes of an uploaded file. Rows that were not migrated yet still keep their bytes
+    in the deferred ``file_data`` column, which is only loaded in that case.
+    """
+    try:
+        return get_blob_store().get(uploaded_file.file_hash)
+    except BlobNotFoundError:
+        file_data = legacy_file_data(uploaded_file)
+        if file_data:
+            return file_data
+        raise
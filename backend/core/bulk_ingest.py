@@ -0,0 +1,411 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import posixpath
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from backend.core.blob_store import get_blob_store
+from backend.core.content_blobs import (ADD_REFERENCE_ATTEMPTS, BlobCollectingError, add_references,
+                                        ensure_content_stored, shared_blobs)
+from backend.core.database import SessionLocal
+from backend.core.images import create_thumbnail, detect_mime_type, format_perceptual_hash, perceptual_hash
+from backend.core.job_queue import job_queue
+from backend.core.logging_config import logger
+from backend.core.uploads import IMAGE_TYPE_ERROR, MAGIC_BYTES_LENGTH, UPLOAD_MAX_FILE_BYTES
+from backend.models.uploaded_file import UploadedFile
+
+load_dotenv()
+BULK_INGEST_WORKERS = int(os.getenv("BULK_INGEST_WORKERS", str(min(8, os.cpu_count() or 1))))
+# A batch is hashed, looked up and inserted together; it is flushed at whichever of the two limits is hit first
+BULK_INGEST_BATCH_SIZE = int(os.getenv("BULK_INGEST_BATCH_SIZE", "500"))
+BULK_INGEST_BATCH_BYTES = int(os.getenv("BULK_INGEST_BATCH_BYTES", str(64 * 1024 * 1024)))
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "10000"))
+BULK_MAX_ARCHIVE_BYTES = int(os.getenv("BULK_MAX_ARCHIVE_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+ARCHIVE_HEAD_LENGTH = 262  # The tar "ustar" magic is at offset 257
+ARCHIVE_TYPE_ERROR = "Uploaded file is not a zip or tar archive."
+MANIFEST_NAMES = ("manifest.jsonl", "manifest.csv")
+
+ARCHIVE_MAGIC_BYTES = (
+    (b"PK\x03\x04", "application/zip"),
+    (b"PK\x05\x06", "application/zip"),  # Empty zip
+    (b"\x1f\x8b", "application/gzip"),
+    (b"BZh", "application/x-bzip2"),
+    (b"\xfd7zXZ\x00", "application/x-xz"),
+)
+
+
+@dataclass
+class IngestItem:
+    """One file of a bulk import. ``read`` returns its bytes, ``size`` is the size declared by the archive."""
+    name: str
+    file_name: str
+    read: Callable[[], bytes]
+    size: Optional[int] = None
+    uploaded_text: Optional[str] = None
+
+
+@dataclass
+class IngestResult:
+    name: str
+    status: str  # created, duplicate, invalid, too_large, quota_exceeded or failed
+    file_id: Optional[int] = None
+    file_hash: Optional[str] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+
+
+def detect_archive_type(head: bytes) -> Optional[str]:
+    for magic, mime_type in ARCHIVE_MAGIC_BYTES:
+        if head.startswith(magic):
+            return mime_type
+    if head[257:262] == b"ustar":
+        return "application/x-tar"
+    return None
+
+
+# --- ITEM SOURCES ---
+def member_name(name: str) -> str:
+    """Normalized path of an archive member or manifest entry, e.g. ``./charts/a.png`` becomes ``charts/a.png``."""
+    return posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+
+
+def is_ignored(name: str) -> bool:
+    """Directories, hidden files and macOS resource forks are not imported."""
+    parts = member_name(name).split("/")
+    return not parts[-1] or any(part.startswith(".") or part == "__MACOSX" for part in parts)
+
+
+def parse_manifest(data: bytes, manifest_name: str) -> List[dict]:
+    """
+    Manifest entries, as JSON lines or CSV with a header, each with ``path`` and optional ``file_name`` and
+    ``uploaded_text``.
+    """
+    text = data.decode("utf-8-sig")
+    if manifest_name.endswith(".csv"):
+        entries = list(csv.DictReader(io.StringIO(text)))
+    else:
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+    for entry in entries:
+        if not entry.get("path"):
+            raise ValueError(f"Manifest entry without path: {entry}")
+    return entries
+
+
+def apply_manifest(items: Iterable[IngestItem], entries: List[dict]) -> Iterator[IngestItem]:
+    metadata = {member_name(entry["path"]): entry for entry in entries}
+    for item in items:
+        entry = metadata.get(item.name)
+        if entry:
+            item.file_name = entry.get("file_name") or item.file_name
+            item.uploaded_text = entry.get("uploaded_text") or None
+        yield item
+
+
+def iter_zip_items(path: str) -> Iterator[IngestItem]:
+    with zipfile.ZipFile(path) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir() and not is_ignored(info.filename)]
+        manifest = next((info for info in members if member_name(info.filename) in MANIFEST_NAMES), None)
+        items = (
+            IngestItem(name=member_name(info.filename), file_name=posixpath.basename(info.filename),
+                       size=info.file_size, read=lambda info=info: archive.read(info))
+            for info in members if info is not manifest
+        )
+        if manifest:
+            items = apply_manifest(items, parse_manifest(archive.read(manifest), manifest.filename))
+        yield from items
+
+
+def iter_tar_items(path: str) -> Iterator[IngestItem]:
+    # Random access mode, members are read in archive order so compressed archives are still decompressed once
+    with tarfile.open(path, "r:*") as archive:
+        members = [member for member in archive.getmembers() if member.isfile() and not is_ignored(member.name)]
+        manifest = next((member for member in members if member_name(member.name) in MANIFEST_NAMES), None)
+        items = (
+            IngestItem(name=member_name(member.name), file_name=posixpath.basename(member.name),
+                       size=member.size, read=lambda member=member: archive.extractfile(member).read())
+            for member in members if member is not manifest
+        )
+        if manifest:
+            items = apply_manifest(items, parse_manifest(archive.extractfile(manifest).read(),
+                                                         manifest.name))
+        yield from items
+
+
+def read_local_file(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def iter_directory_items(root: str) -> Iterator[IngestItem]:
+    for directory, subdirectories, file_names in os.walk(root):
+        subdirectories[:] = sorted(name for name in subdirectories if not is_ignored(name))
+        for file_name in sorted(file_names):
+            path = os.path.join(directory, file_name)
+            name = os.path.relpath(path, root).replace(os.sep, "/")
+            if is_ignored(name) or name in MANIFEST_NAMES:
+                continue
+            yield IngestItem(name=name, file_name=file_name, size=os.path.getsize(path),
+                             read=lambda path=path: read_local_file(path))
+
+
+def iter_manifest_items(manifest_path: str) -> Iterator[IngestItem]:
+    """Files listed in a manifest, paths are relative to the manifest's directory."""
+    root = os.path.dirname(os.path.abspath(manifest_path))
+    for entry in parse_manifest(read_local_file(manifest_path), manifest_path):
+        path = os.path.join(root, entry["path"])
+        yield IngestItem(name=entry["path"], file_name=entry.get("file_name") or os.path.basename(path),
+                         uploaded_text=entry.get("uploaded_text") or None,
+                         size=os.path.getsize(path) if os.path.isfile(path) else None,
+                         read=lambda path=path: read_local_file(path))
+
+
+def iter_archive_items(path: str) -> Iterator[IngestItem]:
+    with open(path, "rb") as file:
+        archive_type = detect_archive_type(file.read(ARCHIVE_HEAD_LENGTH))
+    if archive_type == "application/zip":
+        return iter_zip_items(path)
+    if archive_type is not None:
+        return iter_tar_items(path)
+    raise ValueError(ARCHIVE_TYPE_ERROR)
+
+
+def iter_source_items(path: str) -> Iterator[IngestItem]:
+    """Items of an archive, a directory (with an optional manifest) or a manifest file."""
+    if os.path.isdir(path):
+        for manifest_name in MANIFEST_NAMES:
+            manifest_path = os.path.join(path, manifest_name)
+            if os.path.isfile(manifest_path):
+                return iter_manifest_items(manifest_path)
+        return iter_directory_items(path)
+    if path.endswith((".jsonl", ".csv")):
+        return iter_manifest_items(path)
+    return iter_archive_items(path)
+
+
+# --- INGESTION ---
+class BulkIngestor:
+    """
+    Imports files in batches: the bytes of a batch are read sequentially (archives decompress as a stream), then
+    hashed and checked in a thread pool, duplicates are found with a single ``file_hash IN (...)`` lookup on the
+    owner's (owner_id, file_hash) index, new blobs and thumbnails are written in parallel (content other users
+    already uploaded is only referenced) and the rows of the whole batch are inserted in one transaction. Analysis
+    of the new files is optionally enqueued per batch.
+    """
+
+    def __init__(self, owner_id: int, max_file_bytes: int = UPLOAD_MAX_FILE_BYTES,
+                 quota_bytes: Optional[int] = None, analysis_job: Optional[str] = None,
+                 job_parameters: Optional[dict] = None, workers: int = BULK_INGEST_WORKERS,
+                 batch_size: int = BULK_INGEST_BATCH_SIZE, batch_bytes: int = BULK_INGEST_BATCH_BYTES,
+                 max_files: int = BULK_MAX_FILES):
+        self.owner_id = owner_id
+        self.max_file_bytes = max_file_bytes
+        self.remaining_quota = quota_bytes
+        self.analysis_job = analysis_job
+        self.job_parameters = job_parameters or {}
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.max_files = max_files
+        self.results: List[IngestResult] = []
+        self.job_ids: List[str] = []
+        # Hashes of this import already stored, so repeated files in one archive become duplicates
+        self._seen: Dict[str, Optional[int]] = {}
+
+    def run(self, items: Iterable[IngestItem]) -> dict:
+        started = time.perf_counter()
+        error = None
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="bulk-ingest") as pool:
+            batch, batch_bytes = [], 0
+            try:
+                for count, item in enumerate(items, start=1):
+                    if count > self.max_files:
+                        raise ValueError(f"Import has more than the allowed {self.max_files} files.")
+                    data = self._read(item)
+                    if data is None:
+                        continue
+                    batch.append((item, data))
+                    batch_bytes += len(data)
+                    if len(batch) >= self.batch_size or batch_bytes >= self.batch_bytes:
+                        self._ingest_batch(pool, batch)
+                        batch, batch_bytes = [], 0
+            except (ValueError, OSError, EOFError, zipfile.BadZipFile, tarfile.TarError) as e:
+                # A corrupt or oversized source stops the import, files of the committed batches stay imported
+                logger.error("Bulk import of user %s stopped: %s", self.owner_id, e)
+                error = str(e)
+            if batch:
+                self._ingest_batch(pool, batch)
+        return self.summary(time.perf_counter() - started, error)
+
+    def _read(self, item: IngestItem) -> Optional[bytes]:
+        # The declared size is checked first, a small archive must not expand to huge files in memory
+        if item.size is not None and item.size > self.max_file_bytes:
+            self._fail(item, "too_large", f"File is larger than the allowed {self.max_file_bytes} bytes.")
+            return None
+        try:
+            data = item.read()
+        except Exception as e:
+            self._fail(item, "failed", f"Failed to read file: {e}")
+            return None
+        if len(data) > self.max_file_bytes:
+            self._fail(item, "too_large", f"File is larger than the allowed {self.max_file_bytes} bytes.")
+            return None
+        return data
+
+    def _fail(self, item: IngestItem, status: str, error: str, file_hash: Optional[str] = None,
+              size: Optional[int] = None):
+        self.results.append(IngestResult(name=item.name, status=status, file_hash=file_hash, size=size, error=error))
+
+    def _ingest_batch(self, pool: ThreadPoolExecutor, batch: list):
+        hashed = list(pool.map(lambda entry: (*entry, hashlib.sha256(entry[1]).hexdigest()), batch))
+        valid = []
+        for item, data, file_hash in hashed:
+            if detect_mime_type(data[:MAGIC_BYTES_LENGTH]) is None:
+                self._fail(item, "invalid", IMAGE_TYPE_ERROR, file_hash, len(data))
+            else:
+                valid.append((item, data, file_hash))
+
+        file_hashes = list({file_hash for _, _, file_hash in valid if file_hash not in self._seen})
+        with SessionLocal() as db:
+            existing = self._existing_ids(db, file_hashes)
+            shared = shared_blobs(db, [file_hash for file_hash in file_hashes if file_hash not in existing])
+        new_files = self._select_new_files(valid, existing)
+
+        # No session is held while images are processed. Content other users uploaded is only referenced.
+        to_store = [entry for entry in new_files if entry[2] not in shared]
+        outcomes = dict(zip((file_hash for _, _, file_hash in to_store), pool.map(self._store, to_store)))
+        errors = {file_hash: error for file_hash, (error, _) in outcomes.items() if error is not None}
+        phashes = {file_hash: phash for file_hash, (_, phash) in outcomes.items() if phash is not None}
+        stored = []
+        for entry in new_files:
+            item, data, file_hash = entry
+            if file_hash not in errors:
+                stored.append(entry)
+                continue
+            self._seen.pop(file_hash)
+            if self.remaining_quota is not None:
+                self.remaining_quota += len(data)
+            self._fail(item, "invalid", errors[file_hash], file_hash, len(data))
+
+        with SessionLocal() as db:
+            created = self._insert(db, stored, phashes)
+            if self.analysis_job and created:
+                jobs = job_queue.enqueue_many(db, self.analysis_job, list(created.values()), **self.job_parameters)
+                self.job_ids.extend(job.id for job in jobs)
+        list(pool.map(lambda entry: ensure_content_stored(entry[2], entry[1]),
+                      [entry for entry in stored if entry[2] in created]))
+        logger.info("Bulk import of user %s: batch of %s files, %s created", self.owner_id, len(batch), len(created))
+
+    def _existing_ids(self, db, file_hashes: List[str]) -> Dict[str, int]:
+        """Ids of the owner's files with the given hashes, files of other users are not duplicates."""
+        if not file_hashes:
+            return {}
+        rows = db.execute(
+            select(UploadedFile.file_hash, UploadedFile.id)
+            .where(UploadedFile.owner_id == self.owner_id, UploadedFile.file_hash.in_(file_hashes))
+        ).all()
+        return dict(rows)
+
+    def _select_new_files(self, valid: list, existing: Dict[str, int]) -> list:
+        new_files = []
+        for item, data, file_hash in valid:
+            if file_hash in self._seen or file_hash in existing:
+                file_id = self._seen.get(file_hash) or existing.get(file_hash)
+                self.results.append(IngestResult(name=item.name, status="duplicate", file_id=file_id,
+                                                 file_hash=file_hash, size=len(data)))
+                continue
+            if self.remaining_quota is not None:
+                if len(data) > self.remaining_quota:
+                    self._fail(item, "quota_exceeded", "Upload quota exceeded.", file_hash, len(data))
+                    continue
+                self.remaining_quota -= len(data)
+            self._seen[file_hash] = None
+            new_files.append((item, data, file_hash))
+        return new_files
+
+    def _store(self, entry: tuple) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Writes the thumbnail and the blob of a new file, returns the error if it is not a valid image and its
+        perceptual hash otherwise.
+        """
+        item, data, file_hash = entry
+        try:
+            create_thumbnail(file_hash, data)
+            phash = format_perceptual_hash(perceptual_hash(data))
+        except Exception as e:
+            return f"Not a valid image: {e}", None
+        get_blob_store().put(file_hash, data)
+        return None, phash
+
+    def _insert(self, db, stored: list, phashes: Dict[str, str]) -> Dict[str, int]:
+        """
+        Inserts the rows of one batch and their content references in a single transaction, returns the ids of
+        the new files by hash. ``phashes`` holds the perceptual hashes of the content stored for the first time.
+        """
+        for attempt in range(ADD_REFERENCE_ATTEMPTS):
+            if not stored:
+                return {}
+            now = datetime.now()
+            rows = [{
+                "file_name": item.file_name[:255],
+                "file_hash": file_hash,
+                "file_size": len(data),
+                "uploaded_text": item.uploaded_text,
+                "owner_id": self.owner_id,
+                "uploaded_at": now,
+            } for item, data, file_hash in stored]
+            try:
+                add_references(db, {file_hash: len(data) for _, data, file_hash in stored}, phashes)
+                ids = dict(db.execute(insert(UploadedFile).returning(UploadedFile.file_hash, UploadedFile.id),
+                                      rows).all())
+                db.commit()
+            except (IntegrityError, BlobCollectingError):
+                # The owner uploaded some of the files concurrently, they become duplicates, or another transaction
+                # is creating or collecting the same content; the rest is inserted again
+                db.rollback()
+                existing = self._existing_ids(db, [file_hash for _, _, file_hash in stored])
+                for item, data, file_hash in stored:
+                    if file_hash in existing:
+                        self._seen[file_hash] = existing[file_hash]
+                        self.results.append(IngestResult(name=item.name, status="duplicate",
+                                                         file_id=existing[file_hash], file_hash=file_hash,
+                                                         size=len(data)))
+                stored = [entry for entry in stored if entry[2] not in existing]
+                time.sleep(0.05 * (attempt + 1))
+                continue
+
+            for item, data, file_hash in stored:
+                self._seen[file_hash] = ids[file_hash]
+                self.results.append(IngestResult(name=item.name, status="created", file_id=ids[file_hash],
+                                                 file_hash=file_hash, size=len(data)))
+            return ids
+
+        for item, data, file_hash in stored:
+            self._seen.pop(file_hash)
+            self._fail(item, "failed", "File content is being updated, import the file again.", file_hash, len(data))
+        return {}
+
+    def summary(self, seconds: float, error: Optional[str] = None) -> dict:
+        counts = {"created": 0, "duplicate": 0}
+        for result in self.results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        return {
+            "files": len(self.results),
+            "created": counts["created"],
+            "duplicates": counts["duplicate"],
+            "failed": len(self.results) - counts["created"] - counts["duplicate"],
+            "seconds": round(seconds, 3),
+            "error": error,
+            "job_ids": self.job_ids,
+            "results": [asdict(result) for result in self.results],
+        }
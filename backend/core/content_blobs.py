@@ -0,0 +1,114 @@
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+from backend.core.blob_store import get_blob_store
+from backend.core.database import SessionLocal
+from backend.core.logging_config import logger
+from backend.models.content_blob import ContentBlob
+
+COLLECTING = -1  # ref_count of a blob whose bytes are being deleted
+ADD_REFERENCE_ATTEMPTS = 5
+
+
+class BlobCollectingError(Exception):
+    """The content is being garbage collected, the reference can be added again once the collection is finished."""
+
+
+def add_references(db: Session, sizes: Dict[str, Optional[int]], phashes: Optional[Dict[str, str]] = None):
+    """
+    Adds a reference to the content blob of every hash in ``sizes`` (hash -> size in bytes) in the caller's
+    transaction, creating the blobs seen for the first time with their perceptual hash from ``phashes``. Raises
+    BlobCollectingError while one of them is being collected, and the insert fails with IntegrityError when a
+    concurrent transaction created the same blob: the caller rolls back and tries again.
+    """
+    if not sizes:
+        return
+    file_hashes = list(sizes)
+    db.execute(
+        update(ContentBlob)
+        .where(ContentBlob.file_hash.in_(file_hashes), ContentBlob.ref_count >= 0)
+        .values(ref_count=ContentBlob.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    existing = dict(db.execute(
+        select(ContentBlob.file_hash, ContentBlob.ref_count).where(ContentBlob.file_hash.in_(file_hashes))
+    ).all())
+    collecting = [file_hash for file_hash, ref_count in existing.items() if ref_count == COLLECTING]
+    if collecting:
+        raise BlobCollectingError(", ".join(collecting))
+    now = datetime.now()
+    phashes = phashes or {}
+    new_blobs = [{"file_hash": file_hash, "size": sizes[file_hash], "ref_count": 1, "created_at": now,
+                  "phash": phashes.get(file_hash)}
+                 for file_hash in file_hashes if file_hash not in existing]
+    if new_blobs:
+        db.execute(insert(ContentBlob), new_blobs)
+
+
+def release_references(db: Session, file_hashes: Iterable[str]):
+    """Removes one reference per occurrence of a hash in the caller's transaction, see ``collect_garbage``."""
+    by_count: Dict[int, List[str]] = {}
+    for file_hash, count in Counter(file_hashes).items():
+        by_count.setdefault(count, []).append(file_hash)
+    for count, hashes in by_count.items():
+        db.execute(
+            update(ContentBlob)
+            .where(ContentBlob.file_hash.in_(hashes), ContentBlob.ref_count >= count)
+            .values(ref_count=ContentBlob.ref_count - count)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def shared_blobs(db: Session, file_hashes: List[str]) -> set:
+    """Hashes whose content is already stored and referenced, uploads of them do not store the bytes again."""
+    if not file_hashes:
+        return set()
+    return set(db.execute(
+        select(ContentBlob.file_hash).where(ContentBlob.file_hash.in_(file_hashes), ContentBlob.ref_count > 0)
+    ).scalars())
+
+
+def ensure_content_stored(file_hash: str, file_data: bytes):
+    """
+    Called after a reference was added: stores the bytes again if a collection of the same content deleted them
+    while the upload was in progress.
+    """
+    if not get_blob_store().exists(file_hash):
+        get_blob_store().put(file_hash, file_data)
+
+
+def collect_garbage(file_hashes: Optional[List[str]] = None) -> int:
+    """
+    Deletes content blobs without references together with their bytes, thumbnail and variants in the blob store.
+    Blobs are marked as being collected in a transaction of their own before anything is deleted, so an upload of
+    the same content waits until the collection is finished instead of referencing bytes that are about to go.
+    Without ``file_hashes`` every unreferenced blob is collected, including those of an interrupted collection.
+    Returns the number of collected blobs.
+    """
+    with SessionLocal() as db:
+        query = update(ContentBlob).where(ContentBlob.ref_count == 0)
+        if file_hashes is not None:
+            if not file_hashes:
+                return 0
+            query = query.where(ContentBlob.file_hash.in_(file_hashes))
+        db.execute(query.values(ref_count=COLLECTING).execution_options(synchronize_session=False))
+        db.commit()
+        collecting = select(ContentBlob.file_hash).where(ContentBlob.ref_count == COLLECTING)
+        if file_hashes is not None:
+            collecting = collecting.where(ContentBlob.file_hash.in_(file_hashes))
+        marked = db.execute(collecting).scalars().all()
+
+    store = get_blob_store()
+    for file_hash in marked:
+        store.delete(file_hash)
+        store.delete_variants(file_hash)
+
+    if marked:
+        with SessionLocal() as db:
+            db.execute(delete(ContentBlob).where(ContentBlob.file_hash.in_(marked),
+                                                 ContentBlob.ref_count == COLLECTING))
+            db.commit()
+        logger.info("Collected %s unreferenced content blobs", len(marked))
+    return len(marked)
@@ -0,0 +1,138 @@
+import io
+import os
+import re
+import zlib
+from typing import Callable, Dict, Optional
+import numpy as np
+from PIL import Image, ImageOps
+from dotenv import load_dotenv
+
+load_dotenv()
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "local")
+
+LOCAL_LAYOUT_SIZE = 16  # Grayscale layout of 16x16 pixels
+LOCAL_COLOR_BINS = 4  # 4x4x4 RGB histogram
+LOCAL_EDGE_SIZE = 64  # Gradient orientations are measured on 64x64 pixels
+LOCAL_EDGE_BINS = 8
+LOCAL_EDGE_CELLS = 2  # Orientation histograms of 2x2 cells
+LOCAL_TEXT_DIMENSION = 384
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+
+class EmbedderError(Exception):
+    pass
+
+
+class Embedder:
+    """
+    Interface of everything that maps files and search queries to vectors compared by cosine similarity (dot
+    product, vectors are L2-normalized). A file is embedded from its image and text (analysis result, tweet text),
+    a query from text only, both into the same space. ``model`` identifies the vectors of an embedder in the
+    ``file_embeddings`` table, so it has to change whenever the embedder would compute different vectors.
+    """
+    name = "base"
+    model = "base"
+    dimension = 0
+
+    def embed_file(self, image_data: bytes, text: Optional[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> np.ndarray:
+        raise NotImplementedError
+
+
+def normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class LocalEmbedder(Embedder):
+    """
+    CPU-only embedder without a model download. The image part describes how a chart looks: its grayscale layout,
+    colors and the directions of its edges (bars, lines, pie slices). The text part hashes words and character
+    trigrams into a fixed number of dimensions, so texts sharing words or word stems (inflation, inflacja) are close.
+    Text queries have an empty image part and are compared on the text part only, files with each other on both.
+    """
+    name = "local"
+    model = "local-v1"
+    image_weight = 0.5  # Share of the image part in the similarity of two files with text
+
+    def __init__(self):
+        self.image_dimension = (LOCAL_LAYOUT_SIZE ** 2 + LOCAL_COLOR_BINS ** 3
+                                + LOCAL_EDGE_CELLS ** 2 * LOCAL_EDGE_BINS)
+        self.dimension = self.image_dimension + LOCAL_TEXT_DIMENSION
+
+    def image_features(self, image_data: bytes) -> np.ndarray:
+        with Image.open(io.BytesIO(image_data)) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+                image = Image.alpha_composite(background, image)
+            image = image.convert("RGB")
+            gray = image.convert("L")
+            layout = np.asarray(gray.resize((LOCAL_LAYOUT_SIZE, LOCAL_LAYOUT_SIZE), Image.BILINEAR), np.float32)
+            edges = np.asarray(gray.resize((LOCAL_EDGE_SIZE, LOCAL_EDGE_SIZE), Image.BILINEAR), np.float32)
+            rgb = np.asarray(image.resize((LOCAL_EDGE_SIZE, LOCAL_EDGE_SIZE), Image.BILINEAR))
+
+        layout = normalize((layout - layout.mean()).flatten())
+        bins = (rgb // (256 // LOCAL_COLOR_BINS)).reshape(-1, 3).astype(np.int64)
+        color = np.bincount((bins[:, 0] * LOCAL_COLOR_BINS + bins[:, 1]) * LOCAL_COLOR_BINS + bins[:, 2],
+                            minlength=LOCAL_COLOR_BINS ** 3).astype(np.float32)
+        color = normalize(np.sqrt(color))  # Hellinger: large flat backgrounds do not drown the chart colors
+
+        dy, dx = np.gradient(edges)
+        magnitude = np.hypot(dx, dy)
+        # Orientation modulo 180 degrees, a rising and a falling edge of the same line are the same direction
+        orientation = ((np.arctan2(dy, dx) % np.pi) / np.pi * LOCAL_EDGE_BINS).astype(np.int64) % LOCAL_EDGE_BINS
+        cell = LOCAL_EDGE_SIZE // LOCAL_EDGE_CELLS
+        cells = (np.arange(LOCAL_EDGE_SIZE) // cell)[:, None] * LOCAL_EDGE_CELLS + np.arange(LOCAL_EDGE_SIZE) // cell
+        edge = np.bincount((cells * LOCAL_EDGE_BINS + orientation).flatten(), weights=magnitude.flatten(),
+                           minlength=LOCAL_EDGE_CELLS ** 2 * LOCAL_EDGE_BINS).astype(np.float32)
+        edge = normalize(edge)
+
+        return normalize(np.concatenate([layout * np.sqrt(0.5), color * np.sqrt(0.25), edge * np.sqrt(0.25)]))
+
+    def text_features(self, text: str) -> np.ndarray:
+        vector = np.zeros(LOCAL_TEXT_DIMENSION, np.float32)
+        for word in WORD_PATTERN.findall(text.lower()):
+            features = [word] + [f"#{word[i:i + 3]}" for i in range(len(word) - 2)] if len(word) > 3 else [word]
+            for feature in features:
+                hashed = zlib.crc32(feature.encode("utf-8"))
+                # The sign bit spreads the collisions of unrelated features around zero
+                vector[hashed % LOCAL_TEXT_DIMENSION] += 1.0 if hashed & 0x80000000 else -1.0
+        return normalize(np.sign(vector) * np.log1p(np.abs(vector)))
+
+    def embed_file(self, image_data: bytes, text: Optional[str]) -> np.ndarray:
+        try:
+            image = self.image_features(image_data)
+        except Exception as e:
+            raise EmbedderError(f"Can not read the image: {e}")
+        text_part = self.text_features(text) if text else np.zeros(LOCAL_TEXT_DIMENSION, np.float32)
+        image_weight = self.image_weight if text_part.any() else 1.0
+        return normalize(np.concatenate([image * np.sqrt(image_weight),
+                                         text_part * np.sqrt(1 - image_weight)])).astype(np.float32)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return np.concatenate([np.zeros(self.image_dimension, np.float32), self.text_features(text)])
+
+
+_factories: Dict[str, Callable[[], Embedder]] = {}
+_embedders: Dict[str, Embedder] = {}
+
+
+def register_embedder(name: str, factory: Callable[[], Embedder]):
+    _factories[name] = factory
+
+
+def get_embedder(name: Optional[str] = None) -> Embedder:
+    """Returns the embedder of the deployment, ``EMBEDDING_BACKEND`` unless another one is named."""
+    name = name or EMBEDDING_BACKEND
+    if name not in _embedders:
+        if name not in _factories:
+            raise EmbedderError(f"Unknown embedder: {name}. Available: {', '.join(sorted(_factories))}")
+        _embedders[name] = _factories[name]()
+    return _embedders[name]
+
+
+register_embedder("local", LocalEmbedder)
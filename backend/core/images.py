@@ -0,0 +1,228 @@
+import functools
+import io
+import json
+import math
+import os
+from typing import Optional, Tuple, Union
+import numpy as np
+from PIL import Image, ImageOps
+from dotenv import load_dotenv
+from backend.core.blob_store import BlobNotFoundError, get_blob_store, read_file_data
+
+load_dotenv()
+THUMBNAIL_MAX_SIZE = int(os.getenv("THUMBNAIL_MAX_SIZE", "256"))
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "WEBP").upper()
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "75"))
+MODEL_IMAGE_MAX_SIDE = int(os.getenv("MODEL_IMAGE_MAX_SIDE", "1024"))
+MODEL_IMAGE_DETAIL = os.getenv("MODEL_IMAGE_DETAIL", "high")  # "low" or "high", see estimate_vision_tokens
+MODEL_IMAGE_FORMAT = os.getenv("MODEL_IMAGE_FORMAT", "WEBP").upper()
+MODEL_IMAGE_QUALITY = int(os.getenv("MODEL_IMAGE_QUALITY", "90"))
+
+MIME_TYPES = {
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "JPEG": "image/jpeg",
+    "GIF": "image/gif",
+}
+
+PHASH_IMAGE_SIZE = 32
+PHASH_FREQUENCIES = 8  # 8x8 lowest DCT frequencies -> 64-bit hash
+
+MAGIC_BYTES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def thumbnail_key(file_hash: str) -> str:
+    # The settings are part of the key, thumbnails rendered with other ones are regenerated instead of served
+    return f"{file_hash}.thumb-{THUMBNAIL_MAX_SIZE}-{THUMBNAIL_QUALITY}.{THUMBNAIL_FORMAT.lower()}"
+
+
+def variant_key(file_hash: str, max_size: Optional[int], image_format: str, quality: int) -> str:
+    return f"{file_hash}.{max_size or 'full'}.{quality}.{image_format.lower()}"
+
+
+def render_image(image_data: Union[bytes, str], max_size: Optional[int] = None, image_format: str = "PNG",
+                 quality: int = 85) -> bytes:
+    """
+    Re-encodes an image in the requested format, downscaling it so that its longer side is at most ``max_size``.
+    ``image_data`` is the encoded image or the path of a file holding it.
+    """
+    with Image.open(io.BytesIO(image_data) if isinstance(image_data, bytes) else image_data) as image:
+        if max_size:
+            image.thumbnail((max_size, max_size))
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        if image_format == "PNG":
+            image.save(output, format="PNG", optimize=True)
+        else:
+            image.save(output, format=image_format, quality=quality)
+        return output.getvalue()
+
+
+def create_thumbnail(file_hash: str, image_data: Union[bytes, str]) -> bytes:
+    thumbnail = render_image(image_data, THUMBNAIL_MAX_SIZE, THUMBNAIL_FORMAT, THUMBNAIL_QUALITY)
+    get_blob_store().put(thumbnail_key(file_hash), thumbnail)
+    return thumbnail
+
+
+def ensure_thumbnail(uploaded_file) -> str:
+    key = thumbnail_key(uploaded_file.file_hash)
+    if not get_blob_store().exists(key):
+        create_thumbnail(uploaded_file.file_hash, read_file_data(uploaded_file))
+    return key
+
+
+def get_thumbnail(uploaded_file) -> bytes:
+    """
+    Returns the stored thumbnail, generating it for files uploaded before thumbnails existed.
+    """
+    try:
+        return get_blob_store().get(thumbnail_key(uploaded_file.file_hash))
+    except BlobNotFoundError:
+        return create_thumbnail(uploaded_file.file_hash, read_file_data(uploaded_file))
+
+
+def ensure_image_variant(uploaded_file, max_size: Optional[int], image_format: str, quality: int) -> Tuple[str, str]:
+    """
+    Makes sure a resized/re-encoded variant of an uploaded file is in the blob store, rendering it on first request.
+    Returns the blob key and MIME type of the variant.
+    """
+    store = get_blob_store()
+    key = variant_key(uploaded_file.file_hash, max_size, image_format, quality)
+    if not store.exists(key):
+        store.put(key, render_image(read_file_data(uploaded_file), max_size, image_format, quality))
+    return key, MIME_TYPES[image_format]
+
+
+# --- PERCEPTUAL HASH ---
+@functools.lru_cache()
+def dct_matrix(size: int) -> np.ndarray:
+    """Orthonormal DCT-II matrix, ``matrix @ x @ matrix.T`` is the 2-D DCT of a square block."""
+    k, n = np.meshgrid(np.arange(size), np.arange(size), indexing="ij")
+    matrix = np.sqrt(2 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def perceptual_hash(image_data: Union[bytes, str], image_size: int = PHASH_IMAGE_SIZE,
+                    frequencies: int = PHASH_FREQUENCIES) -> int:
+    """
+    DCT perceptual hash (pHash): the image is reduced to ``image_size`` squared grayscale pixels and each of the
+    ``frequencies`` squared lowest frequencies of its DCT becomes one bit, set when it is above their median. By
+    default a 64-bit hash of 32x32 pixels; recompressed, resized or slightly cropped copies of an image differ in a
+    few bits only, see ``core/near_duplicates.py``.
+    """
+    with Image.open(io.BytesIO(image_data) if isinstance(image_data, bytes) else image_data) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            # Transparent areas are compared as white, the way charts are displayed
+            image = image.convert("RGBA")
+            background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+            image = Image.alpha_composite(background, image)
+        pixels = np.asarray(image.convert("L").resize((image_size, image_size), Image.LANCZOS), dtype=np.float64)
+    dct = dct_matrix(image_size)
+    coefficients = (dct @ pixels @ dct.T)[:frequencies, :frequencies].flatten()
+    # The DC term is the mean brightness and would dominate the median
+    bits = coefficients > np.median(coefficients[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def format_perceptual_hash(phash: int) -> str:
+    return f"{phash:016x}"
+
+
+# --- MODEL INPUT NORMALIZATION ---
+def detect_mime_type(image_data: bytes) -> Optional[str]:
+    """Detects the image format from magic bytes instead of trusting the file name or the client."""
+    for magic, mime_type in MAGIC_BYTES:
+        if image_data.startswith(magic):
+            return mime_type
+    if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def detect_blob_mime_type(key: str) -> str:
+    header = b"".join(get_blob_store().iter_range(key, 0, 15))
+    return detect_mime_type(header) or "application/octet-stream"
+
+
+def estimate_vision_tokens(width: int, height: int, detail: str = "high") -> int:
+    """
+    Estimates the input tokens the model charges for an image: a flat 85 tokens at low detail, at high detail the image
+    is fitted into 2048x2048, its shorter side scaled down to 768 and every 512px tile costs 170 tokens.
+    """
+    if detail == "low":
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def model_variant_key(file_hash: str) -> str:
+    return f"{file_hash}.model-{MODEL_IMAGE_DETAIL}-{MODEL_IMAGE_MAX_SIDE}-{MODEL_IMAGE_QUALITY}.{MODEL_IMAGE_FORMAT.lower()}"
+
+
+def normalize_for_model(image_data: bytes) -> Tuple[bytes, dict]:
+    """
+    Prepares an image for the vision model: applies EXIF orientation, drops all metadata, downscales it to
+    ``MODEL_IMAGE_MAX_SIDE`` (512 at low detail, where the model would not use more pixels anyway)
+    and re-encodes it. Returns the new bytes and a report of byte and estimated token savings.
+    """
+    max_side = min(MODEL_IMAGE_MAX_SIDE, 512) if MODEL_IMAGE_DETAIL == "low" else MODEL_IMAGE_MAX_SIDE
+    with Image.open(io.BytesIO(image_data)) as image:
+        original_size = image.size
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("P", "LA") else "RGB")
+        if MODEL_IMAGE_FORMAT == "JPEG" and image.mode == "RGBA":
+            image = image.convert("RGB")
+        image.thumbnail((max_side, max_side))
+        normalized_size = image.size
+
+        output = io.BytesIO()
+        if MODEL_IMAGE_FORMAT == "PNG":
+            image.save(output, format="PNG", optimize=True)
+        else:
+            image.save(output, format=MODEL_IMAGE_FORMAT, quality=MODEL_IMAGE_QUALITY)
+    normalized = output.getvalue()
+
+    original_tokens = estimate_vision_tokens(*original_size, detail="high")
+    normalized_tokens = estimate_vision_tokens(*normalized_size, detail=MODEL_IMAGE_DETAIL)
+    report = {
+        "original_mime_type": detect_mime_type(image_data),
+        "mime_type": MIME_TYPES[MODEL_IMAGE_FORMAT],
+        "detail": MODEL_IMAGE_DETAIL,
+        "original_size": list(original_size),
+        "normalized_size": list(normalized_size),
+        "original_bytes": len(image_data),
+        "normalized_bytes": len(normalized),
+        "bytes_saved": len(image_data) - len(normalized),
+        "original_tokens_estimate": original_tokens,
+        "normalized_tokens_estimate": normalized_tokens,
+        "tokens_saved_estimate": original_tokens - normalized_tokens,
+    }
+    return normalized, report
+
+
+def get_model_image(uploaded_file) -> Tuple[bytes, dict]:
+    """
+    Returns the normalized model input of an uploaded file and its savings report, both cached in the blob store
+    per ``file_hash`` and normalization settings.
+    """
+    store = get_blob_store()
+    key = model_variant_key(uploaded_file.file_hash)
+    try:
+        return store.get(key), json.loads(store.get(f"{key}.json"))
+    except BlobNotFoundError:
+        normalized, report = normalize_for_model(read_file_data(uploaded_file))
+        store.put(key, normalized)
+        store.put(f"{key}.json", json.dumps(report).encode("utf-8"))
+        return normalized, report
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from backend.core.database import SessionLocal
+from backend.core.logging_config import logger
+from backend.models.analysis_job import AnalysisJob
+
+load_dotenv()
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "8"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_REQUEUE_INTERVAL_SECONDS = float(os.getenv("JOB_REQUEUE_INTERVAL_SECONDS", "60"))
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+# Handler signature: async handler(file_id, progress, **parameters) -> JSON-serializable result
+JobHandler = Callable[..., Awaitable[dict]]
+
+
+class JobQueue:
+    """
+    Database-backed queue of analysis jobs processed by a pool of asyncio worker tasks running in the app's
+    event loop. Jobs are claimed with a conditional UPDATE, so several processes can share one database, and jobs
+    left running by a crashed process are put back in the queue once they go stale, checked at start and every
+    JOB_REQUEUE_INTERVAL_SECONDS by the workers.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.handlers: Dict[str, JobHandler] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+        self._next_requeue = 0.0
+
+    def register(self, job_type: str, handler: JobHandler):
+        self.handlers[job_type] = handler
+
+    def enqueue(self, db: Session, job_type: str, file_id: Optional[int], **parameters) -> AnalysisJob:
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job = AnalysisJob(
+            id=str(uuid.uuid4()),
+            job_type=job_type,
+            file_id=file_id,
+            parameters=json.dumps(parameters),
+            status="queued",
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self.notify()
+        logger.info("Enqueued %s job %s for file %s", job_type, job.id, file_id)
+        return job
+
+    def enqueue_many(self, db: Session, job_type: str, file_ids: List[int], **parameters) -> List[AnalysisJob]:
+        """Enqueues one job per file in a single transaction."""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        jobs = [
+            AnalysisJob(id=str(uuid.uuid4()), job_type=job_type, file_id=file_id,
+                        parameters=json.dumps(parameters), status="queued")
+            for file_id in file_ids
+        ]
+        db.add_all(jobs)
+        db.commit()
+        self.notify()
+        logger.info("Enqueued %s %s jobs", len(jobs), job_type)
+        return jobs
+
+    def notify(self):
+        """Wakes up idle workers, safe to call from any thread."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        await self._requeue_if_due()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info("Started %s analysis workers", self.workers)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    def requeue_stale_jobs(self):
+        """Puts stale running jobs back in the queue, or fails them when they used up their attempts."""
+        now = datetime.now()
+        stale = (AnalysisJob.status == "running", AnalysisJob.updated_at < now - timedelta(seconds=JOB_STALE_SECONDS))
+        with SessionLocal() as db:
+            failed = (
+                db.query(AnalysisJob)
+                .filter(*stale, AnalysisJob.attempts >= JOB_MAX_ATTEMPTS)
+                .update({"status": "failed", "error": f"Stale after {JOB_MAX_ATTEMPTS} attempts",
+                         "updated_at": now, "finished_at": now}, synchronize_session=False)
+            )
+            requeued = (
+                db.query(AnalysisJob)
+                .filter(*stale)
+                .update({"status": "queued", "updated_at": now}, synchronize_session=False)
+            )
+            db.commit()
+        if failed:
+            logger.warning("Failed %s stale analysis jobs out of attempts", failed)
+        if requeued:
+            logger.warning("Requeued %s stale analysis jobs", requeued)
+
+    async def _requeue_if_due(self):
+        # Workers share one event loop, so only the first one to see the deadline runs the check
+        if self._loop.time() < self._next_requeue:
+            return
+        self._next_requeue = self._loop.time() + JOB_REQUEUE_INTERVAL_SECONDS
+        try:
+            await run_in_threadpool(self.requeue_stale_jobs)
+        except Exception as e:
+            logger.error("Failed to requeue stale analysis jobs: %s", e)
+
+    def _claim(self) -> Optional[str]:
+        with SessionLocal() as db:
+            candidates = (
+                db.query(AnalysisJob.id)
+                .filter(AnalysisJob.status == "queued")
+                .order_by(AnalysisJob.created_at)
+                .limit(self.workers)
+                .all()
+            )
+            for (job_id,) in candidates:
+                now = datetime.now()
+                claimed = (
+                    db.query(AnalysisJob)
+                    .filter(AnalysisJob.id == job_id, AnalysisJob.status == "queued")
+                    .update({
+                        "status": "running",
+                        "started_at": now,
+                        "updated_at": now,
+                        "attempts": AnalysisJob.attempts + 1,
+                    }, synchronize_session=False)
+                )
+                db.commit()
+                if claimed:
+                    return job_id
+        return None
+
+    def _update(self, job_id: str, **values):
+        values["updated_at"] = datetime.now()
+        with SessionLocal() as db:
+            db.query(AnalysisJob).filter(AnalysisJob.id == job_id).update(values, synchronize_session=False)
+            db.commit()
+
+    def _load(self, job_id: str) -> AnalysisJob:
+        with SessionLocal() as db:
+            job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+            db.expunge(job)
+            return job
+
+    async def _run(self, job_id: str):
+        job = await run_in_threadpool(self._load, job_id)
+
+        async def progress(percent: int):
+            await run_in_threadpool(self._update, job_id, progress=percent)
+
+        try:
+            result = await self.handlers[job.job_type](job.file_id, progress, **json.loads(job.parameters))
+        except asyncio.CancelledError:
+            # Shutting down, give the job back so it is picked up after restart. Shielded, as stop() may cancel
+            # the task again while the update runs in the threadpool
+            await asyncio.shield(run_in_threadpool(self._update, job_id, status="queued", attempts=job.attempts - 1))
+            raise
+        except HTTPException as e:
+            # Client errors such as a missing file will not succeed on retry
+            logger.error("Job %s failed: %s", job_id, e.detail)
+            await run_in_threadpool(self._update, job_id, status="failed", error=str(e.detail),
+                                    finished_at=datetime.now())
+        except Exception as e:
+            logger.error("Job %s failed (attempt %s): %s", job_id, job.attempts, e)
+            status = "failed" if job.attempts >= JOB_MAX_ATTEMPTS else "queued"
+            await run_in_threadpool(self._update, job_id, status=status, error=str(e),
+                                    finished_at=datetime.now() if status == "failed" else None)
+        else:
+            await run_in_threadpool(self._update, job_id, status="succeeded", progress=100,
+                                    result=json.dumps(result), error=None, finished_at=datetime.now())
+            logger.info("Job %s succeeded", job_id)
+
+    async def _worker(self):
+        while True:
+            await self._requeue_if_due()
+            try:
+                job_id = await run_in_threadpool(self._claim)
+            except Exception as e:
+                logger.error("Failed to claim analysis job: %s", e)
+                job_id = None
+
+            if job_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._run(job_id)
+
+
+def job_to_dict(job: AnalysisJob) -> dict:
+    return {
+        "job_id": job.id,
+        "job_type": job.job_type,
+        "file_id": job.file_id,
+        "status": job.status,
+        "progress": job.progress,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+job_queue = JobQueue(ANALYSIS_WORKERS)
@@ -1,14 +1,24 @@
-from datetime import datetime, timedelta
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+import threading
+import time
+import uuid
 from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from jose import jwt, JWTError
-from typing import Optional
-from sqlalchemy.orm import Session
-from backend.core.database import get_db
+from typing import Dict, Optional
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.core.database import AsyncSessionLocal, SessionLocal
 from fastapi.security import OAuth2PasswordBearer
 from backend.core.logging_config import logger
+from backend.core.metrics import register_cache
 from dotenv import load_dotenv
 import os
-from backend.models import User
+from backend.models import RevokedToken, User
 
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -16,31 +26,177 @@ if not SECRET_KEY:
     raise RuntimeError("SECRET_KEY is not set in environment variable")
 
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+TOKEN_DENYLIST_RELOAD_SECONDS = float(os.getenv("TOKEN_DENYLIST_RELOAD_SECONDS", "30"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    logger.info("Creating access token")
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Authenticated user as seen by the endpoints, a detached snapshot that can be cached between requests."""
+    id: int
+    email: str
+    created_at: Optional[datetime] = None
+
+
+class UserCache:
+    """
+    In-process cache confirming that the user of a token still exists, so authentication does not query the
+    database on every request. Entries live ``ttl_seconds`` and are dropped right away by ``invalidate`` when the
+    user is updated or deleted in this process; other processes see the change once the entry expires.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return user
+
+    def set(self, user: CurrentUser):
+        with self._lock:
+            self._entries[user.id] = (user, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+class TokenDenylist:
+    """
+    Revoked token ids (``jti``) kept in memory until the token would have expired anyway, so the list stays
+    small. Revocations are persisted in ``revoked_tokens``, loaded on startup and reloaded every ``reload_seconds``:
+    a token revoked by another process is rejected here only after the next reload. Refresh tokens do not depend on
+    that, ``revoke`` claims them in the database (see ``/refresh``).
+    """
+
+    def __init__(self, reload_seconds: float):
+        self.reload_seconds = reload_seconds
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self):
+        with SessionLocal() as db:
+            db.query(RevokedToken).filter(RevokedToken.expires_at < datetime.now()).delete(synchronize_session=False)
+            db.commit()
+            rows = db.query(RevokedToken.jti, RevokedToken.expires_at).all()
+        now = time.time()
+        with self._lock:
+            # Revocations are never undone, ones of this process committed after the query are kept
+            revoked = {key: value for key, value in self._revoked.items() if value >= now}
+            revoked.update((jti, expires_at.timestamp()) for jti, expires_at in rows)
+            self._revoked = revoked
+        logger.debug("Loaded %s revoked tokens", len(rows))
+
+    async def start(self):
+        await run_in_threadpool(self.load)
+        logger.info("Loaded %s revoked tokens", len(self._revoked))
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reload_seconds)
+            try:
+                await run_in_threadpool(self.load)
+            except Exception as e:
+                logger.error("Failed to reload revoked tokens: %s", e)
+
+    async def revoke(self, db: AsyncSession, payload: dict) -> bool:
+        """
+        Revokes a token, returns False when it was revoked before, by this or any other process. The primary key
+        of ``revoked_tokens`` makes this an atomic claim: of concurrent calls for one token only one returns True.
+        """
+        jti, expires_at = payload["jti"], payload["exp"]
+        db.add(RevokedToken(jti=jti, user_id=int(payload["sub"]), expires_at=datetime.fromtimestamp(expires_at)))
+        try:
+            await db.commit()
+            revoked = True
+        except IntegrityError:
+            await db.rollback()
+            revoked = False
+        now = time.time()
+        with self._lock:
+            # Expired tokens are rejected by their signature check anyway
+            self._revoked = {key: value for key, value in self._revoked.items() if value >= now}
+            self._revoked[jti] = expires_at
+        return revoked
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        with self._lock:
+            return jti in self._revoked
+
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)
+register_cache("user", user_cache)
+token_denylist = TokenDenylist(TOKEN_DENYLIST_RELOAD_SECONDS)
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, token_type: str = "access"):
     to_encode = data.copy()
+    now = datetime.now(timezone.utc)
     if expires_delta:
-        expire = datetime.now() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+        expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex, "type": token_type})
     try:
         if "sub" in to_encode and not isinstance(to_encode["sub"], str):
             to_encode["sub"] = str(to_encode["sub"])
-        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-        logger.info("Access token created successfully")
-        return encoded_jwt
+        return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     except Exception as e:
-        logger.error(f"Error creating access token: {str(e)}")
+        logger.error("Error creating access token: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    logger.info("Verifying access token")
+def create_token_pair(user) -> dict:
+    """
+    Short-lived access token and a long-lived refresh token to renew it. Both carry the user id only, the user
+    itself is loaded by ``get_current_user``.
+    """
+    return {
+        "access_token": create_access_token({"sub": user.id}),
+        "refresh_token": create_access_token({"sub": user.id}, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+                                             token_type="refresh"),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+def decode_token(token: str, token_type: str = "access") -> dict:
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -48,21 +204,43 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            logger.warning("Token is missing 'sub' claim")
-            raise credentials_exception
-
-        user_id = int(user_id)
     except JWTError as e:
-        logger.error(f"JWTError during token verification: {str(e)}")
+        logger.debug("JWTError during token verification: %s", e)
         raise credentials_exception
 
-    logger.info(f"Token decoded successfully, user_id: {user_id}")
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        logger.warning(f"User not found with id: {user_id}")
+    # Tokens issued before refresh tokens existed have no type and count as access tokens
+    if payload.get("sub") is None or payload.get("type", "access") != token_type:
+        logger.warning("Token is missing 'sub' claim or is not of type %s", token_type)
+        raise credentials_exception
+    if token_denylist.is_revoked(payload.get("jti")):
+        logger.debug("Revoked token used, jti: %s", payload.get('jti'))
         raise credentials_exception
+    return payload
 
-    logger.info(f"User authenticated successfully, {user.email}")
+
+async def load_user(user_id: int) -> Optional[CurrentUser]:
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    async with AsyncSessionLocal() as db:
+        db_user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
+        if db_user is None:
+            return None
+        user = CurrentUser(id=db_user.id, email=db_user.email, created_at=db_user.created_at)
+    user_cache.set(user)
+    return user
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
+    payload = decode_token(token)
+    user_id = int(payload["sub"])
+    user = await load_user(user_id)
+    if user is None:
+        logger.warning("User not found with id: %s", user_id)
+        raise HTTPException(
+            status_code=401,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    logger.debug("User authenticated, id: %s", user_id)
     return user
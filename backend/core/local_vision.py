@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import io
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image
+from backend.core.logging_config import logger
+from backend.core.vision_backend import VisionBackend
+
+load_dotenv()
+LOCAL_VISION_OCR = os.getenv("LOCAL_VISION_OCR", "true").lower() == "true"
+PRESCREEN_MIN_CONFIDENCE = float(os.getenv("PRESCREEN_MIN_CONFIDENCE", "0.8"))
+STATIC_BACKEND_RESPONSE = os.getenv("STATIC_BACKEND_RESPONSE")
+
+NOT_A_GRAPH_ANSWER = "The provided image does not show any graph data"
+DESCRIPTION_MISMATCH_ANSWER = "The description provided does not match and image"
+# Charts are screened on a small copy, the heuristics only need coarse structure
+SCREENING_SIZE = 256
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+OCR_ENABLED = LOCAL_VISION_OCR and pytesseract is not None
+
+
+@dataclass
+class ChartScreening:
+    is_chart: bool
+    confidence: float
+    chart_type: Optional[str] = None
+    text: str = ""
+    features: dict = field(default_factory=dict)
+
+
+def extract_text(image: Image.Image) -> str:
+    """OCR through tesseract when it is installed, otherwise no text is extracted."""
+    if not OCR_ENABLED:
+        return ""
+    try:
+        return " ".join(pytesseract.image_to_string(image.convert("L")).split())
+    except Exception as e:  # tesseract binary missing or failing
+        logger.warning("OCR failed: %s", e)
+        return ""
+
+
+def palette_features(pixels: np.ndarray) -> dict:
+    # Colours quantized to 4 bits per channel. Charts are drawn with a handful of flat colours on a plain
+    # background, photos spread over hundreds of them
+    quantized = pixels >> 4
+    codes = (quantized[..., 0] << 8) | (quantized[..., 1] << 4) | quantized[..., 2]
+    counts = np.sort(np.bincount(codes.ravel(), minlength=4096))[::-1]
+    shares = np.cumsum(counts) / codes.size
+    return {
+        "palette_size": int(np.searchsorted(shares, 0.95) + 1),
+        "background_share": float(counts[0] / codes.size),
+    }
+
+
+def axis_features(gray: np.ndarray, background: float) -> dict:
+    # An axis is a long thin line: a row or column where most pixels clearly differ from the background while the
+    # rows or columns a few pixels away on both sides do not, which excludes the edges of filled areas
+    ink = np.abs(gray - background) > 60
+    return {
+        "horizontal_lines": count_thin_lines(ink.mean(axis=1)),
+        "vertical_lines": count_thin_lines(ink.mean(axis=0)),
+        "ink_share": float(ink.mean()),
+    }
+
+
+def count_thin_lines(profile: np.ndarray, gap: int = 4) -> int:
+    padded = np.pad(profile, gap)
+    before = padded[:-2 * gap]
+    after = padded[2 * gap:]
+    return int(((profile > 0.5) & (before < 0.25) & (after < 0.25)).sum())
+
+
+def colour_features(pixels: np.ndarray) -> dict:
+    maximum = pixels.max(axis=2)
+    minimum = pixels.min(axis=2)
+    saturation = (maximum - minimum) / np.maximum(maximum, 1)
+    coloured = (saturation > 0.35) & (maximum > 60)
+    features = {"coloured_share": float(coloured.mean()), "vertical_continuity": 0.0, "bbox_fill": 0.0,
+                "bbox_aspect": 0.0}
+    if coloured.sum() < 50:
+        return features
+
+    # Bars are solid rectangles: a coloured pixel almost always has a coloured pixel below it
+    features["vertical_continuity"] = float((coloured[:-1] & coloured[1:]).sum() / max(coloured[:-1].sum(), 1))
+    ys, xs = np.nonzero(coloured)
+    height = ys.max() - ys.min() + 1
+    width = xs.max() - xs.min() + 1
+    features["bbox_fill"] = float(coloured.sum() / (height * width))
+    features["bbox_aspect"] = float(min(height, width) / max(height, width))
+    return features
+
+
+def classify_chart(features: dict) -> Optional[str]:
+    if features["palette_size"] > 64:
+        return None  # Not drawn with flat colours, the shape features would only describe a photo
+    has_axes = features["horizontal_lines"] > 0 and features["vertical_lines"] > 0
+    # A disc fills pi/4 of its bounding square
+    if not has_axes and features["bbox_aspect"] > 0.85 and 0.65 < features["bbox_fill"] < 0.9:
+        return "pie"
+    if features["coloured_share"] > 0.05 and features["vertical_continuity"] > 0.9:
+        return "bar"
+    if has_axes and features["ink_share"] < 0.15:
+        return "line"
+    return None
+
+
+def screen_image(image_data: bytes) -> ChartScreening:
+    """
+    Classical, CPU-only guess whether an image is a chart and of which type, based on its colour palette,
+    background share, axis lines and the shape of its coloured areas.
+    """
+    with Image.open(io.BytesIO(image_data)) as image:
+        image = image.convert("RGB")
+        text = extract_text(image)
+        image.thumbnail((SCREENING_SIZE, SCREENING_SIZE))
+        pixels = np.asarray(image, dtype=np.int32)
+
+    gray = pixels.mean(axis=2)
+    features = palette_features(pixels)
+    features.update(axis_features(gray, float(np.median(gray))))
+    features.update(colour_features(pixels))
+    chart_type = classify_chart(features)
+
+    # Each signal pushes the score towards "chart" (positive) or "photo / other" (negative)
+    score = 0.0
+    score += 0.35 if features["palette_size"] <= 32 else -0.35 if features["palette_size"] > 128 else 0.0
+    score += 0.25 if features["background_share"] >= 0.4 else -0.25 if features["background_share"] < 0.1 else 0.0
+    score += 0.2 if chart_type else 0.0
+    score += 0.2 if re.search(r"\d", text) else 0.0
+    is_chart = score > 0
+    confidence = min(abs(score) / 0.6, 1.0)
+    return ChartScreening(is_chart=is_chart, confidence=round(confidence, 2),
+                          chart_type=chart_type if is_chart else None, text=text, features=features)
+
+
+def describe_screening(screening: ChartScreening) -> str:
+    if not screening.is_chart:
+        return NOT_A_GRAPH_ANSWER
+    answer = f"The image appears to show a {screening.chart_type or 'chart of unknown type'}"
+    answer += " chart." if screening.chart_type else "."
+    if screening.text:
+        answer += f" Text found in the image: {screening.text[:500]}"
+    return answer
+
+
+def description_matches(description: str, text: str) -> Optional[bool]:
+    """Share of the description's words (3+ letters or numbers) found in the OCR text, None without any text."""
+    words = set(re.findall(r"[a-z]{3,}|\d+", description.lower()))
+    if not text or not words:
+        return None
+    found = set(re.findall(r"[a-z]{3,}|\d+", text.lower()))
+    return len(words & found) / len(words) >= 0.5
+
+
+class LocalChartBackend(VisionBackend):
+    """
+    Answers from classical image heuristics and optional OCR, without any remote call. It recognises non-chart
+    images and the basic chart types, it does not interpret the data shown.
+    """
+    name = "local"
+
+    def __init__(self):
+        # OCR text changes the screening and the answers, so it is part of the model
+        self.model = f"local-chart-v1-ocr{int(OCR_ENABLED)}"
+
+    async def screen(self, image_data: bytes) -> ChartScreening:
+        return await asyncio.to_thread(screen_image, image_data)
+
+    async def analyze_image_with_base64(self, image_data: bytes, prompt: str, mime_type: str = "image/png",
+                                        detail: Optional[str] = None, image_tokens: Optional[int] = None) -> str:
+        return describe_screening(await self.screen(image_data))
+
+    async def analyze_image_with_description_base64(self, image_data: bytes, description: str, prompt: str,
+                                                    mime_type: str = "image/png", detail: Optional[str] = None,
+                                                    image_tokens: Optional[int] = None) -> str:
+        screening = await self.screen(image_data)
+        if not screening.is_chart:
+            return NOT_A_GRAPH_ANSWER
+        matches = description_matches(description, screening.text)
+        if matches is None:
+            return f"Unable to verify the description without text in the image. {describe_screening(screening)}"
+        if matches:
+            return f"True. The description matches the text of the image. {describe_screening(screening)}"
+        return f"{DESCRIPTION_MISMATCH_ANSWER}. {describe_screening(screening)}"
+
+
+class PrescreeningBackend(VisionBackend):
+    """
+    Screens images locally first: confident "not a graph" cases are answered right away, everything else is
+    passed on to the ``remote`` backend.
+    """
+    name = "prescreen"
+
+    def __init__(self, remote: VisionBackend, local: Optional[LocalChartBackend] = None,
+                 min_confidence: float = PRESCREEN_MIN_CONFIDENCE):
+        self.remote = remote
+        self.local = local or LocalChartBackend()
+        self.min_confidence = min_confidence
+        self.model = f"prescreen-{min_confidence}-{self.local.model}+{remote.model}"
+        self.max_tokens = remote.max_tokens
+        self.screened_out = 0
+
+    async def rejects(self, image_data: bytes) -> bool:
+        screening = await self.local.screen(image_data)
+        if not screening.is_chart and screening.confidence >= self.min_confidence:
+            self.screened_out += 1
+            logger.info("Image screened out locally as not a graph (confidence %s)", screening.confidence)
+            return True
+        return False
+
+    async def analyze_image_with_base64(self, image_data: bytes, prompt: str, mime_type: str = "image/png",
+                                        detail: Optional[str] = None, image_tokens: Optional[int] = None) -> str:
+        if await self.rejects(image_data):
+            return NOT_A_GRAPH_ANSWER
+        return await self.remote.analyze_image_with_base64(image_data, prompt, mime_type, detail, image_tokens)
+
+    async def analyze_image_with_description_base64(self, image_data: bytes, description: str, prompt: str,
+                                                    mime_type: str = "image/png", detail: Optional[str] = None,
+                                                    image_tokens: Optional[int] = None) -> str:
+        if await self.rejects(image_data):
+            return NOT_A_GRAPH_ANSWER
+        return await self.remote.analyze_image_with_description_base64(image_data, description, prompt, mime_type,
+                                                                       detail, image_tokens)
+
+    async def stream_image_with_base64(self, image_data: bytes, prompt: str, mime_type: str = "image/png",
+                                       detail: Optional[str] = None, image_tokens: Optional[int] = None):
+        if await self.rejects(image_data):
+            yield NOT_A_GRAPH_ANSWER
+            return
+        async for token in self.remote.stream_image_with_base64(image_data, prompt, mime_type, detail, image_tokens):
+            yield token
+
+    async def stream_image_with_description_base64(self, image_data: bytes, description: str, prompt: str,
+                                                   mime_type: str = "image/png", detail: Optional[str] = None,
+                                                   image_tokens: Optional[int] = None):
+        if await self.rejects(image_data):
+            yield NOT_A_GRAPH_ANSWER
+            return
+        async for token in self.remote.stream_image_with_description_base64(image_data, description, prompt,
+                                                                            mime_type, detail, image_tokens):
+            yield token
+
+    async def aclose(self):
+        await self.remote.aclose()
+
+
+class StaticBackend(VisionBackend):
+    """
+    Deterministic stand-in for tests and benchmarks: the answer only depends on the image and the description,
+    or is fixed with ``STATIC_BACKEND_RESPONSE``.
+    """
+    name = "static"
+
+    def __init__(self, response: Optional[str] = STATIC_BACKEND_RESPONSE):
+        self.response = response
+        # A fixed response is part of the model, answers cached with another one are not reused
+        self.model = "static-v1"
+        if response is not None:
+            self.model += f"-{hashlib.sha256(response.encode('utf-8')).hexdigest()[:8]}"
+
+    def answer(self, image_data: bytes, description: Optional[str] = None) -> str:
+        if self.response is not None:
+            return self.response
+        digest = hashlib.sha256(image_data).hexdigest()[:12]
+        if description is None:
+            return f"Static analysis of image {digest}."
+        return f"True. Static check of image {digest} against the description."
+
+    async def analyze_image_with_base64(self, image_data: bytes, prompt: str, mime_type: str = "image/png",
+                                        detail: Optional[str] = None, image_tokens: Optional[int] = None) -> str:
+        return self.answer(image_data)
+
+    async def analyze_image_with_description_base64(self, image_data: bytes, description: str, prompt: str,
+                                                    mime_type: str = "image/png", detail: Optional[str] = None,
+                                                    image_tokens: Optional[int] = None) -> str:
+        return self.answer(image_data, description)
@@ -1,12 +1,229 @@
+import atexit
+import json
 import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from typing import Dict, Optional
+from dotenv import load_dotenv
 
-logging.basicConfig(level=logging.INFO,
-                    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-                    datefmt="%Y-%m-%d %H:%M:%S",
-                    handlers=[
-                        logging.FileHandler('app.log'),
-                        logging.StreamHandler()
-                    ]
-)
+load_dotenv()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # Console output, text or json
+LOG_FILE = os.getenv("LOG_FILE", "app.log")  # Empty to log to the console only
+LOG_FILE_FORMAT = os.getenv("LOG_FILE_FORMAT", "json")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")  # e.g. midnight or H, rotates by time instead of size
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")  # e.g. INFO=0.1,DEBUG=0.01 for records logged with SAMPLED
+LOG_REQUESTS = os.getenv("LOG_REQUESTS", "true").lower() == "true"
 
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+CORRELATION_ID_HEADER = "X-Request-ID"
+CORRELATION_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+# Passed as ``extra`` to high-volume records, which are then kept at the LOG_SAMPLE_RATES rate of their level
+SAMPLED = {"sampled": True}
+
+correlation_id: ContextVar[Optional[str]] = ContextVar("correlation_id", default=None)
+
+# Attributes every LogRecord has, anything else was passed in ``extra`` and is written as a JSON field
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "correlation_id", "sampled"}
+
+
+def parse_sample_rates(value: str) -> Dict[int, float]:
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        level, _, rate = item.partition("=")
+        rates[logging.getLevelName(level.strip().upper())] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class CorrelationIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get() or "-"
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a share of the records logged with ``extra=SAMPLED``, by level. The decision is made once per
+    correlation id, so the sampled lines of a request are kept or dropped together. Warnings and errors are always
+    kept.
+    """
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.levelno)
+        if rate is None or rate >= 1.0:
+            return True
+        request_id = correlation_id.get()
+        if request_id is None:
+            return random.random() < rate
+        return zlib.crc32(request_id.encode()) < rate * 0x100000000
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Puts records on a bounded queue written by a background thread, so logging never waits for disk or console.
+    When the queue is full the record is dropped and counted, the count is logged once there is room again.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._unreported = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike the default, keeps the traceback apart from the message for the JSON output
+        # Other handlers may still see the original record, a shallow copy is much cheaper than copy.copy
+        prepared = object.__new__(type(record))
+        prepared.__dict__.update(record.__dict__)
+        record = prepared
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+            return
+        if self._unreported:
+            unreported, self._unreported = self._unreported, 0
+            warning = logging.makeLogRecord({"name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                                             "msg": f"{unreported} log records dropped, the log queue was full",
+                                             "correlation_id": "-"})
+            try:
+                self.queue.put_nowait(warning)
+            except queue.Full:
+                self._unreported += unreported
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, correlation_id, the ``extra`` fields and exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "correlation_id": getattr(record, "correlation_id", "-"),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def make_formatter(output_format: str) -> logging.Formatter:
+    if output_format == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+
+def make_file_handler(path: str) -> logging.Handler:
+    if LOG_ROTATE_WHEN:
+        return TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT,
+                                        encoding="utf-8", delay=True)
+    return RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8",
+                               delay=True)
+
+
+def configure_logging() -> QueueListener:
+    """
+    Routes all records through a NonBlockingQueueHandler on the root logger. On the calling thread a record is only
+    filtered, tagged with the correlation id and queued, a QueueListener thread formats and writes it.
+    """
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setFormatter(make_formatter(LOG_FORMAT))
+    handlers = [console_handler]
+    if LOG_FILE:
+        file_handler = make_file_handler(LOG_FILE)
+        file_handler.setFormatter(make_formatter(LOG_FILE_FORMAT))
+        handlers.append(file_handler)
+
+    # The outputs show none of the thread and process fields, skips collecting them for every record
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+    queue_handler.addFilter(CorrelationIdFilter())
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class CorrelationIdMiddleware:
+    """
+    ASGI middleware giving every request a correlation id, taken from a valid X-Request-ID header or generated. It
+    is set for the logging of the request, including code run in the threadpool, and returned as X-Request-ID.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        header_name = CORRELATION_ID_HEADER.lower().encode()
+        request_id = next((value.decode("latin-1") for name, value in scope["headers"] if name == header_name), "")
+        if not CORRELATION_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        token = correlation_id.set(request_id)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (header_name, request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if LOG_REQUESTS:
+                logger.info("%s %s %s %.1fms", scope["method"], scope["path"], status_code,
+                            (time.perf_counter() - started) * 1000, extra=SAMPLED)
+            correlation_id.reset(token)
+
+
+listener = configure_logging()
 logger = logging.getLogger(__name__)
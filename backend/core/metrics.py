@@ -0,0 +1,359 @@
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from contextvars import ContextVar
+from typing import Dict, Optional
+import anyio.to_thread
+from dotenv import load_dotenv
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from backend.core.logging_config import logger
+
+load_dotenv()
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_SAMPLE_INTERVAL_SECONDS = float(os.getenv("METRICS_SAMPLE_INTERVAL_SECONDS", "1"))
+# The sampling profiler can only be started at runtime when enabled here
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_MAX_SECONDS = int(os.getenv("PROFILER_MAX_SECONDS", "300"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+UNMATCHED_ROUTE = "unmatched"  # Label of requests no route matched, keeps arbitrary paths out of the labels
+
+HTTP_REQUESTS = Counter("http_requests_total", "Requests by route and status", ["method", "route", "status"])
+HTTP_REQUEST_DURATION = Histogram("http_request_duration_seconds", "Request latency by route",
+                                  ["method", "route"], buckets=LATENCY_BUCKETS)
+HTTP_RESPONSE_SIZE = Histogram("http_response_size_bytes", "Response body size by route", ["method", "route"],
+                               buckets=SIZE_BUCKETS)
+HTTP_REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests being served")
+
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "Duration of single database queries",
+                              buckets=QUERY_BUCKETS)
+DB_QUERIES_PER_REQUEST = Histogram("db_queries_per_request", "Database queries made by one request",
+                                   ["method", "route"], buckets=QUERY_COUNT_BUCKETS)
+DB_TIME_PER_REQUEST = Histogram("db_time_per_request_seconds", "Time one request spent in database queries",
+                                ["method", "route"], buckets=LATENCY_BUCKETS)
+
+OPENAI_REQUEST_DURATION = Histogram("openai_request_duration_seconds", "OpenAI API call latency, streams until the "
+                                    "last token", ["model", "outcome"], buckets=LATENCY_BUCKETS)
+OPENAI_TIME_TO_FIRST_TOKEN = Histogram("openai_time_to_first_token_seconds", "Latency of the first streamed token",
+                                       ["model"], buckets=LATENCY_BUCKETS)
+OPENAI_TOKENS = Counter("openai_tokens_total", "Tokens used by OpenAI calls", ["model", "kind"])
+OPENAI_ERRORS = Counter("openai_errors_total", "Failed OpenAI calls, retried ones included", ["model", "reason"])
+OPENAI_IN_FLIGHT = Gauge("openai_requests_in_flight", "OpenAI calls waiting for an answer")
+
+FILE_PREVIEW_BYTES = Histogram("file_preview_bytes", "Size of base64 file_preview payloads, thumbnails or full "
+                               "images", ["kind"], buckets=SIZE_BUCKETS)
+
+THREADPOOL_BUSY = Gauge("threadpool_busy_threads", "Threadpool threads running blocking calls")
+THREADPOOL_LIMIT = Gauge("threadpool_max_threads", "Threadpool capacity")
+THREADPOOL_WAITING = Gauge("threadpool_waiting_tasks", "Blocking calls waiting for a free threadpool thread")
+THREADPOOL_SATURATED = Counter("threadpool_saturated_seconds_total", "Time all threadpool threads were busy")
+EVENT_LOOP_LAG = Histogram("event_loop_lag_seconds", "Delay of the event loop in running a scheduled callback",
+                           buckets=QUERY_BUCKETS)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Database work of the current request, shared with the threadpool calls it makes
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    DB_QUERY_DURATION.observe(elapsed)
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+def handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine: Engine):
+    """Times every query of the engine, for an AsyncEngine pass its ``sync_engine``."""
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+def openai_error_reason(error: Exception) -> str:
+    status_code = getattr(error, "status_code", None)
+    return str(status_code) if status_code else type(error).__name__
+
+
+def observe_openai_call(model: str, started: float, error: Optional[Exception] = None, usage=None):
+    OPENAI_REQUEST_DURATION.labels(model, "error" if error else "ok").observe(time.perf_counter() - started)
+    if error is not None:
+        OPENAI_ERRORS.labels(model, openai_error_reason(error)).inc()
+    if usage is not None:
+        OPENAI_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens)
+        OPENAI_TOKENS.labels(model, "completion").inc(usage.completion_tokens)
+
+
+class CacheCollector:
+    """Exposes the hit and miss counters the in-process caches keep, and their hit ratio."""
+
+    def __init__(self):
+        self.caches: Dict[str, object] = {}
+
+    def register(self, name: str, cache):
+        self.caches[name] = cache
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache lookups answered from the cache", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups not answered from the cache", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Share of cache lookups that were hits", labels=["cache"])
+        for name, cache in self.caches.items():
+            cache_hits, cache_misses = cache.hits, cache.misses
+            hits.add_metric([name], cache_hits)
+            misses.add_metric([name], cache_misses)
+            lookups = cache_hits + cache_misses
+            ratio.add_metric([name], cache_hits / lookups if lookups else 0.0)
+        return [hits, misses, ratio]
+
+
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+
+def register_cache(name: str, cache):
+    """Reports ``cache.hits`` and ``cache.misses`` of the cache as cache_hits_total/cache_misses_total{cache=name}."""
+    cache_collector.register(name, cache)
+
+
+def sample_threadpool():
+    """Reads the state of the threadpool behind run_in_threadpool, from within the event loop."""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_LIMIT.set(limiter.total_tokens)
+    THREADPOOL_WAITING.set(limiter.statistics().tasks_waiting)
+    return limiter.borrowed_tokens >= limiter.total_tokens
+
+
+class RuntimeSampler:
+    """
+    Background task sampling threadpool usage and event loop lag every ``interval`` seconds, values only visible
+    while they last (a saturated threadpool, a blocked loop) would otherwise be missed between two scrapes.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            scheduled = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(time.perf_counter() - scheduled, 0.0))
+            if sample_threadpool():
+                THREADPOOL_SATURATED.inc(self.interval)
+
+
+runtime_sampler = RuntimeSampler(METRICS_SAMPLE_INTERVAL_SECONDS)
+
+
+def render_metrics() -> bytes:
+    sample_threadpool()
+    return generate_latest(REGISTRY)
+
+
+# Event loops waiting in select and threadpool threads waiting for work, their samples are left out
+IDLE_LEAF_FUNCTIONS = {"select", "poll"}
+IDLE_FRAME = "queue.py:Queue.get"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for the requests of one route: while such a request is in flight, a background thread
+    records the stacks of the event loop thread serving it and of the threadpool threads every ``interval``
+    seconds. Concurrent requests to other routes running in the same threads show up in the samples as well.
+    Stacks are aggregated in the folded format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self):
+        self.route: Optional[str] = None
+        self.method: Optional[str] = None
+        self.interval = 0.005
+        self.started_at: Optional[float] = None
+        self.until = 0.0
+        self.samples = 0
+        self.stacks: StackCounter = StackCounter()
+        self._path_regex: Optional[re.Pattern] = None
+        self._active: Dict[int, int] = {}  # event loop thread id -> requests of the route in flight
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, route: str, method: str, path_regex: re.Pattern, interval: float, duration: float):
+        self.stop()
+        with self._lock:
+            self.route, self.method, self._path_regex = route, method, path_regex
+            self.interval = interval
+            self.started_at = time.time()
+            self.until = time.monotonic() + min(duration, PROFILER_MAX_SECONDS)
+            self.samples = 0
+            self.stacks = StackCounter()
+            self._active = {}
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logger.info("Profiling %s %s every %sms for %ss", method, route, interval * 1000, duration)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._path_regex = None
+
+    def matches(self, scope) -> bool:
+        path_regex = self._path_regex
+        return path_regex is not None and scope["method"] == self.method and bool(path_regex.match(scope["path"]))
+
+    def enter(self) -> int:
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active[thread_id] = self._active.get(thread_id, 0) + 1
+        return thread_id
+
+    def exit(self, thread_id: int):
+        with self._lock:
+            if self._active.get(thread_id, 0) <= 1:
+                self._active.pop(thread_id, None)
+            else:
+                self._active[thread_id] -= 1
+
+    @staticmethod
+    def fold(frame) -> Optional[str]:
+        if frame.f_code.co_name in IDLE_LEAF_FUNCTIONS:
+            return None
+        names = []
+        while frame is not None:
+            names.append(f"{frame.f_code.co_filename.rsplit('/', 1)[-1]}:{frame.f_code.co_qualname}")
+            frame = frame.f_back
+        if IDLE_FRAME in names:
+            return None
+        return ";".join(reversed(names))
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval) and time.monotonic() < self.until:
+            with self._lock:
+                loop_threads = set(self._active)
+            if not loop_threads:
+                continue
+            worker_threads = {thread.ident for thread in threading.enumerate()
+                              if thread.name.startswith("AnyIO worker thread")}
+            sampled = False
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (thread_id not in loop_threads and thread_id not in worker_threads):
+                    continue
+                stack = self.fold(frame)
+                if stack is not None:
+                    self.stacks[stack] += 1
+                    sampled = True
+            self.samples += sampled
+
+    def report(self, limit: int = 50) -> dict:
+        return {
+            "route": self.route,
+            "method": self.method,
+            "running": self.running,
+            "started_at": self.started_at,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": [{"stack": stack, "count": count} for stack, count in self.stacks.most_common(limit)],
+        }
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+profiler = SamplingProfiler()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency, status, response size and database work of every request by route
+    template, and running the profiler for the requests of the profiled route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+        response_size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        profiled_thread = profiler.enter() if profiler.matches(scope) else None
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            duration = time.perf_counter() - started
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            if profiled_thread is not None:
+                profiler.exit(profiled_thread)
+            request_stats.reset(token)
+            # The router stores the matched route in the scope, its path template keeps the label set bounded
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            HTTP_REQUEST_DURATION.labels(method, route).observe(duration)
+            HTTP_RESPONSE_SIZE.labels(method, route).observe(response_size)
+            DB_QUERIES_PER_REQUEST.labels(method, route).observe(stats.queries)
+            DB_TIME_PER_REQUEST.labels(method, route).observe(stats.db_seconds)
@@ -0,0 +1,264 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from backend.core.analysis_cache import analysis_cache
+from backend.core.blob_store import read_file_data
+from backend.core.images import format_perceptual_hash, perceptual_hash
+from backend.core.logging_config import logger
+from backend.models.content_blob import ContentBlob
+from backend.models.uploaded_file import UploadedFile
+
+load_dotenv()
+NEAR_DUPLICATE_MIN_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_MIN_SIMILARITY", "0.9"))
+NEAR_DUPLICATE_REUSE_ANALYSIS = os.getenv("NEAR_DUPLICATE_REUSE_ANALYSIS", "true").lower() == "true"
+# Similarity of the detailed hashes required before an analysis is reused, see verify_near_duplicate
+NEAR_DUPLICATE_VERIFY_MIN_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_VERIFY_MIN_SIMILARITY", "0.85"))
+NEAR_DUPLICATE_INDEX_REBUILD_SECONDS = int(os.getenv("NEAR_DUPLICATE_INDEX_REBUILD_SECONDS", "600"))
+# Uploads are stamped before their transaction commits: a sync reads again the uploads stamped up to this long
+# before the newest one it has seen, so uploads committed that much later than others are not missed
+NEAR_DUPLICATE_SYNC_WINDOW_SECONDS = int(os.getenv("NEAR_DUPLICATE_SYNC_WINDOW_SECONDS", "300"))
+
+PHASH_BITS = 64
+DETAILED_HASH_IMAGE_SIZE = 64
+DETAILED_HASH_FREQUENCIES = 16  # 256-bit hash
+MAX_REUSE_CANDIDATES = 20  # Nearest neighbours whose cached analyses are looked up per image
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def max_distance(min_similarity: float, bits: int = PHASH_BITS) -> int:
+    """Largest Hamming distance of two hashes with at least ``min_similarity`` (1 - distance / bits)."""
+    return int(bits * (1 - min_similarity) + 1e-9)
+
+
+def similarity(distance: int, bits: int = PHASH_BITS) -> float:
+    return round(1 - distance / bits, 4)
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of integers under the Hamming distance. Every child is stored under its distance to the
+    parent, a search within ``max_distance`` of a value only descends into children whose distance to the parent is
+    within ``max_distance`` of the value's own distance to it (triangle inequality), which at small radii visits a
+    small part of the tree.
+    """
+
+    def __init__(self):
+        self.root: Optional[tuple] = None  # (value, {distance: child})
+        self.size = 0
+
+    def add(self, value: int):
+        if self.root is None:
+            self.root = (value, {})
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (value, {})
+                self.size += 1
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, int]]:
+        """All stored values within ``max_distance`` as (distance, value) pairs, unordered."""
+        matches = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                matches.append((distance, node_value))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return matches
+
+
+class NearDuplicateIndex:
+    """
+    In-process index of the perceptual hashes of all stored content. It is loaded from ``content_blobs`` on first
+    use and brought up to date before every lookup with the uploads added since, so content uploaded by other
+    processes is found as well. Deleted content stays in the index until it is rebuilt every ``rebuild_seconds``,
+    callers match the returned hashes against the database anyway.
+    """
+
+    def __init__(self, rebuild_seconds: int):
+        self.rebuild_seconds = rebuild_seconds
+        self._tree = BKTree()
+        self._hashes: Dict[int, Set[str]] = {}  # perceptual hash -> file hashes of the content having it
+        self._synced_at: Optional[datetime] = None  # Newest upload seen
+        self._recent: Dict[int, datetime] = {}  # file id -> uploaded_at of the uploads seen within the sync window
+        self._built_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _add(self, file_hash: str, phash: int):
+        self._tree.add(phash)
+        self._hashes.setdefault(phash, set()).add(file_hash)
+
+    def add(self, file_hash: str, phash: int):
+        with self._lock:
+            if self._built_at is not None:
+                self._add(file_hash, phash)
+
+    def sync(self, db: Session):
+        with self._lock:
+            if self._built_at is None or time.monotonic() - self._built_at > self.rebuild_seconds:
+                self._tree, self._hashes, self._recent = BKTree(), {}, {}
+                # Read first: uploads committed during the build are within the window of the next sync
+                self._synced_at = db.execute(select(func.max(UploadedFile.uploaded_at))).scalar()
+                rows = db.execute(select(ContentBlob.file_hash, ContentBlob.phash)
+                                  .where(ContentBlob.ref_count > 0, ContentBlob.phash.isnot(None))).all()
+                self._built_at = time.monotonic()
+                logger.info("Near-duplicate index built from %s images", len(rows))
+            else:
+                query = select(UploadedFile.id, UploadedFile.uploaded_at, ContentBlob.file_hash, ContentBlob.phash) \
+                    .join(ContentBlob, ContentBlob.file_hash == UploadedFile.file_hash)
+                if self._synced_at is not None:
+                    window = timedelta(seconds=NEAR_DUPLICATE_SYNC_WINDOW_SECONDS)
+                    query = query.where(UploadedFile.uploaded_at >= self._synced_at - window)
+                new_rows = [row for row in db.execute(query).all() if row.id not in self._recent]
+                for row in new_rows:
+                    if row.uploaded_at is not None:
+                        self._recent[row.id] = row.uploaded_at
+                        self._synced_at = max(self._synced_at or row.uploaded_at, row.uploaded_at)
+                if self._synced_at is not None:
+                    since = self._synced_at - timedelta(seconds=NEAR_DUPLICATE_SYNC_WINDOW_SECONDS)
+                    self._recent = {file_id: stamp for file_id, stamp in self._recent.items() if stamp >= since}
+                rows = [(row.file_hash, row.phash) for row in new_rows if row.phash]
+            for file_hash, phash in rows:
+                self._add(file_hash, int(phash, 16))
+
+    def search(self, phash: int, max_distance: int) -> List[Tuple[int, str]]:
+        """File hashes of the content within ``max_distance`` of ``phash``, nearest first."""
+        with self._lock:
+            matches = self._tree.search(phash, max_distance)
+            return sorted((distance, file_hash) for distance, value in matches for file_hash in self._hashes[value])
+
+
+near_duplicate_index = NearDuplicateIndex(NEAR_DUPLICATE_INDEX_REBUILD_SECONDS)
+
+
+def compute_perceptual_hashes(db: Session, file_hashes: List[str]) -> Dict[str, int]:
+    """
+    Computes and stores the perceptual hash of content uploaded before hashes were computed at upload. Content that
+    can not be read or decoded is skipped.
+    """
+    uploaded_files = db.execute(
+        select(UploadedFile).where(UploadedFile.file_hash.in_(file_hashes))
+    ).scalars().all()
+    phashes = {}
+    for uploaded_file in uploaded_files:
+        if uploaded_file.file_hash in phashes:
+            continue
+        try:
+            phashes[uploaded_file.file_hash] = perceptual_hash(read_file_data(uploaded_file))
+        except Exception as e:
+            logger.warning("Can not compute perceptual hash of %s: %s", uploaded_file.file_hash, e)
+    if phashes:
+        db.execute(update(ContentBlob), [{"file_hash": file_hash, "phash": format_perceptual_hash(phash)}
+                                         for file_hash, phash in phashes.items()])
+        db.commit()
+        for file_hash, phash in phashes.items():
+            near_duplicate_index.add(file_hash, phash)
+    return phashes
+
+
+def get_perceptual_hashes(db: Session, file_hashes: List[str]) -> Dict[str, int]:
+    """Perceptual hashes of the given content, computing those that are missing."""
+    rows = db.execute(
+        select(ContentBlob.file_hash, ContentBlob.phash).where(ContentBlob.file_hash.in_(file_hashes))
+    ).all()
+    phashes = {file_hash: int(phash, 16) for file_hash, phash in rows if phash}
+    missing = [file_hash for file_hash, phash in rows if not phash]
+    if missing:
+        phashes.update(compute_perceptual_hashes(db, missing))
+    return phashes
+
+
+def search_near_duplicates(file_hash: str, phash: int, min_similarity: float) -> List[Tuple[int, str]]:
+    return [(distance, other_hash)
+            for distance, other_hash in near_duplicate_index.search(phash, max_distance(min_similarity))
+            if other_hash != file_hash]
+
+
+def find_near_duplicates(db: Session, file_hash: str, min_similarity: float) -> List[Tuple[int, str]]:
+    """(distance, file hash) of other content similar to the given one, nearest first."""
+    phash = get_perceptual_hashes(db, [file_hash]).get(file_hash)
+    if phash is None:
+        return []
+    near_duplicate_index.sync(db)
+    return search_near_duplicates(file_hash, phash, min_similarity)
+
+
+class DetailedHashes:
+    """
+    256-bit perceptual hashes of content, computed from its bytes on first use. Charts drawn from one template can
+    share most of their 64 bits while showing different data, the detailed hash tells them apart.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._hashes: Dict[str, Optional[int]] = {}
+
+    def get(self, file_hash: str) -> Optional[int]:
+        if file_hash not in self._hashes:
+            uploaded_file = self.db.execute(
+                select(UploadedFile).where(UploadedFile.file_hash == file_hash).limit(1)
+            ).scalars().first()
+            try:
+                self._hashes[file_hash] = perceptual_hash(read_file_data(uploaded_file), DETAILED_HASH_IMAGE_SIZE,
+                                                          DETAILED_HASH_FREQUENCIES)
+            except Exception as e:
+                logger.warning("Can not compute detailed perceptual hash of %s: %s", file_hash, e)
+                self._hashes[file_hash] = None
+        return self._hashes[file_hash]
+
+
+def verify_near_duplicate(detailed_hashes: DetailedHashes, file_hash: str, other_hash: str) -> bool:
+    """Whether the two images are similar enough for an analysis of one to be reused for the other."""
+    bits = DETAILED_HASH_FREQUENCIES ** 2
+    detailed, other_detailed = detailed_hashes.get(file_hash), detailed_hashes.get(other_hash)
+    if detailed is None or other_detailed is None:
+        return False
+    return hamming_distance(detailed, other_detailed) <= max_distance(NEAR_DUPLICATE_VERIFY_MIN_SIMILARITY, bits)
+
+
+def find_reusable_results(db: Session, file_hashes: List[str], make_key: Callable[[str], str],
+                          min_similarity: float = NEAR_DUPLICATE_MIN_SIMILARITY) -> Dict[str, dict]:
+    """
+    Cached analyses of near-duplicates: for every hash the answer cached under ``make_key(other_hash)`` of the most
+    similar other content having one, confirmed by ``verify_near_duplicate``. Returns hash -> {"result",
+    "file_hash", "similarity"} for the hashes found.
+    """
+    phashes = get_perceptual_hashes(db, file_hashes)
+    if not phashes:
+        return {}
+    near_duplicate_index.sync(db)
+    candidates = {file_hash: search_near_duplicates(file_hash, phash, min_similarity)[:MAX_REUSE_CANDIDATES]
+                  for file_hash, phash in phashes.items()}
+    cache_keys = {other_hash: make_key(other_hash)
+                  for matches in candidates.values() for _, other_hash in matches}
+    cached_results = analysis_cache.get_many(db, list(set(cache_keys.values())), count=False)
+
+    reusable = {}
+    detailed_hashes = DetailedHashes(db)
+    for file_hash, matches in candidates.items():
+        for distance, other_hash in matches:
+            result = cached_results.get(cache_keys[other_hash])
+            if result is not None and verify_near_duplicate(detailed_hashes, file_hash, other_hash):
+                reusable[file_hash] = {"result": result, "file_hash": other_hash, "similarity": similarity(distance)}
+                break
+    analysis_cache.count_near_duplicate_hits(len(reusable))
+    return reusable
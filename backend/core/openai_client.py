@@ -1,61 +1,238 @@
-import openai
+import asyncio
 import base64
+import os
+import random
+import time
+from typing import AsyncIterator, Optional
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, APITimeoutError
+from backend.core.logging_config import logger
+from backend.core.metrics import OPENAI_IN_FLIGHT, OPENAI_TIME_TO_FIRST_TOKEN, observe_openai_call
+from backend.core.rate_limit import TokenBucket
+from backend.core.vision_backend import VisionBackend, VisionBackendError
 
+load_dotenv()
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # e.g. http://127.0.0.1:8001/v1 for backend/testing/mock_openai.py
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "30000"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
 
-class OpenAIClient:
-    def __init__(self, api_key: str):
+RETRY_BASE_DELAY_SECONDS = 0.5
+RETRY_MAX_DELAY_SECONDS = 20.0
+# Rough token cost of one image at default detail, used to reserve TPM quota before the real usage is known
+IMAGE_TOKEN_ESTIMATE = 765
+
+
+class OpenAIClientError(VisionBackendError):
+    pass
+
+
+class OpenAIClient(VisionBackend):
+    """
+    Asynchronous client of the OpenAI chat completions API. All calls share one pooled keep-alive HTTP client,
+    at most ``max_concurrency`` calls are in flight at once and RPM/TPM quotas are enforced with token buckets.
+    Rate-limit (429), server (5xx), timeout and connection errors are retried with exponential backoff and jitter.
+    """
+    name = "openai"
+
+    def __init__(self, api_key: str, model: str = "gpt-4o", max_tokens: int = 300,
+                 base_url: Optional[str] = OPENAI_BASE_URL, max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+                 max_connections: int = OPENAI_MAX_CONNECTIONS, timeout: float = OPENAI_TIMEOUT_SECONDS,
+                 max_retries: int = OPENAI_MAX_RETRIES, requests_per_minute: int = OPENAI_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = OPENAI_TOKENS_PER_MINUTE):
         self.api_key = api_key
-        openai.api_key = self.api_key
+        self.model = model
+        self.max_tokens = max_tokens
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
 
-    def analyze_image_with_base64(self, image_data: bytes, prompt: str, mime_type: str = "image/png") -> str:
-        try:
-            base64_image = base64.b64encode(image_data).decode("utf-8")
-            data_url = f"data:{mime_type};base64,{base64_image}"
-            response = openai.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": data_url},
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=300,
+    def _get_client(self) -> AsyncOpenAI:
+        # httpx connection pools are bound to the event loop they were created in
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=self.timeout,
             )
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http_client,
+                                       max_retries=0)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client
 
-            return response.choices[0].message.content
-
-        except Exception as e:
-            raise Exception(f"OpenAI API Error: {e}")
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
 
-    def analyze_image_with_description_base64(self, image_data: bytes, description: str, prompt: str, mime_type: str = "image/png"):
-        try:
-            base64_image = base64.b64encode(image_data).decode("utf-8")
-            data_url = f"data:{mime_type};base64,{base64_image}"
-            prompt += base64.b64encode(description.encode("utf-8")).decode("utf-8")
-            response = openai.chat.completions.create(
-                model="gpt-4o",
-                messages=[
+    @staticmethod
+    def build_messages(prompt: str, image_data: bytes, mime_type: str, detail: Optional[str] = None) -> list:
+        base64_image = base64.b64encode(image_data).decode("utf-8")
+        data_url = f"data:{mime_type};base64,{base64_image}"
+        image_url = {"url": data_url}
+        if detail:
+            image_url["detail"] = detail
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
                     {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": data_url},
-                            }
-                        ]
+                        "type": "image_url",
+                        "image_url": image_url,
                     }
-                ],
-                max_tokens=300
-            )
+                ]
+            }
+        ]
 
+    def estimate_tokens(self, prompt: str, image_tokens: Optional[int] = None) -> int:
+        return len(prompt) // 4 + (image_tokens or IMAGE_TOKEN_ESTIMATE) + self.max_tokens
+
+    def retry_delay(self, attempt: int, error: Exception) -> float:
+        retry_after = None
+        if isinstance(error, APIStatusError):
+            retry_after = error.response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), RETRY_MAX_DELAY_SECONDS)
+            except ValueError:
+                pass
+        # Full jitter: spreads retries of many concurrent calls instead of retrying them in lockstep
+        return random.uniform(0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** attempt))
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        if isinstance(error, (APITimeoutError, APIConnectionError)):
+            return True
+        return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+    async def complete(self, prompt: str, image_data: bytes, mime_type: str = "image/png",
+                       timeout: Optional[float] = None, detail: Optional[str] = None,
+                       image_tokens: Optional[int] = None) -> str:
+        client = self._get_client()
+        messages = self.build_messages(prompt, image_data, mime_type, detail)
+        estimated_tokens = self.estimate_tokens(prompt, image_tokens)
+
+        attempt = 0
+        while True:
+            await self.request_bucket.acquire()
+            await self.token_bucket.acquire(estimated_tokens)
+            try:
+                async with self._semaphore:
+                    started = time.perf_counter()
+                    with OPENAI_IN_FLIGHT.track_inprogress():
+                        response = await client.chat.completions.create(
+                            model=self.model,
+                            messages=messages,
+                            max_tokens=self.max_tokens,
+                            timeout=timeout or self.timeout,
+                        )
+            except Exception as e:
+                observe_openai_call(self.model, started, error=e)
+                if not self.is_retryable(e) or attempt >= self.max_retries:
+                    status_code = e.status_code if isinstance(e, APIStatusError) else None
+                    raise OpenAIClientError(f"OpenAI API Error: {e}", status_code=status_code)
+                delay = self.retry_delay(attempt, e)
+                attempt += 1
+                logger.warning("OpenAI call failed (%s), retry %s/%s in %.2fs", e, attempt, self.max_retries, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            observe_openai_call(self.model, started, usage=response.usage)
+            if response.usage is not None:
+                self.token_bucket.refund(estimated_tokens - response.usage.total_tokens)
             return response.choices[0].message.content
 
+    async def stream_completion(self, prompt: str, image_data: bytes, mime_type: str = "image/png",
+                                timeout: Optional[float] = None, detail: Optional[str] = None,
+                                image_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Yields the answer token by token as the model produces it. Failures are only retried until the stream is
+        opened, later errors would duplicate already delivered tokens. Closing the generator closes the HTTP stream.
+        """
+        client = self._get_client()
+        messages = self.build_messages(prompt, image_data, mime_type, detail)
+        estimated_tokens = self.estimate_tokens(prompt, image_tokens)
+
+        attempt = 0
+        while True:
+            await self.request_bucket.acquire()
+            await self.token_bucket.acquire(estimated_tokens)
+            await self._semaphore.acquire()
+            started = time.perf_counter()
+            OPENAI_IN_FLIGHT.inc()
+            try:
+                stream = await client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=self.max_tokens,
+                    timeout=timeout or self.timeout,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+            except Exception as e:
+                self._semaphore.release()
+                OPENAI_IN_FLIGHT.dec()
+                observe_openai_call(self.model, started, error=e)
+                if not self.is_retryable(e) or attempt >= self.max_retries:
+                    status_code = e.status_code if isinstance(e, APIStatusError) else None
+                    raise OpenAIClientError(f"OpenAI API Error: {e}", status_code=status_code)
+                delay = self.retry_delay(attempt, e)
+                attempt += 1
+                logger.warning("OpenAI call failed (%s), retry %s/%s in %.2fs", e, attempt, self.max_retries, delay)
+                await asyncio.sleep(delay)
+                continue
+            break
+
+        usage, error, first_token = None, None, True
+        try:
+            async with stream:
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        usage = chunk.usage
+                        self.token_bucket.refund(estimated_tokens - chunk.usage.total_tokens)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token:
+                            OPENAI_TIME_TO_FIRST_TOKEN.labels(self.model).observe(time.perf_counter() - started)
+                            first_token = False
+                        yield chunk.choices[0].delta.content
         except Exception as e:
-            raise Exception(f"OpenAI API Error: {e}")
+            error = e
+            raise OpenAIClientError(f"OpenAI API Error: {e}")
+        finally:
+            self._semaphore.release()
+            OPENAI_IN_FLIGHT.dec()
+            observe_openai_call(self.model, started, error=error, usage=usage)
+
+    async def analyze_image_with_base64(self, image_data: bytes, prompt: str, mime_type: str = "image/png",
+                                        detail: Optional[str] = None, image_tokens: Optional[int] = None) -> str:
+        return await self.complete(prompt, image_data, mime_type, detail=detail, image_tokens=image_tokens)
+
+    async def analyze_image_with_description_base64(self, image_data: bytes, description: str, prompt: str,
+                                                    mime_type: str = "image/png", detail: Optional[str] = None,
+                                                    image_tokens: Optional[int] = None) -> str:
+        prompt += base64.b64encode(description.encode("utf-8")).decode("utf-8")
+        return await self.complete(prompt, image_data, mime_type, detail=detail, image_tokens=image_tokens)
+
+    def stream_image_with_base64(self, image_data: bytes, prompt: str, mime_type: str = "image/png",
+                                 detail: Optional[str] = None, image_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        return self.stream_completion(prompt, image_data, mime_type, detail=detail, image_tokens=image_tokens)
+
+    def stream_image_with_description_base64(self, image_data: bytes, description: str, prompt: str,
+                                             mime_type: str = "image/png", detail: Optional[str] = None,
+                                             image_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        prompt += base64.b64encode(description.encode("utf-8")).decode("utf-8")
+        return self.stream_completion(prompt, image_data, mime_type, detail=detail, image_tokens=image_tokens)
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at ``rate_per_minute``, holding at most ``capacity`` tokens
+    (by default one minute worth of tokens).
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, amount: float = 1) -> bool:
+        """Takes ``amount`` tokens if available, without waiting."""
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return True
+            return False
+
+    def _reserve(self, amount: float) -> float:
+        # Requests larger than the bucket can never be satisfied in full, cap them at its capacity
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self, amount: float = 1):
+        """Takes ``amount`` tokens, sleeping until the bucket has refilled enough to cover them."""
+        wait = self._reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def refund(self, amount: float):
+        """Corrects an earlier estimate, a negative amount takes additional tokens."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def retry_after(self, amount: float = 1) -> float:
+        """Seconds until ``amount`` tokens will be available."""
+        with self._lock:
+            self._refill()
+            return max(0.0, (amount - self.tokens) / self.rate)
+
+
+class KeyedRateLimiter:
+    """
+    One token bucket per key (client IP, account e-mail). Only the ``max_keys`` most recently used buckets are
+    kept, a dropped bucket is simply recreated full.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None, max_keys: int = 100000):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key: str) -> float:
+        """Takes a token for ``key``. Returns 0 when it was taken, otherwise the seconds to wait for one."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate_per_minute, self.capacity)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+        if bucket.try_acquire():
+            return 0.0
+        return bucket.retry_after()
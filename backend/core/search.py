@@ -0,0 +1,84 @@
+import html
+import re
+from typing import List, Optional
+from sqlalchemy import Boolean, DateTime, Float, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Words of the query, split like the unicode61 tokenizer of SQLite and the 'simple' configuration of PostgreSQL do
+WORD_PATTERN = re.compile(r"[^\W_]+")
+MAX_QUERY_WORDS = 16
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_WORDS = 16
+# The database encloses matches in these, they become the tags once the user's text is HTML-escaped
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+HEADLINE_OPTIONS = (f"StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords={SNIPPET_WORDS}, "
+                    f"MinWords={SNIPPET_WORDS // 2}, MaxFragments=1")
+
+# Ranking weights of the indexed columns: file name, tweet text, analysis
+SQLITE_SEARCH = text(f"""
+    SELECT f.id, f.file_name, f.uploaded_at, f.analysis_result, f.uploaded_text, f.does_match,
+           -bm25(uploaded_files_fts, 10.0, 5.0, 1.0) AS score,
+           snippet(uploaded_files_fts, -1, :match_start, :match_end, '…', {SNIPPET_WORDS}) AS snippet
+    FROM uploaded_files_fts JOIN uploaded_files f ON f.id = uploaded_files_fts.rowid
+    WHERE uploaded_files_fts MATCH :query AND f.owner_id = :owner_id
+    ORDER BY score DESC, f.id DESC
+    LIMIT :limit OFFSET :offset
+""").columns(uploaded_at=DateTime, does_match=Boolean, score=Float)
+# The headline is computed for the rows of the page only, it re-parses their texts
+POSTGRESQL_SEARCH = text("""
+    SELECT f.id, f.file_name, f.uploaded_at, f.analysis_result, f.uploaded_text, f.does_match, page.score,
+           ts_headline('simple', concat_ws(' ', f.file_name, f.uploaded_text, f.analysis_result), page.query,
+                       :headline_options) AS snippet
+    FROM (
+        SELECT f.id, query, ts_rank_cd(f.search_vector, query) AS score
+        FROM uploaded_files f, to_tsquery('simple', :query) query
+        WHERE f.owner_id = :owner_id AND f.search_vector @@ query
+        ORDER BY score DESC, f.id DESC
+        LIMIT :limit OFFSET :offset
+    ) page JOIN uploaded_files f ON f.id = page.id
+    ORDER BY page.score DESC, f.id DESC
+""").columns(uploaded_at=DateTime, does_match=Boolean, score=Float)
+
+
+def query_words(query: str) -> List[str]:
+    """Distinct lowercase words of a search query, in order. Operators and quotes of the user are dropped."""
+    words = []
+    for word in WORD_PATTERN.findall(query.lower()):
+        if word not in words:
+            words.append(word)
+    return words[:MAX_QUERY_WORDS]
+
+
+def fts5_query(words: List[str]) -> str:
+    """All words, the last one as a prefix so results show up while the user is typing."""
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+def tsquery(words: List[str]) -> str:
+    return " & ".join(words) + ":*"
+
+
+def highlight(snippet: Optional[str]) -> Optional[str]:
+    """HTML-escapes a snippet of the user's text, then marks its matches with SNIPPET_START and SNIPPET_END."""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(MATCH_START, SNIPPET_START).replace(MATCH_END, SNIPPET_END)
+
+
+async def search_files(db: AsyncSession, owner_id: int, words: List[str], limit: int, offset: int) -> List[dict]:
+    """
+    Files of the owner whose name, tweet text or analysis contain all ``words``, best matches first. Every row
+    has a ``score`` (higher is better, comparable within one query only) and a ``snippet`` of the matching text,
+    HTML-escaped, with the matches between SNIPPET_START and SNIPPET_END.
+    """
+    parameters = {"owner_id": owner_id, "limit": limit, "offset": offset}
+    if db.bind.dialect.name == "postgresql":
+        statement = POSTGRESQL_SEARCH
+        parameters.update(query=tsquery(words), headline_options=HEADLINE_OPTIONS)
+    else:
+        statement = SQLITE_SEARCH
+        parameters.update(query=fts5_query(words), match_start=MATCH_START, match_end=MATCH_END)
+    rows = await db.execute(statement, parameters)
+    return [{**row._mapping, "snippet": highlight(row.snippet)} for row in rows]
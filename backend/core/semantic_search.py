@@ -0,0 +1,178 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from backend.core.database import SessionLocal
+from backend.core.embeddings import Embedder, get_embedder
+from backend.core.images import get_thumbnail
+from backend.core.logging_config import logger
+from backend.core.vector_index import IVFIndex
+from backend.models.file_embedding import FileEmbedding
+from backend.models.uploaded_file import UploadedFile
+
+load_dotenv()
+SEMANTIC_SEARCH_PROBES = int(os.getenv("SEMANTIC_SEARCH_PROBES", "16"))
+# Owners with fewer embedded files are searched exactly, which is cheaper than probing lists for them
+SEMANTIC_SEARCH_EXACT_BELOW = int(os.getenv("SEMANTIC_SEARCH_EXACT_BELOW", "20000"))
+# Embeddings are stamped before their transaction commits: a sync reads again the rows stamped up to this long
+# before the newest one it has seen, so rows committed that much later than others are not missed
+SEMANTIC_SYNC_WINDOW_SECONDS = int(os.getenv("SEMANTIC_SYNC_WINDOW_SECONDS", "300"))
+
+LOAD_BATCH_SIZE = 10000
+
+
+def embedding_text(uploaded_file: UploadedFile) -> Optional[str]:
+    return "\n".join(text for text in (uploaded_file.uploaded_text, uploaded_file.analysis_result) if text) or None
+
+
+class SemanticIndex:
+    """
+    In-process IVF index (see core/vector_index.py) of the ``file_embeddings`` of the configured embedder. It is
+    loaded on first use and brought up to date before every search with the embeddings written since, by this or
+    other processes. Files deleted by other processes are dropped when a search finds them missing.
+
+    Every process holds all embeddings of all users: 4 bytes per dimension plus 16 for the file and owner id, about
+    3 KB per file with the 736 dimensions of the local embedder (3 GB per million files), up to twice that while
+    the arrays grow.
+    """
+
+    def __init__(self):
+        self._index: Optional[IVFIndex] = None
+        self._synced_at: Optional[datetime] = None
+        self._recent: Dict[int, datetime] = {}  # file id -> updated_at of the rows within the sync window
+        self._lock = threading.Lock()
+
+    def _rows(self, db: Session, embedder: Embedder, query):
+        query = query.join(UploadedFile, UploadedFile.id == FileEmbedding.file_id) \
+            .where(FileEmbedding.model == embedder.model)
+        return db.execute(query.add_columns(UploadedFile.owner_id)).all()
+
+    def _add(self, rows: list):
+        for row in rows:
+            self._index.add(row.file_id, row.owner_id or 0, np.frombuffer(row.vector, np.float32))
+            if self._synced_at is None or row.updated_at > self._synced_at:
+                self._synced_at = row.updated_at
+            if row.updated_at >= self._synced_at - timedelta(seconds=SEMANTIC_SYNC_WINDOW_SECONDS):
+                self._recent[row.file_id] = row.updated_at
+
+    def sync(self, db: Session):
+        embedder = get_embedder()
+        columns = select(FileEmbedding.file_id, FileEmbedding.vector, FileEmbedding.updated_at)
+        with self._lock:
+            if self._index is None:
+                self._index = IVFIndex(embedder.dimension, SEMANTIC_SEARCH_PROBES)
+                last_id = 0
+                while True:
+                    rows = self._rows(db, embedder, columns.where(FileEmbedding.file_id > last_id)
+                                      .order_by(FileEmbedding.file_id).limit(LOAD_BATCH_SIZE))
+                    if not rows:
+                        break
+                    self._add(rows)
+                    last_id = rows[-1].file_id
+                logger.info("Semantic index loaded with %s embeddings (%s MB)", len(self._index),
+                            self._index.store.vectors.nbytes // 2 ** 20)
+            elif self._synced_at is not None:
+                # Only the stamps of the window are read again, vectors of the rows not indexed yet
+                since = self._synced_at - timedelta(seconds=SEMANTIC_SYNC_WINDOW_SECONDS)
+                stamps = self._rows(db, embedder, select(FileEmbedding.file_id, FileEmbedding.updated_at)
+                                    .where(FileEmbedding.updated_at >= since))
+                file_ids = [row.file_id for row in stamps if self._recent.get(row.file_id) != row.updated_at]
+                for start in range(0, len(file_ids), LOAD_BATCH_SIZE):
+                    batch = file_ids[start:start + LOAD_BATCH_SIZE]
+                    self._add(self._rows(db, embedder, columns.where(FileEmbedding.file_id.in_(batch))))
+            else:
+                self._add(self._rows(db, embedder, columns))
+            if self._synced_at is not None:
+                since = self._synced_at - timedelta(seconds=SEMANTIC_SYNC_WINDOW_SECONDS)
+                self._recent = {file_id: stamp for file_id, stamp in self._recent.items() if stamp >= since}
+            if self._index.needs_training():
+                self._index.train()
+                logger.info("Semantic index trained on %s embeddings", len(self._index))
+
+    def add(self, file_id: int, owner_id: Optional[int], vector: np.ndarray):
+        with self._lock:
+            if self._index is not None:
+                self._index.add(file_id, owner_id or 0, vector)
+
+    def remove(self, file_ids: List[int]):
+        with self._lock:
+            if self._index is not None:
+                for file_id in file_ids:
+                    self._index.remove(file_id)
+
+    def search(self, query: np.ndarray, k: int, owner_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        with self._lock:
+            return self._index.search(query, k, owner_id, SEMANTIC_SEARCH_EXACT_BELOW)
+
+
+semantic_index = SemanticIndex()
+
+
+def embed_files(db: Session, file_ids: List[int]) -> dict:
+    """
+    Computes and stores the embeddings of the given files from their thumbnails and texts. Files whose image can
+    not be read are skipped. Returns file id -> vector of the files embedded.
+    """
+    embedder = get_embedder()
+    uploaded_files = db.execute(select(UploadedFile).where(UploadedFile.id.in_(file_ids))).scalars().all()
+    vectors = {}
+    for uploaded_file in uploaded_files:
+        try:
+            vectors[uploaded_file.id] = embedder.embed_file(get_thumbnail(uploaded_file),
+                                                            embedding_text(uploaded_file))
+        except Exception as e:
+            logger.warning("Can not embed file %s: %s", uploaded_file.id, e)
+    if not vectors:
+        return {}
+    now = datetime.now()
+    db.execute(delete(FileEmbedding).where(FileEmbedding.file_id.in_(list(vectors))))
+    db.execute(insert(FileEmbedding), [{"file_id": file_id, "model": embedder.model, "updated_at": now,
+                                        "vector": vector.astype(np.float32).tobytes()}
+                                       for file_id, vector in vectors.items()])
+    db.commit()
+    owners = {uploaded_file.id: uploaded_file.owner_id for uploaded_file in uploaded_files}
+    for file_id, vector in vectors.items():
+        semantic_index.add(file_id, owners[file_id], vector)
+    return vectors
+
+
+def embed_analyzed_files(file_ids: List[int]):
+    """Embeds files after their analysis changed, failures are logged and do not fail the analysis."""
+    try:
+        with SessionLocal() as db:
+            embed_files(db, file_ids)
+    except Exception as e:
+        logger.error("Embedding of analyzed files %s failed: %s", file_ids[:10], e)
+
+
+def file_vector(db: Session, file_id: int) -> Optional[np.ndarray]:
+    """Stored embedding of a file, computed now for files not analyzed yet."""
+    embedder = get_embedder()
+    vector = db.execute(select(FileEmbedding.vector).where(FileEmbedding.file_id == file_id,
+                                                           FileEmbedding.model == embedder.model)).scalar()
+    if vector is not None:
+        return np.frombuffer(vector, np.float32)
+    return embed_files(db, [file_id]).get(file_id)
+
+
+def search_embeddings(db: Session, query: np.ndarray, k: int,
+                      owner_id: Optional[int] = None) -> List[Tuple[int, float]]:
+    """
+    (file id, similarity) of the ``k`` files closest to ``query``, optionally among one owner's files only, most
+    similar first. Files deleted since they were indexed are left out and removed from the index.
+    """
+    semantic_index.sync(db)
+    matches = semantic_index.search(query, k, owner_id)
+    if not matches:
+        return []
+    existing = set(db.execute(select(UploadedFile.id).where(
+        UploadedFile.id.in_([file_id for file_id, _ in matches]))).scalars())
+    deleted = [file_id for file_id, _ in matches if file_id not in existing]
+    if deleted:
+        semantic_index.remove(deleted)
+    return [(file_id, score) for file_id, score in matches if file_id in existing]
+
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from backend.core.blob_store import get_blob_store
+from backend.core.images import detect_mime_type
+from backend.core.logging_config import logger
+from backend.core.metrics import register_cache
+from backend.core.uploads import IMAGE_TYPE_ERROR, MAGIC_BYTES_LENGTH, SpooledUpload
+
+load_dotenv()
+TWITTER_API_BASE_URL = os.getenv("TWITTER_API_BASE_URL", "https://api.twitter.com/2")  # or backend/testing/fake_twitter
+TWITTER_CONNECT_TIMEOUT_SECONDS = float(os.getenv("TWITTER_CONNECT_TIMEOUT_SECONDS", "5"))
+TWITTER_READ_TIMEOUT_SECONDS = float(os.getenv("TWITTER_READ_TIMEOUT_SECONDS", "15"))
+TWITTER_MAX_RETRIES = int(os.getenv("TWITTER_MAX_RETRIES", "3"))
+TWITTER_POOL_SIZE = int(os.getenv("TWITTER_POOL_SIZE", "16"))
+TWITTER_CACHE_TTL_SECONDS = int(os.getenv("TWITTER_CACHE_TTL_SECONDS", "3600"))
+TWITTER_CACHE_MAX_ENTRIES = int(os.getenv("TWITTER_CACHE_MAX_ENTRIES", "10000"))
+
+LOOKUP_MAX_IDS = 100  # Tweet lookup accepts at most 100 ids per request
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+TWEET_LOOKUP_PARAMS = {
+    "expansions": "attachments.media_keys",
+    "media.fields": "url,type",
+    "tweet.fields": "text",
+}
+
+
+class TwitterError(Exception):
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class Tweet:
+    tweet_id: str
+    text: str
+    photo_urls: tuple
+
+
+class TweetCache:
+    """
+    In-process cache of looked up tweets by id. Entries live ``ttl_seconds``, the least recently used ones are
+    dropped beyond ``max_entries``. Tweets that were not found are not cached.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tweet_id: str) -> Optional[Tweet]:
+        with self._lock:
+            entry = self._entries.get(tweet_id)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[tweet_id]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(tweet_id)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, tweet: Tweet):
+        with self._lock:
+            self._entries[tweet.tweet_id] = (tweet, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(tweet.tweet_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class TwitterClient:
+    """
+    Client of the Twitter API v2 tweet lookup and of the photo CDN. All calls share one ``requests.Session`` with a
+    keep-alive connection pool per host, connect/read timeouts and retries with exponential backoff on connection
+    errors, 429 (honouring ``Retry-After``) and 5xx. Tweets are cached by id, several ids are looked up in a single
+    request.
+    """
+
+    def __init__(self, bearer_token: Optional[str] = None, base_url: str = TWITTER_API_BASE_URL,
+                 connect_timeout: float = TWITTER_CONNECT_TIMEOUT_SECONDS,
+                 read_timeout: float = TWITTER_READ_TIMEOUT_SECONDS, max_retries: int = TWITTER_MAX_RETRIES,
+                 pool_size: int = TWITTER_POOL_SIZE, cache: Optional[TweetCache] = None):
+        self.bearer_token = bearer_token
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache = cache or TweetCache(TWITTER_CACHE_TTL_SECONDS, TWITTER_CACHE_MAX_ENTRIES)
+        retry = Retry(total=max_retries, backoff_factor=0.5, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=("GET",), respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _lookup(self, tweet_ids: List[str]) -> Dict[str, Union[Tweet, TwitterError]]:
+        if not self.bearer_token:
+            raise TwitterError("Twitter API integration is not configured properly.", status_code=500)
+        try:
+            response = self.session.get(f"{self.base_url}/tweets", params={"ids": ",".join(tweet_ids),
+                                                                           **TWEET_LOOKUP_PARAMS},
+                                        headers={"Authorization": f"Bearer {self.bearer_token}"},
+                                        timeout=self.timeout)
+        except requests.RequestException as e:
+            raise TwitterError(f"Twitter API request failed: {e}")
+        if response.status_code != 200:
+            logger.error("Twitter API lookup failed with status %s: %s", response.status_code, response.text[:200])
+            raise TwitterError("Failed to fetch tweet details",
+                               status_code=response.status_code if response.status_code < 500 else 502)
+
+        payload = response.json()
+        media = {item["media_key"]: item for item in payload.get("includes", {}).get("media", [])}
+        results: Dict[str, Union[Tweet, TwitterError]] = {}
+        for data in payload.get("data", []):
+            media_keys = data.get("attachments", {}).get("media_keys", [])
+            photo_urls = tuple(media[key]["url"] for key in media_keys
+                               if key in media and media[key].get("type") == "photo" and media[key].get("url"))
+            results[data["id"]] = Tweet(tweet_id=data["id"], text=data.get("text", ""), photo_urls=photo_urls)
+        for error in payload.get("errors", []):
+            tweet_id = error.get("resource_id") or error.get("value")
+            if tweet_id and tweet_id not in results:
+                results[tweet_id] = TwitterError(error.get("detail") or "Tweet not found.", status_code=404)
+        for tweet_id in tweet_ids:
+            results.setdefault(tweet_id, TwitterError("Tweet not found.", status_code=404))
+        return results
+
+    def get_tweets(self, tweet_ids: List[str]) -> Dict[str, Union[Tweet, TwitterError]]:
+        """Looks the tweets up, cached ones first. Returns a Tweet or the TwitterError of each id."""
+        results: Dict[str, Union[Tweet, TwitterError]] = {}
+        missing = []
+        for tweet_id in dict.fromkeys(tweet_ids):
+            tweet = self.cache.get(tweet_id)
+            if tweet is None:
+                missing.append(tweet_id)
+            else:
+                results[tweet_id] = tweet
+        for start in range(0, len(missing), LOOKUP_MAX_IDS):
+            for tweet_id, result in self._lookup(missing[start:start + LOOKUP_MAX_IDS]).items():
+                if isinstance(result, Tweet):
+                    self.cache.set(result)
+                results[tweet_id] = result
+        return results
+
+    def get_tweet(self, tweet_id: str) -> Tweet:
+        result = self.get_tweets([tweet_id])[tweet_id]
+        if isinstance(result, TwitterError):
+            raise result
+        return result
+
+    def download_photo(self, url: str, max_bytes: int) -> SpooledUpload:
+        """
+        Streams a photo into a spool file of the blob store, hashing it on the way, like a multipart upload. The
+        download is aborted as soon as it exceeds ``max_bytes`` or does not start like an image.
+        """
+        try:
+            response = self.session.get(url, stream=True, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise TwitterError(f"Photo download failed: {e}")
+        with response:
+            if response.status_code != 200:
+                raise TwitterError(f"Photo download failed with status {response.status_code}")
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > max_bytes:
+                raise TwitterError(f"Photo is larger than the allowed {max_bytes} bytes.", status_code=413)
+
+            fd, path = tempfile.mkstemp(dir=get_blob_store().spool_directory(), prefix="twitter-")
+            sha256 = hashlib.sha256()
+            size, head = 0, b""
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise TwitterError(f"Photo is larger than the allowed {max_bytes} bytes.",
+                                               status_code=413)
+                        if len(head) < MAGIC_BYTES_LENGTH:
+                            head += chunk[:MAGIC_BYTES_LENGTH - len(head)]
+                        sha256.update(chunk)
+                        file.write(chunk)
+                mime_type = detect_mime_type(head)
+                if mime_type is None:
+                    raise TwitterError(IMAGE_TYPE_ERROR, status_code=415)
+            except BaseException:
+                os.remove(path)
+                raise
+        return SpooledUpload(path=path, file_hash=sha256.hexdigest(), size=size, mime_type=mime_type,
+                             file_name=url.rsplit("/", 1)[-1].split("?", 1)[0] or None)
+
+
+twitter_client = TwitterClient(os.getenv("TWITTER_BEARER_TOKEN"))
+register_cache("tweet", twitter_client.cache)
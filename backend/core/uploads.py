@@ -0,0 +1,205 @@
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.multipart import MultipartParser, parse_options_header
+from backend.core.blob_store import get_blob_store
+from backend.core.images import detect_mime_type
+from backend.core.logging_config import logger
+
+load_dotenv()
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+# Total size of a user's files, 0 disables the quota
+UPLOAD_USER_QUOTA_BYTES = int(os.getenv("UPLOAD_USER_QUOTA_BYTES", str(1024 * 1024 * 1024)))
+# Text fields, part headers and boundaries of a multipart upload on top of the file itself
+UPLOAD_MAX_FORM_BYTES = int(os.getenv("UPLOAD_MAX_FORM_BYTES", str(64 * 1024)))
+
+FILE_FIELD = "file"
+MAGIC_BYTES_LENGTH = 12  # Enough for every format in images.MAGIC_BYTES and the RIFF/WEBP header
+IMAGE_TYPE_ERROR = "Uploaded file is not a PNG, JPEG, GIF or WEBP image."
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+@dataclass
+class SpooledUpload:
+    """A received upload: the file bytes are in a temporary file, never in memory as a whole."""
+    path: str
+    file_hash: str
+    size: int
+    mime_type: str
+    file_name: Optional[str]
+    fields: Dict[str, str] = field(default_factory=dict)
+
+    def discard(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def parse_content_sha256(value: Optional[str]) -> Optional[str]:
+    """Validates the hex SHA-256 a client may announce in ``X-Content-SHA256`` to skip uploading known files."""
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if not SHA256_PATTERN.match(value):
+        raise HTTPException(status_code=400, detail="X-Content-SHA256 must be a hex encoded SHA-256 digest.")
+    return value
+
+
+def too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File is larger than the allowed {limit} bytes.")
+
+
+class MultipartUploadReader:
+    """
+    Incremental parser of a ``multipart/form-data`` body with one file part (``file``) and optional text fields.
+    The file part is hashed and written to a spool file chunk by chunk, its type is detected by ``detect_type`` from
+    the first ``head_length`` bytes as soon as they arrived and the upload is aborted the moment it exceeds
+    ``max_file_bytes``.
+    """
+
+    def __init__(self, boundary: bytes, max_file_bytes: int,
+                 detect_type: Callable[[bytes], Optional[str]] = detect_mime_type,
+                 head_length: int = MAGIC_BYTES_LENGTH, type_error: str = IMAGE_TYPE_ERROR):
+        self.max_file_bytes = max_file_bytes
+        self.detect_type = detect_type
+        self.head_length = head_length
+        self.type_error = type_error
+        self.form_bytes = 0
+        self.fields: Dict[str, str] = {}
+        self.upload: Optional[SpooledUpload] = None
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+        self._header_field = b""
+        self._header_value = b""
+        self._part_headers: Dict[bytes, bytes] = {}
+        self._part_name: Optional[str] = None
+        self._part_value = b""
+        self._file = None
+        self._sha256 = None
+        self._size = 0
+        self._head = b""
+
+    # Parser callbacks, called synchronously from write()
+    def _on_part_begin(self):
+        self._part_headers = {}
+        self._part_name = None
+        self._part_value = b""
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._part_headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._part_headers.get(b"content-disposition", b""))
+        self._part_name = options.get(b"name", b"").decode("utf-8", "replace")
+        if self._part_name != FILE_FIELD:
+            return
+        if self.upload is not None or self._file is not None:
+            raise HTTPException(status_code=400, detail="Only one file can be uploaded at a time.")
+        file_name = options.get(b"filename")
+        fd, path = tempfile.mkstemp(dir=get_blob_store().spool_directory(), prefix="upload-")
+        self._file = os.fdopen(fd, "wb")
+        self._sha256 = hashlib.sha256()
+        self.upload = SpooledUpload(path=path, file_hash="", size=0, mime_type="",
+                                    file_name=file_name.decode("utf-8", "replace") if file_name else None)
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        chunk = data[start:end]
+        if self._part_name != FILE_FIELD:
+            self.form_bytes += len(chunk)
+            if self.form_bytes > UPLOAD_MAX_FORM_BYTES:
+                raise HTTPException(status_code=413, detail="Form fields are too large.")
+            self._part_value += chunk
+            return
+
+        self._size += len(chunk)
+        if self._size > self.max_file_bytes:
+            raise too_large(self.max_file_bytes)
+        if len(self._head) < self.head_length:
+            self._head += chunk[:self.head_length - len(self._head)]
+            if len(self._head) == self.head_length:
+                self._check_magic_bytes()
+        self._sha256.update(chunk)
+        self._file.write(chunk)
+
+    def _on_part_end(self):
+        if self._part_name != FILE_FIELD:
+            if self._part_name:
+                self.fields[self._part_name] = self._part_value.decode("utf-8", "replace")
+            return
+        self._check_magic_bytes()
+        self._file.close()
+        self._file = None
+        self.upload.file_hash = self._sha256.hexdigest()
+        self.upload.size = self._size
+
+    def _check_magic_bytes(self):
+        mime_type = self.detect_type(self._head)
+        if mime_type is None:
+            raise HTTPException(status_code=415, detail=self.type_error)
+        self.upload.mime_type = mime_type
+
+    def write(self, chunk: bytes):
+        self._parser.write(chunk)
+
+    def finish(self) -> SpooledUpload:
+        self._parser.finalize()
+        if self.upload is None or self._file is not None:
+            raise HTTPException(status_code=400, detail=f"Multipart body has no complete '{FILE_FIELD}' part.")
+        self.upload.fields = self.fields
+        return self.upload
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.upload is not None:
+            self.upload.discard()
+
+
+async def receive_multipart_upload(request: Request, max_file_bytes: int, **reader_options) -> SpooledUpload:
+    """
+    Reads a multipart upload from the request stream. Parsing, hashing and writing run in the threadpool one
+    network chunk at a time, so memory use does not depend on the file size. Raises 413 as soon as the body or the
+    file exceeds its limit; the spool file is removed on any error. ``reader_options`` are passed to
+    ``MultipartUploadReader``.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=415, detail="Expected a multipart/form-data body.")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_file_bytes + UPLOAD_MAX_FORM_BYTES:
+        # Rejected before reading anything, the announced body can not fit
+        raise too_large(max_file_bytes)
+
+    reader = MultipartUploadReader(options[b"boundary"], max_file_bytes, **reader_options)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(reader.write, chunk)
+        upload = reader.finish()
+    except BaseException:
+        reader.abort()
+        raise
+    logger.info("Received upload of %s bytes, hash: %s", upload.size, upload.file_hash)
+    return upload
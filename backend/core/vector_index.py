@@ -0,0 +1,165 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+IVF_MIN_TRAIN_VECTORS = 4096  # Below, every search scores all vectors: exact and about as fast
+IVF_MAX_LISTS = 4096
+IVF_TRAIN_SAMPLES_PER_LIST = 32
+IVF_TRAIN_ITERATIONS = 10
+IVF_RETRAIN_GROWTH = 4  # Lists are retrained once the index holds that many times the vectors of the last training
+
+
+class VectorStore:
+    """
+    Float32 vectors with the ids and owners of their files in contiguous arrays, grown by doubling. A delete moves
+    the last row into the freed one, so the first ``size`` rows are always the live vectors.
+    """
+
+    def __init__(self, dimension: int, capacity: int = 1024):
+        self.dimension = dimension
+        self.vectors = np.zeros((capacity, dimension), np.float32)
+        self.ids = np.zeros(capacity, np.int64)
+        self.owner_ids = np.zeros(capacity, np.int64)
+        self.size = 0
+        self.rows: Dict[int, int] = {}  # file id -> row
+
+    def _grow(self):
+        capacity = len(self.ids) * 2
+        for name in ("vectors", "ids", "owner_ids"):
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+
+    def put(self, file_id: int, owner_id: int, vector: np.ndarray) -> int:
+        """Adds or replaces the vector of a file, returns its row."""
+        row = self.rows.get(file_id)
+        if row is None:
+            if self.size == len(self.ids):
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.rows[file_id] = row
+        self.vectors[row] = vector
+        self.ids[row] = file_id
+        self.owner_ids[row] = owner_id
+        return row
+
+    def remove(self, file_id: int) -> Optional[Tuple[int, int]]:
+        """Removes the vector of a file, returns (freed row, row moved into it) or None when it was not stored."""
+        row = self.rows.pop(file_id, None)
+        if row is None:
+            return None
+        last = self.size - 1
+        if row != last:
+            self.vectors[row] = self.vectors[last]
+            self.ids[row] = self.ids[last]
+            self.owner_ids[row] = self.owner_ids[last]
+            self.rows[int(self.ids[row])] = row
+        self.size = last
+        return row, last
+
+
+def train_centroids(vectors: np.ndarray, lists: int, iterations: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means: ``lists`` unit centroids of the (unit) vectors, by cosine similarity."""
+    generator = np.random.default_rng(seed)
+    centroids = vectors[generator.choice(len(vectors), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind="stable")
+        members, starts = np.unique(assignments[order], return_index=True)
+        sums = np.zeros_like(centroids)
+        sums[members] = np.add.reduceat(vectors[order], starts, axis=0)
+        empty = ~np.isin(np.arange(lists), members)
+        # Empty lists restart from random vectors instead of staying unused
+        sums[empty] = vectors[generator.choice(len(vectors), int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Approximate nearest neighbours by an inverted file: the vectors are clustered by k-means into about sqrt(n)
+    lists, a search scores only the vectors of the ``probes`` lists whose centroids are closest to the query. The
+    list of every row is kept in an array parallel to the store, so inserts and deletes are O(1) and a search
+    selects its candidates with one pass over small integers instead of n dot products. Not thread-safe.
+    """
+
+    def __init__(self, dimension: int, probes: int = 16):
+        self.store = VectorStore(dimension)
+        self.probes = probes
+        self.centroids: Optional[np.ndarray] = None
+        self.lists = np.zeros(len(self.store.ids), np.int32)  # row -> list
+        self.trained_size = 0
+
+    def __len__(self) -> int:
+        return self.store.size
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def train(self):
+        """Clusters the stored vectors, below IVF_MIN_TRAIN_VECTORS searches stay exact."""
+        size = self.store.size
+        if size < IVF_MIN_TRAIN_VECTORS:
+            self.centroids, self.trained_size = None, 0
+            return
+        lists = min(IVF_MAX_LISTS, int(np.sqrt(size)))
+        samples = min(size, lists * IVF_TRAIN_SAMPLES_PER_LIST)
+        sample = self.store.vectors[np.random.default_rng(0).choice(size, samples, replace=False)]
+        self.centroids = train_centroids(sample, lists, IVF_TRAIN_ITERATIONS)
+        self.lists = np.zeros(len(self.store.ids), np.int32)
+        for start in range(0, size, 65536):
+            end = min(size, start + 65536)
+            self.lists[start:end] = self._assign(self.store.vectors[start:end])
+        self.trained_size = size
+
+    def needs_training(self) -> bool:
+        if self.centroids is None:
+            return self.store.size >= IVF_MIN_TRAIN_VECTORS
+        return self.store.size >= self.trained_size * IVF_RETRAIN_GROWTH
+
+    def add(self, file_id: int, owner_id: int, vector: np.ndarray):
+        row = self.store.put(file_id, owner_id, vector)
+        if len(self.lists) < len(self.store.ids):
+            self.lists = np.concatenate([self.lists, np.zeros(len(self.store.ids) - len(self.lists), np.int32)])
+        if self.centroids is not None:
+            self.lists[row] = self._assign(vector[None, :])[0]
+
+    def remove(self, file_id: int):
+        moved = self.store.remove(file_id)
+        if moved is not None:
+            row, last = moved
+            self.lists[row] = self.lists[last]
+
+    def search(self, query: np.ndarray, k: int, owner_id: Optional[int] = None,
+               exact_below: int = 0) -> List[Tuple[int, float]]:
+        """
+        (file id, cosine similarity) of the ``k`` vectors closest to ``query``, optionally of one owner's files
+        only. When the owner has fewer than ``exact_below`` vectors they are all scored; otherwise more lists are
+        probed until ``k`` candidates are found.
+        """
+        size = self.store.size
+        if size == 0 or k <= 0:
+            return []
+        owned = self.store.owner_ids[:size] == owner_id if owner_id is not None else None
+        if self.centroids is None or (owned is not None and np.count_nonzero(owned) < exact_below):
+            rows = np.flatnonzero(owned) if owned is not None else np.arange(size)
+        else:
+            order = np.argsort(-(self.centroids @ query))
+            probes = self.probes
+            while True:
+                probed = np.zeros(len(self.centroids), bool)
+                probed[order[:probes]] = True
+                selected = probed[self.lists[:size]]
+                if owned is not None:
+                    selected &= owned
+                rows = np.flatnonzero(selected)
+                if len(rows) >= k or probes >= len(self.centroids):
+                    break
+                probes *= 2
+        if len(rows) == 0:
+            return []
+        scores = self.store.vectors[rows] @ query
+        top = np.argpartition(-scores, k - 1)[:k] if len(rows) > k else np.arange(len(rows))
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.store.ids[rows[i]]), float(scores[i])) for i in top]
@@ -0,0 +1,74 @@
+import os
+from typing import AsyncIterator, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+VISION_BACKEND = os.getenv("VISION_BACKEND", "openai")
+
+
+class VisionBackendError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class VisionBackend:
+    """
+    Interface of everything that can answer analysis prompts about an image. ``model`` identifies the answers
+    of a backend in the analysis cache, so it has to change whenever the backend would answer differently.
+    """
+    name = "base"
+    model = "base"
+    max_tokens = 0
+
+    async def analyze_image_with_base64(self, image_data: bytes, prompt: str, mime_type: str = "image/png",
+                                        detail: Optional[str] = None, image_tokens: Optional[int] = None) -> str:
+        raise NotImplementedError
+
+    async def analyze_image_with_description_base64(self, image_data: bytes, description: str, prompt: str,
+                                                    mime_type: str = "image/png", detail: Optional[str] = None,
+                                                    image_tokens: Optional[int] = None) -> str:
+        raise NotImplementedError
+
+    async def stream_image_with_base64(self, image_data: bytes, prompt: str, mime_type: str = "image/png",
+                                       detail: Optional[str] = None,
+                                       image_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        # Backends without native streaming deliver the whole answer as a single chunk
+        yield await self.analyze_image_with_base64(image_data, prompt, mime_type, detail, image_tokens)
+
+    async def stream_image_with_description_base64(self, image_data: bytes, description: str, prompt: str,
+                                                   mime_type: str = "image/png", detail: Optional[str] = None,
+                                                   image_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        yield await self.analyze_image_with_description_base64(image_data, description, prompt, mime_type, detail,
+                                                               image_tokens)
+
+    async def aclose(self):
+        pass
+
+
+_factories: Dict[str, Callable[[], VisionBackend]] = {}
+_backends: Dict[str, VisionBackend] = {}
+
+
+def register_backend(name: str, factory: Callable[[], VisionBackend]):
+    _factories[name] = factory
+
+
+def get_vision_backend(name: Optional[str] = None) -> VisionBackend:
+    """Returns the backend selected per request, falling back to the deployment default ``VISION_BACKEND``."""
+    name = name or VISION_BACKEND
+    if name not in _backends:
+        if name not in _factories:
+            raise VisionBackendError(f"Unknown vision backend: {name}. Available: {', '.join(sorted(_factories))}",
+                                     status_code=400)
+        _backends[name] = _factories[name]()
+    return _backends[name]
+
+
+def available_backends() -> list:
+    return sorted(_factories)
+
+
+async def close_backends():
+    for backend in _backends.values():
+        await backend.aclose()
@@ -0,0 +1,175 @@
+"""initial schema
+
+Databases created with ``Base.metadata.create_all`` before migrations were introduced already have some of these
+tables and indexes, so only the missing ones are created.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:17:13.254599
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def uploaded_files_schema() -> list:
+    return [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('file_name', sa.String(length=255), nullable=False),
+        sa.Column('file_data', sa.LargeBinary(), nullable=True),
+        sa.Column('file_hash', sa.String(length=255), nullable=False),
+        sa.Column('analysis_result', sa.String(length=255), nullable=True),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=True),
+        sa.Column('does_match', sa.Boolean(), nullable=True),
+        sa.Column('uploaded_text', sa.String(length=255), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('file_hash'),
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    def existing_index_names(table_name: str) -> set:
+        if table_name not in tables:
+            return set()
+        return {index["name"] for index in inspector.get_indexes(table_name)}
+
+    existing_indexes = existing_index_names('analysis_cache')
+    if 'analysis_cache' not in tables:
+        op.create_table('analysis_cache',
+        sa.Column('cache_key', sa.String(length=64), nullable=False),
+        sa.Column('file_hash', sa.String(length=255), nullable=False),
+        sa.Column('model', sa.String(length=64), nullable=False),
+        sa.Column('result', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_accessed_at', sa.DateTime(), nullable=False),
+        sa.Column('hit_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('cache_key')
+        )
+    with op.batch_alter_table('analysis_cache', schema=None) as batch_op:
+        if 'ix_analysis_cache_file_hash' not in existing_indexes:
+            batch_op.create_index(batch_op.f('ix_analysis_cache_file_hash'), ['file_hash'], unique=False)
+        if 'ix_analysis_cache_last_accessed_at' not in existing_indexes:
+            batch_op.create_index(batch_op.f('ix_analysis_cache_last_accessed_at'), ['last_accessed_at'], unique=False)
+
+    existing_indexes = existing_index_names('revoked_tokens')
+    if 'revoked_tokens' not in tables:
+        op.create_table('revoked_tokens',
+        sa.Column('jti', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('revoked_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('jti')
+        )
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        if 'ix_revoked_tokens_expires_at' not in existing_indexes:
+            batch_op.create_index(batch_op.f('ix_revoked_tokens_expires_at'), ['expires_at'], unique=False)
+        if 'ix_revoked_tokens_user_id' not in existing_indexes:
+            batch_op.create_index(batch_op.f('ix_revoked_tokens_user_id'), ['user_id'], unique=False)
+
+    existing_indexes = existing_index_names('users')
+    if 'users' not in tables:
+        op.create_table('users',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('hashed_password', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        if 'ix_users_email' not in existing_indexes:
+            batch_op.create_index(batch_op.f('ix_users_email'), ['email'], unique=True)
+        if 'ix_users_id' not in existing_indexes:
+            batch_op.create_index(batch_op.f('ix_users_id'), ['id'], unique=False)
+
+    if 'uploaded_files' not in tables:
+        op.create_table('uploaded_files', *uploaded_files_schema())
+    elif not next(column for column in inspector.get_columns('uploaded_files')
+                  if column['name'] == 'file_data')['nullable']:
+        # Created before the blob store, when file_data was still required
+        if op.get_bind().dialect.name == 'sqlite':
+            # SQLite rebuilds the table. It is described explicitly so the unnamed unique constraint on file_hash
+            # survives, its indexes are dropped and created again below
+            with op.batch_alter_table('uploaded_files', recreate='always',
+                                      copy_from=sa.Table('uploaded_files', sa.MetaData(), *uploaded_files_schema())):
+                pass
+            tables.discard('uploaded_files')
+        else:
+            op.alter_column('uploaded_files', 'file_data', existing_type=sa.LargeBinary(), nullable=True)
+    existing_indexes = existing_index_names('uploaded_files')
+    with op.batch_alter_table('uploaded_files', schema=None) as batch_op:
+        if 'ix_uploaded_files_id' not in existing_indexes:
+            batch_op.create_index(batch_op.f('ix_uploaded_files_id'), ['id'], unique=False)
+        if 'ix_uploaded_files_owner_uploaded_at_id' not in existing_indexes:
+            batch_op.create_index('ix_uploaded_files_owner_uploaded_at_id', ['owner_id', 'uploaded_at', 'id'], unique=False)
+        if 'ix_uploaded_files_uploaded_at_id' not in existing_indexes:
+            batch_op.create_index('ix_uploaded_files_uploaded_at_id', ['uploaded_at', 'id'], unique=False)
+
+    existing_indexes = existing_index_names('analysis_jobs')
+    if 'analysis_jobs' not in tables:
+        op.create_table('analysis_jobs',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('job_type', sa.String(length=64), nullable=False),
+        sa.Column('file_id', sa.Integer(), nullable=True),
+        sa.Column('parameters', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('progress', sa.Integer(), nullable=False),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['file_id'], ['uploaded_files.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    with op.batch_alter_table('analysis_jobs', schema=None) as batch_op:
+        if 'ix_analysis_jobs_created_at' not in existing_indexes:
+            batch_op.create_index(batch_op.f('ix_analysis_jobs_created_at'), ['created_at'], unique=False)
+        if 'ix_analysis_jobs_status' not in existing_indexes:
+            batch_op.create_index(batch_op.f('ix_analysis_jobs_status'), ['status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('analysis_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_analysis_jobs_status'))
+        batch_op.drop_index(batch_op.f('ix_analysis_jobs_created_at'))
+
+    op.drop_table('analysis_jobs')
+    with op.batch_alter_table('uploaded_files', schema=None) as batch_op:
+        batch_op.drop_index('ix_uploaded_files_uploaded_at_id')
+        batch_op.drop_index('ix_uploaded_files_owner_uploaded_at_id')
+        batch_op.drop_index(batch_op.f('ix_uploaded_files_id'))
+
+    op.drop_table('uploaded_files')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_id'))
+        batch_op.drop_index(batch_op.f('ix_users_email'))
+
+    op.drop_table('users')
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revoked_tokens_user_id'))
+        batch_op.drop_index(batch_op.f('ix_revoked_tokens_expires_at'))
+
+    op.drop_table('revoked_tokens')
+    with op.batch_alter_table('analysis_cache', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_analysis_cache_last_accessed_at'))
+        batch_op.drop_index(batch_op.f('ix_analysis_cache_file_hash'))
+
+    op.drop_table('analysis_cache')
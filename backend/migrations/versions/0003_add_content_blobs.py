@@ -0,0 +1,97 @@
+"""add content blobs
+
+File content is stored once per hash in ``content_blobs`` and referenced by one ``uploaded_files`` row per owner,
+``file_hash`` is no longer globally unique. Existing rows get a content blob per distinct hash with a reference
+count of its rows.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:38:06.903190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def uploaded_files_table(unique_file_hash: bool) -> sa.Table:
+    """The table as created by revisions 0001 and 0002, optionally without the unique constraint on file_hash."""
+    return sa.Table('uploaded_files', sa.MetaData(),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('file_name', sa.String(length=255), nullable=False),
+        sa.Column('file_data', sa.LargeBinary(), nullable=True),
+        sa.Column('file_hash', sa.String(length=255), nullable=False),
+        sa.Column('analysis_result', sa.String(length=255), nullable=True),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=True),
+        sa.Column('does_match', sa.Boolean(), nullable=True),
+        sa.Column('uploaded_text', sa.String(length=255), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.Column('file_size', sa.BigInteger(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        *([sa.UniqueConstraint('file_hash')] if unique_file_hash else []),
+        sa.Index('ix_uploaded_files_id', 'id'),
+        sa.Index('ix_uploaded_files_owner_uploaded_at_id', 'owner_id', 'uploaded_at', 'id'),
+        sa.Index('ix_uploaded_files_uploaded_at_id', 'uploaded_at', 'id'),
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('content_blobs',
+    sa.Column('file_hash', sa.String(length=255), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('file_hash')
+    )
+    with op.batch_alter_table('content_blobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_content_blobs_ref_count'), ['ref_count'], unique=False)
+
+    op.execute(
+        "INSERT INTO content_blobs (file_hash, size, ref_count, created_at) "
+        "SELECT file_hash, MAX(file_size), COUNT(*), COALESCE(MIN(uploaded_at), CURRENT_TIMESTAMP) "
+        "FROM uploaded_files GROUP BY file_hash"
+    )
+
+    if op.get_bind().dialect.name == 'sqlite':
+        # The unique constraint on file_hash is unnamed, SQLite rebuilds the table without it
+        batch = op.batch_alter_table('uploaded_files', recreate='always',
+                                     copy_from=uploaded_files_table(unique_file_hash=False))
+    else:
+        batch = op.batch_alter_table('uploaded_files', schema=None)
+        for constraint in sa.inspect(op.get_bind()).get_unique_constraints('uploaded_files'):
+            if constraint['column_names'] == ['file_hash']:
+                op.drop_constraint(constraint['name'], 'uploaded_files', type_='unique')
+    with batch as batch_op:
+        batch_op.create_index(batch_op.f('ix_uploaded_files_file_hash'), ['file_hash'], unique=False)
+        batch_op.create_unique_constraint('uq_uploaded_files_owner_id_file_hash', ['owner_id', 'file_hash'])
+        batch_op.create_foreign_key('fk_uploaded_files_file_hash_content_blobs', 'content_blobs',
+                                    ['file_hash'], ['file_hash'])
+
+
+def downgrade() -> None:
+    """Downgrade schema. Fails while several owners have a file with the same content."""
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('uploaded_files', recreate='always',
+                                  copy_from=uploaded_files_table(unique_file_hash=True)):
+            pass
+    else:
+        with op.batch_alter_table('uploaded_files', schema=None) as batch_op:
+            batch_op.drop_constraint('fk_uploaded_files_file_hash_content_blobs', type_='foreignkey')
+            batch_op.drop_constraint('uq_uploaded_files_owner_id_file_hash', type_='unique')
+            batch_op.drop_index(batch_op.f('ix_uploaded_files_file_hash'))
+            batch_op.create_unique_constraint('uploaded_files_file_hash_key', ['file_hash'])
+
+    with op.batch_alter_table('content_blobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_content_blobs_ref_count'))
+
+    op.drop_table('content_blobs')
@@ -0,0 +1,107 @@
+"""add full text search
+
+``analysis_result`` and ``uploaded_text`` become TEXT, model output is no longer cut at 255 characters. File names,
+tweet texts and analyses are full-text indexed (see backend/core/search.py):
+
+* SQLite: the FTS5 table ``uploaded_files_fts`` with ``uploaded_files`` as external content, kept up to date by
+  triggers. Rebuilding ``uploaded_files`` in a later batch migration drops the triggers, such a migration has to
+  create them again with ``create_sqlite_triggers``.
+* PostgreSQL: the generated ``search_vector`` tsvector column with a GIN index.
+
+Both index words as they are (no stemming), so Polish and English text are searched alike.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 13:05:11.151859
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_COLUMNS = 'file_name, uploaded_text, analysis_result'
+SQLITE_TRIGGERS = ('uploaded_files_fts_insert', 'uploaded_files_fts_delete', 'uploaded_files_fts_update')
+
+
+def create_sqlite_triggers() -> None:
+    op.execute(
+        f"CREATE TRIGGER uploaded_files_fts_insert AFTER INSERT ON uploaded_files BEGIN "
+        f"INSERT INTO uploaded_files_fts (rowid, {FTS_COLUMNS}) "
+        f"VALUES (new.id, new.file_name, new.uploaded_text, new.analysis_result); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER uploaded_files_fts_delete AFTER DELETE ON uploaded_files BEGIN "
+        f"INSERT INTO uploaded_files_fts (uploaded_files_fts, rowid, {FTS_COLUMNS}) "
+        f"VALUES ('delete', old.id, old.file_name, old.uploaded_text, old.analysis_result); END"
+    )
+    # Only changes of the indexed columns touch the index, not e.g. does_match
+    op.execute(
+        f"CREATE TRIGGER uploaded_files_fts_update AFTER UPDATE OF {FTS_COLUMNS} ON uploaded_files BEGIN "
+        f"INSERT INTO uploaded_files_fts (uploaded_files_fts, rowid, {FTS_COLUMNS}) "
+        f"VALUES ('delete', old.id, old.file_name, old.uploaded_text, old.analysis_result); "
+        f"INSERT INTO uploaded_files_fts (rowid, {FTS_COLUMNS}) "
+        f"VALUES (new.id, new.file_name, new.uploaded_text, new.analysis_result); END"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('uploaded_files', schema=None) as batch_op:
+        batch_op.alter_column('analysis_result',
+               existing_type=sa.VARCHAR(length=255),
+               type_=sa.Text(),
+               existing_nullable=True)
+        batch_op.alter_column('uploaded_text',
+               existing_type=sa.VARCHAR(length=255),
+               type_=sa.Text(),
+               existing_nullable=True)
+
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute(
+            f"CREATE VIRTUAL TABLE uploaded_files_fts USING fts5({FTS_COLUMNS}, content='uploaded_files', "
+            f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        create_sqlite_triggers()
+        op.execute("INSERT INTO uploaded_files_fts (uploaded_files_fts) VALUES ('rebuild')")
+    elif op.get_bind().dialect.name == 'postgresql':
+        # Weights A-C rank matches in the file name above the tweet text above the analysis
+        op.execute(
+            "ALTER TABLE uploaded_files ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', coalesce(file_name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(uploaded_text, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(analysis_result, '')), 'C')) STORED"
+        )
+        op.create_index('ix_uploaded_files_search_vector', 'uploaded_files', ['search_vector'],
+                        postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in SQLITE_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE uploaded_files_fts")
+    elif op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_uploaded_files_search_vector', table_name='uploaded_files')
+        op.drop_column('uploaded_files', 'search_vector')
+
+    # Longer texts are cut to fit again
+    with op.batch_alter_table('uploaded_files', schema=None) as batch_op:
+        batch_op.alter_column('uploaded_text',
+               existing_type=sa.Text(),
+               type_=sa.VARCHAR(length=255),
+               existing_nullable=True,
+               postgresql_using='left(uploaded_text, 255)')
+        batch_op.alter_column('analysis_result',
+               existing_type=sa.Text(),
+               type_=sa.VARCHAR(length=255),
+               existing_nullable=True,
+               postgresql_using='left(analysis_result, 255)')
@@ -0,0 +1,51 @@
+"""set null analysis job file on delete
+
+Jobs keep their history when their file is deleted, ``analysis_jobs.file_id`` becomes NULL instead of the delete
+failing on the foreign key (PostgreSQL, SQLite with foreign keys enabled). Jobs already pointing to deleted files
+are detached the same way.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 13:31:06.107583
+
+"""
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FOREIGN_KEY = 'fk_analysis_jobs_file_id_uploaded_files'
+# Names the foreign key created unnamed by revision 0001 when SQLite batch mode reflects the table
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def file_foreign_key() -> Optional[str]:
+    for foreign_key in sa.inspect(op.get_bind()).get_foreign_keys('analysis_jobs'):
+        if foreign_key['constrained_columns'] == ['file_id']:
+            return foreign_key['name'] or FOREIGN_KEY
+    return None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("UPDATE analysis_jobs SET file_id = NULL "
+               "WHERE file_id IS NOT NULL AND file_id NOT IN (SELECT id FROM uploaded_files)")
+    name = file_foreign_key()
+    with op.batch_alter_table('analysis_jobs', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        if name:
+            batch_op.drop_constraint(name, type_='foreignkey')
+        batch_op.create_foreign_key(FOREIGN_KEY, 'uploaded_files', ['file_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('analysis_jobs', schema=None) as batch_op:
+        batch_op.drop_constraint(FOREIGN_KEY, type_='foreignkey')
+        batch_op.create_foreign_key('analysis_jobs_file_id_fkey', 'uploaded_files', ['file_id'], ['id'])
@@ -1,2 +1,7 @@
 from .user import User
 from .uploaded_file import UploadedFile
+from .content_blob import ContentBlob
+from .analysis_cache import AnalysisCacheEntry
+from .analysis_job import AnalysisJob
+from .revoked_token import RevokedToken
+from .file_embedding import FileEmbedding
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from backend.core.database import Base
+from datetime import datetime
+
+class AnalysisCacheEntry(Base):
+    __tablename__ = "analysis_cache"
+
+    # SHA-256 of (file_hash, normalized prompt, description, model, max_tokens)
+    cache_key = Column(String(64), primary_key=True)
+    file_hash = Column(String(255), nullable=False, index=True)
+    model = Column(String(64), nullable=False)
+    result = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    last_accessed_at = Column(DateTime, default=datetime.now, nullable=False, index=True)
+    hit_count = Column(Integer, default=0, nullable=False)
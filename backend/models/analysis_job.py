@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+from backend.core.database import Base
+from datetime import datetime
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String(36), primary_key=True)  # UUID4
+    job_type = Column(String(64), nullable=False)
+    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="SET NULL"), nullable=True)
+    parameters = Column(Text, nullable=False, default="{}")  # JSON
+    status = Column(String(16), nullable=False, default="queued", index=True)  # queued, running, succeeded, failed
+    progress = Column(Integer, nullable=False, default=0)
+    result = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.now, nullable=False, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now, nullable=False)
@@ -0,0 +1,16 @@
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime
+from backend.core.database import Base
+from datetime import datetime
+
+class ContentBlob(Base):
+    __tablename__ = "content_blobs"
+
+    # One row per distinct file content, its bytes are stored once in the blob store under file_hash.
+    # ref_count is the number of uploaded_files rows referencing it; 0 marks it for garbage collection and -1 while
+    # it is being collected, when no new references can be added (see core/content_blobs.py).
+    file_hash = Column(String(255), primary_key=True)
+    size = Column(BigInteger, nullable=True)
+    ref_count = Column(Integer, default=0, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    # 64-bit perceptual hash as 16 hex digits, used to find near-duplicates (see core/near_duplicates.py)
+    phash = Column(String(16), nullable=True)
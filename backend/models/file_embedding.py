@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary
+from backend.core.database import Base
+from datetime import datetime
+
+class FileEmbedding(Base):
+    __tablename__ = "file_embeddings"
+
+    # Vector of an uploaded file's image and texts as float32 bytes, computed when the file is analyzed and served
+    # from an in-process index (see core/semantic_search.py). model is the embedder that computed it.
+    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"), primary_key=True)
+    model = Column(String(64), nullable=False)
+    vector = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now, nullable=False, index=True)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from backend.core.database import Base
+from datetime import datetime
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    # Only tokens that have not expired yet need to be kept, expired rows are pruned
+    jti = Column(String(32), primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, default=datetime.now, nullable=False)
@@ -1,19 +1,33 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, LargeBinary, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import (BigInteger, Column, Integer, String, Text, ForeignKey, DateTime, LargeBinary, Boolean, Index,
+                        UniqueConstraint)
+from sqlalchemy.orm import relationship, deferred
 from backend.core.database import Base
 from datetime import datetime
 
 class UploadedFile(Base):
     __tablename__ = "uploaded_files"
+    __table_args__ = (
+        # Keyset pagination of listings ordered by (uploaded_at, id), per owner and over all files
+        Index("ix_uploaded_files_owner_uploaded_at_id", "owner_id", "uploaded_at", "id"),
+        Index("ix_uploaded_files_uploaded_at_id", "uploaded_at", "id"),
+        # Identical content is deduplicated per owner, other owners get their own row referencing the same blob
+        UniqueConstraint("owner_id", "file_hash", name="uq_uploaded_files_owner_id_file_hash"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     file_name = Column(String(255), nullable=False)
-    file_data = Column(LargeBinary, nullable=False)
-    file_hash = Column(String(255), nullable=False, unique=True)
-    analysis_result = Column(String(255), nullable=True)
+    # Legacy storage of file bytes, new uploads keep their bytes in the blob store (see core/blob_store.py).
+    # Deferred, so metadata queries never load it.
+    file_data = deferred(Column(LargeBinary, nullable=True))
+    file_hash = Column(String(255), ForeignKey("content_blobs.file_hash"), nullable=False, index=True)
+    # Size in bytes, counted towards the owner's upload quota. Unknown (NULL) for files uploaded before it existed.
+    file_size = Column(BigInteger, nullable=True)
+    # Full model output and tweet text, not truncated. Together with file_name they are full-text indexed outside of
+    # the ORM (see core/search.py): an FTS5 table kept by triggers on SQLite, a generated tsvector on PostgreSQL.
+    analysis_result = Column(Text, nullable=True)
     uploaded_at = Column(DateTime, default=datetime.now)
     does_match = Column(Boolean, nullable=True, default=False)
-    uploaded_text = Column(String(255), nullable=True)
+    uploaded_text = Column(Text, nullable=True)
 
     # Relation with User table
     owner_id = Column(Integer, ForeignKey("users.id"))
@@ -1,9 +1,24 @@
+import asyncio
+import json
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from backend.core.database import get_db
+from pydantic import BaseModel, Field
+from sqlalchemy import case, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import StreamingResponse
+from typing import Awaitable, Callable, Dict, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from backend.core.database import AsyncSessionLocal, SessionLocal, get_async_db
 from backend.models.uploaded_file import UploadedFile
 from backend.core.openai_client import OpenAIClient
+from backend.core.local_vision import LocalChartBackend, PrescreeningBackend, StaticBackend
+from backend.core.vision_backend import (VISION_BACKEND, VisionBackend, VisionBackendError, available_backends,
+                                         get_vision_backend, register_backend)
+from backend.core.images import get_model_image
+from backend.core.analysis_cache import analysis_cache
+from backend.core.near_duplicates import NEAR_DUPLICATE_REUSE_ANALYSIS, find_reusable_results
+from backend.core.semantic_search import embed_analyzed_files
+from backend.core.logging_config import logger
 import os
 from dotenv import load_dotenv
 from backend.routers.file_upload import update_file, UploadedFileUpdate
@@ -14,7 +29,7 @@ router = APIRouter()
  - Czytaj papiery naukowe pod kątem szukania dziur w swojej własnej pracy, i na podstawie niej dalej napraw ten problem.
  Jest to będzie dobrze punktowane mam bibliografie mam cytowania i poprawie implementacje. 'Oryginalnie było X ale napisane
  było że Y działa lepiej, dlatego zmieniłem na działanie Y.' <- Takie coś w inzynierce mega spoko
- - Warto opisać rzeczy które nie wyszły i jakie wnioski z tego wyciągnałem 
+ - Warto opisać rzeczy które nie wyszły i jakie wnioski z tego wyciągnałem
  - Wybór AI do robienia descirption check i generate description np. Bing
 """
 load_dotenv()
@@ -22,69 +37,456 @@ api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     raise RuntimeError("OPENAI_API_KEY is not set. Please configure it in your environment")
 client = OpenAIClient(api_key=api_key)
+register_backend("openai", lambda: client)
+register_backend("prescreen", lambda: PrescreeningBackend(client))
+register_backend("local", LocalChartBackend)
+register_backend("static", StaticBackend)
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+batch_tasks = set()
 
+DEFAULT_ANALYSIS_PROMPT = """
+                 Analyze this graph and provide insights as you would be the best Data Analyst in the world!
+                 Keep in mind that uploaded image might not be graph image in that case just asnwer 'The provided image does not show any graph data'."""
 
-class AnalyzeImageDescriptionRequest(BaseModel):
-    description: str
-    prompt_text: str = """
+DEFAULT_DESCRIPTION_PROMPT = """
         Tell me if provided description match with graph shown in image. If description does not match graph shown in image inform me about it,
         and provide me with description what is really shown in image. Keep in mind that in description might be some gibberish words such as
-        'BBB' or something like that, ignore them and if after ignoring them description still does not match graph shown in image just say 
-        'The description provided does not match and image' and also provide me with proper description. Keep in mind that uploaded image might not be graph image in that case just answer 
+        'BBB' or something like that, ignore them and if after ignoring them description still does not match graph shown in image just say
+        'The description provided does not match and image' and also provide me with proper description. Keep in mind that uploaded image might not be graph image in that case just answer
         'The provided image does not show any graph data'.
     """
 
 
-@router.post("/analyze_file/{file_id}")
-def analyze_file(file_id: int,
-                 prompt_text: str = """
-                 Analyze this graph and provide insights as you would be the best Data Analyst in the world!
-                 Keep in mind that uploaded image might not be graph image in that case just asnwer 'The provided image does not show any graph data'.""",
-                 db: Session = Depends(get_db)):
+class AnalyzeImageDescriptionRequest(BaseModel):
+    description: str
+    prompt_text: str = DEFAULT_DESCRIPTION_PROMPT
+
+
+class BatchAnalysisRequest(BaseModel):
+    # Files are selected by ids and/or a filter, at least one of them is required
+    file_ids: Optional[List[int]] = None
+    owner_id: Optional[int] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+    prompt_text: str = DEFAULT_ANALYSIS_PROMPT
+    use_cache: bool = True
+    backend: Optional[str] = None
+    max_concurrency: int = Field(8, ge=1, le=64)
+
+
+# --- ANALYSIS FUNCTIONS ---
+# Shared by the endpoints below and the job workers (routers/jobs.py). Database work uses async sessions, which
+# are only held for reads and writes, never for the duration of image processing (threadpool) or the model call.
+# The analysis cache is shared with sync code and is called through ``AsyncSession.run_sync``.
+def resolve_backend(name: Optional[str]) -> VisionBackend:
     try:
-        file_record = db.query(UploadedFile).filter(UploadedFile.id == file_id).first()
+        return get_vision_backend(name)
+    except VisionBackendError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def backend_error_status(error: VisionBackendError) -> int:
+    return error.status_code if error.status_code == 429 else 502
+
+
+def find_near_duplicate_results(file_hashes: List[str], prompt_text: str, description: Optional[str],
+                                backend: VisionBackend) -> Dict[str, dict]:
+    """
+    Answers cached for the same request on near-duplicates of the images (see core/near_duplicates.py). Computes
+    missing perceptual hashes, so it runs in the threadpool.
+    """
+    with SessionLocal() as db:
+        return find_reusable_results(db, file_hashes, lambda file_hash: analysis_cache.make_key(
+            file_hash, prompt_text, description, backend.model, backend.max_tokens))
+
+
+async def prepare_analysis(file_id: int, prompt_text: str, description: Optional[str], use_cache: bool,
+                           backend: VisionBackend) -> dict:
+    async with AsyncSessionLocal() as db:
+        file_record = await db.get(UploadedFile, file_id)
         if not file_record:
-            return HTTPException(status_code=404, detail=f"File not found with given id {file_id}")
+            raise HTTPException(status_code=404, detail=f"File not found with given id {file_id}")
+
+        cache_key = analysis_cache.make_key(file_record.file_hash, prompt_text, description,
+                                            backend.model, backend.max_tokens)
+        cached_result = await db.run_sync(analysis_cache.get, cache_key) if use_cache else None
+
+    near_duplicate = None
+    if cached_result is None and use_cache and NEAR_DUPLICATE_REUSE_ANALYSIS:
+        near_duplicate = (await run_in_threadpool(find_near_duplicate_results, [file_record.file_hash], prompt_text,
+                                                  description, backend)).get(file_record.file_hash)
+        if near_duplicate:
+            cached_result = near_duplicate["result"]
+            logger.info("Reusing analysis of near-duplicate %s for file %s (similarity %s)",
+                        near_duplicate["file_hash"], file_id, near_duplicate["similarity"])
+
+    image_data, image_report = None, None
+    if cached_result is None:
+        image_data, image_report = await run_in_threadpool(get_model_image, file_record)
+    return {
+        "model": backend.model,
+        "file_name": file_record.file_name,
+        "file_hash": file_record.file_hash,
+        "cache_key": cache_key,
+        "cached_result": cached_result,
+        "near_duplicate_similarity": near_duplicate["similarity"] if near_duplicate else None,
+        "image_data": image_data,
+        "image_report": image_report,
+    }
+
 
-        analysis_result = client.analyze_image_with_base64(
-            image_data=file_record.file_data,
+async def load_model_image(file_id: int) -> tuple:
+    async with AsyncSessionLocal() as db:
+        file_record = (await db.execute(select(UploadedFile).where(UploadedFile.id == file_id))).scalars().one()
+    return await run_in_threadpool(get_model_image, file_record)
+
+
+async def save_analysis(file_id: int, analysis: dict, analysis_result: str, does_match: Optional[bool] = None):
+    async with AsyncSessionLocal() as db:
+        # Answers reused from a near-duplicate are cached for this image too
+        if analysis["cached_result"] is None or analysis["near_duplicate_similarity"] is not None:
+            await db.run_sync(analysis_cache.set, analysis["cache_key"], analysis["file_hash"], analysis["model"],
+                              analysis_result)
+        await update_file(db=db, file_id=file_id,
+                          updated_data=UploadedFileUpdate(analysis_result=analysis_result, does_match=does_match))
+
+
+async def run_file_analysis(file_id: int, progress: Optional[Callable[[int], Awaitable[None]]] = None,
+                            prompt_text: str = DEFAULT_ANALYSIS_PROMPT, use_cache: bool = True,
+                            backend: Optional[str] = None) -> dict:
+    vision = resolve_backend(backend)
+    analysis = await prepare_analysis(file_id, prompt_text, None, use_cache, vision)
+    analysis_result = analysis["cached_result"]
+    cached = analysis_result is not None
+    if not cached:
+        if progress:
+            await progress(25)
+        image_report = analysis["image_report"]
+        analysis_result = await vision.analyze_image_with_base64(
+            image_data=analysis["image_data"],
             prompt=prompt_text,
-            mime_type="image/png"
+            mime_type=image_report["mime_type"],
+            detail=image_report["detail"],
+            image_tokens=image_report["normalized_tokens_estimate"]
         )
-        updated_data = UploadedFileUpdate()
-        updated_data.analysis_result = analysis_result
-        update_file(db=db, file_id=file_id, updated_data=updated_data)
-        return {"file_name": file_record.file_name, "analysis_result": analysis_result}
-    except Exception as e:  # Do wyspecjalizowania exception
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        db.close()
+    if progress:
+        await progress(90)
 
+    await save_analysis(file_id, analysis, analysis_result)
+    return {"file_name": analysis["file_name"], "analysis_result": analysis_result, "cached": cached,
+            "near_duplicate_similarity": analysis["near_duplicate_similarity"],
+            "backend": vision.name, "image_optimization": analysis["image_report"]}
 
-@router.post("/analyze_image_with_description/{file_id}")
-def analyze_image_with_description(file_id: int, request: AnalyzeImageDescriptionRequest,
-                                   db: Session = Depends(get_db)):
-    try:
-        file_record = db.query(UploadedFile).filter(UploadedFile.id == file_id).first()
-        if not file_record:
-            return HTTPException(status_code=404, detail=f"File not found with given id {file_id}")
 
-        analysis_result = client.analyze_image_with_description_base64(
-            image_data=file_record.file_data,
-            description=request.description,
-            prompt=request.prompt_text,
-            mime_type="image/png"
+async def run_description_analysis(file_id: int, progress: Optional[Callable[[int], Awaitable[None]]] = None,
+                                   description: str = "", prompt_text: str = DEFAULT_DESCRIPTION_PROMPT,
+                                   use_cache: bool = True, backend: Optional[str] = None) -> dict:
+    vision = resolve_backend(backend)
+    analysis = await prepare_analysis(file_id, prompt_text, description, use_cache, vision)
+    analysis_result = analysis["cached_result"]
+    cached = analysis_result is not None
+    if not cached:
+        if progress:
+            await progress(25)
+        image_report = analysis["image_report"]
+        analysis_result = await vision.analyze_image_with_description_base64(
+            image_data=analysis["image_data"],
+            description=description,
+            prompt=prompt_text,
+            mime_type=image_report["mime_type"],
+            detail=image_report["detail"],
+            image_tokens=image_report["normalized_tokens_estimate"]
         )
+    if progress:
+        await progress(90)
+
+    does_match = "True" in analysis_result
+    await save_analysis(file_id, analysis, analysis_result, does_match)
+    return {"file_name": analysis["file_name"], "description": description,
+            "analysis_result": analysis_result, "does_match": does_match, "cached": cached,
+            "near_duplicate_similarity": analysis["near_duplicate_similarity"],
+            "backend": vision.name, "image_optimization": analysis["image_report"]}
 
+
+# --- STREAMING ANALYSIS ---
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_analysis_events(file_id: int, prompt_text: str, description: Optional[str], use_cache: bool,
+                                 vision: VisionBackend):
+    """
+    Server-Sent Events of an analysis: ``token`` events as the model writes, then ``done`` with the full result.
+    The result is persisted only after the stream completed, a client disconnect cancels this generator before
+    anything is written.
+    """
+    yield ": analysis started\n\n"  # Sends the response headers right away
+    try:
+        analysis = await prepare_analysis(file_id, prompt_text, description, use_cache, vision)
+    except HTTPException as e:
+        yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+        return
+    except Exception as e:
+        logger.exception("Preparing streaming analysis of file %s failed: %s", file_id, e)
+        yield sse_event("error", {"status_code": 500, "detail": "Internal server error"})
+        return
+
+    analysis_result = analysis["cached_result"]
+    cached = analysis_result is not None
+    if cached:
+        yield sse_event("token", {"text": analysis_result})
+    else:
+        image_report = analysis["image_report"]
+        image_arguments = {
+            "image_data": analysis["image_data"],
+            "prompt": prompt_text,
+            "mime_type": image_report["mime_type"],
+            "detail": image_report["detail"],
+            "image_tokens": image_report["normalized_tokens_estimate"],
+        }
+        if description is None:
+            tokens = vision.stream_image_with_base64(**image_arguments)
+        else:
+            tokens = vision.stream_image_with_description_base64(description=description, **image_arguments)
+
+        parts = []
+        try:
+            async for token in tokens:
+                parts.append(token)
+                yield sse_event("token", {"text": token})
+        except VisionBackendError as e:
+            logger.error("Streaming analysis of file %s failed: %s", file_id, e)
+            yield sse_event("error", {"status_code": e.status_code or 502, "detail": str(e)})
+            return
+        except Exception as e:
+            logger.exception("Streaming analysis of file %s failed: %s", file_id, e)
+            yield sse_event("error", {"status_code": 500, "detail": "Internal server error"})
+            return
+        analysis_result = "".join(parts)
+
+    result = {"file_name": analysis["file_name"], "analysis_result": analysis_result, "cached": cached,
+              "near_duplicate_similarity": analysis["near_duplicate_similarity"],
+              "backend": vision.name, "image_optimization": analysis["image_report"]}
+    does_match = None
+    if description is not None:
         does_match = "True" in analysis_result
+        result.update({"description": description, "does_match": does_match})
+    try:
+        await save_analysis(file_id, analysis, analysis_result, does_match)
+    except Exception as e:
+        logger.exception("Saving streamed analysis of file %s failed: %s", file_id, e)
+        yield sse_event("error", {"status_code": 500, "detail": "Internal server error"})
+        return
+    yield sse_event("done", result)
+
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# --- BATCH ANALYSIS ---
+async def select_batch_files(request: BatchAnalysisRequest) -> List[tuple]:
+    query = select(UploadedFile.id, UploadedFile.file_name, UploadedFile.file_hash)
+    if request.file_ids is not None:
+        query = query.where(UploadedFile.id.in_(request.file_ids))
+    if request.owner_id is not None:
+        query = query.where(UploadedFile.owner_id == request.owner_id)
+    if request.uploaded_after is not None:
+        query = query.where(UploadedFile.uploaded_at >= request.uploaded_after)
+    if request.uploaded_before is not None:
+        query = query.where(UploadedFile.uploaded_at < request.uploaded_before)
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(query.order_by(UploadedFile.id).limit(BATCH_MAX_FILES + 1))).all()
+
+
+async def lookup_batch_cache(cache_keys: List[str]) -> Dict[str, str]:
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(analysis_cache.get_many, cache_keys)
+
+
+async def save_batch_results(results: Dict[int, str], cache_entries: List[dict]):
+    """Writes all results back with a single UPDATE statement and stores new answers in the cache."""
+    async with AsyncSessionLocal() as db:
+        if results:
+            await db.execute(
+                update(UploadedFile)
+                .where(UploadedFile.id.in_(list(results)))
+                .values(analysis_result=case(results, value=UploadedFile.id))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            await run_in_threadpool(embed_analyzed_files, list(results))
+        if cache_entries:
+            await db.run_sync(analysis_cache.set_many, cache_entries)
+
+
+async def run_batch_analysis(request: BatchAnalysisRequest, vision: VisionBackend, files: List[tuple],
+                             missing_ids: List[int], output: asyncio.Queue):
+    """
+    Analyzes every unique image once, with at most ``request.max_concurrency`` model calls in flight, and puts
+    one result per file on ``output`` as soon as it is known. Runs independently of the HTTP response, so a client
+    disconnect does not lose already computed results.
+    """
+    files_by_hash: Dict[str, List[tuple]] = {}
+    for file in files:
+        files_by_hash.setdefault(file.file_hash, []).append(file)
+    cache_keys = {
+        file_hash: analysis_cache.make_key(file_hash, request.prompt_text, None, vision.model, vision.max_tokens)
+        for file_hash in files_by_hash
+    }
+
+    results: Dict[int, str] = {}
+    cache_entries: List[dict] = []
+    summary = {"files": len(files) + len(missing_ids), "unique_images": len(files_by_hash), "cached": 0,
+               "near_duplicates": 0, "analyzed": 0, "failed": len(missing_ids)}
+    for file_id in missing_ids:
+        await output.put({"file_id": file_id, "file_name": None, "status": "error", "analysis_result": None,
+                          "cached": False, "error": f"File not found with given id {file_id}"})
+
+    async def publish(file_hash: str, analysis_result: Optional[str], cached: bool, error: Optional[str] = None,
+                      near_duplicate_similarity: Optional[float] = None):
+        for file in files_by_hash[file_hash]:
+            if error is None:
+                results[file.id] = analysis_result
+                summary["cached" if cached else "analyzed"] += 1
+                summary["near_duplicates"] += near_duplicate_similarity is not None
+            else:
+                summary["failed"] += 1
+            await output.put({"file_id": file.id, "file_name": file.file_name,
+                              "status": "ok" if error is None else "error",
+                              "analysis_result": analysis_result, "cached": cached,
+                              "near_duplicate_similarity": near_duplicate_similarity, "error": error})
+
+    try:
+        cached_results = {}
+        if request.use_cache:
+            cached_results = await lookup_batch_cache(list(cache_keys.values()))
+        pending = []
+        for file_hash, cache_key in cache_keys.items():
+            if cache_key in cached_results:
+                await publish(file_hash, cached_results[cache_key], cached=True)
+            else:
+                pending.append(file_hash)
+        if request.use_cache and NEAR_DUPLICATE_REUSE_ANALYSIS and pending:
+            near_duplicates = await run_in_threadpool(find_near_duplicate_results, pending, request.prompt_text, None,
+                                                      vision)
+            for file_hash, near_duplicate in near_duplicates.items():
+                cache_entries.append({"cache_key": cache_keys[file_hash], "file_hash": file_hash,
+                                      "model": vision.model, "result": near_duplicate["result"]})
+                await publish(file_hash, near_duplicate["result"], cached=True,
+                              near_duplicate_similarity=near_duplicate["similarity"])
+            pending = [file_hash for file_hash in pending if file_hash not in near_duplicates]
+
+        semaphore = asyncio.Semaphore(request.max_concurrency)
+
+        async def analyze(file_hash: str):
+            async with semaphore:
+                try:
+                    image_data, image_report = await load_model_image(files_by_hash[file_hash][0].id)
+                    analysis_result = await vision.analyze_image_with_base64(
+                        image_data=image_data,
+                        prompt=request.prompt_text,
+                        mime_type=image_report["mime_type"],
+                        detail=image_report["detail"],
+                        image_tokens=image_report["normalized_tokens_estimate"]
+                    )
+                except Exception as e:
+                    logger.error("Batch analysis of image %s failed: %s", file_hash, e)
+                    await publish(file_hash, None, cached=False, error=str(e))
+                    return
+            cache_entries.append({"cache_key": cache_keys[file_hash], "file_hash": file_hash,
+                                  "model": vision.model, "result": analysis_result})
+            await publish(file_hash, analysis_result, cached=False)
+
+        await asyncio.gather(*(analyze(file_hash) for file_hash in pending))
+    finally:
+        await save_batch_results(results, cache_entries)
+        await output.put({"summary": summary})
+        await output.put(None)
+
+
+# --- ENDPOINTS ---
+@router.post("/analyze_file/{file_id}")
+async def analyze_file(file_id: int, prompt_text: str = DEFAULT_ANALYSIS_PROMPT, use_cache: bool = True,
+                       backend: Optional[str] = None):
+    try:
+        return await run_file_analysis(file_id, prompt_text=prompt_text, use_cache=use_cache, backend=backend)
+    except HTTPException:
+        raise
+    except VisionBackendError as e:
+        raise HTTPException(status_code=backend_error_status(e), detail=str(e))
+    except Exception as e:  # Do wyspecjalizowania exception
+        raise HTTPException(status_code=500, detail=str(e))
 
-        file_record.analysis_result = analysis_result
-        file_record.does_match = does_match
-        db.commit()
 
-        return {"file_name": file_record.file_name, "description": request.description,
-                "analysis_result": analysis_result, "does_match": does_match}
+@router.post("/analyze_image_with_description/{file_id}")
+async def analyze_image_with_description(file_id: int, request: AnalyzeImageDescriptionRequest,
+                                         use_cache: bool = True, backend: Optional[str] = None):
+    try:
+        return await run_description_analysis(file_id, description=request.description,
+                                              prompt_text=request.prompt_text, use_cache=use_cache,
+                                              backend=backend)
+    except HTTPException:
+        raise
+    except VisionBackendError as e:
+        raise HTTPException(status_code=backend_error_status(e), detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        db.close()
+
+
+@router.post("/analyze_file/{file_id}/stream")
+async def analyze_file_stream(file_id: int, prompt_text: str = DEFAULT_ANALYSIS_PROMPT, use_cache: bool = True,
+                              backend: Optional[str] = None):
+    return sse_response(stream_analysis_events(file_id, prompt_text, None, use_cache, resolve_backend(backend)))
+
+
+@router.post("/analyze_image_with_description/{file_id}/stream")
+async def analyze_image_with_description_stream(file_id: int, request: AnalyzeImageDescriptionRequest,
+                                                use_cache: bool = True, backend: Optional[str] = None):
+    return sse_response(stream_analysis_events(file_id, request.prompt_text, request.description, use_cache,
+                                               resolve_backend(backend)))
+
+
+@router.post("/analyze_batch")
+async def analyze_batch(request: BatchAnalysisRequest):
+    """
+    Analyzes many files in one call and streams newline-delimited JSON: one line per file as its result is ready,
+    followed by a summary line. Files sharing the same image are analyzed once.
+    """
+    if request.file_ids is None and request.owner_id is None \
+            and request.uploaded_after is None and request.uploaded_before is None:
+        raise HTTPException(status_code=400, detail="Provide file_ids or a filter (owner_id, uploaded_after/before)")
+    vision = resolve_backend(request.backend)
+
+    files = await select_batch_files(request)
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {BATCH_MAX_FILES} files")
+    logger.info("Starting batch analysis of %s files", len(files))
+    found_ids = {file.id for file in files}
+    missing_ids = [file_id for file_id in dict.fromkeys(request.file_ids or []) if file_id not in found_ids]
+
+    output: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(run_batch_analysis(request, vision, files, missing_ids, output))
+    # The event loop only keeps weak references to tasks
+    batch_tasks.add(task)
+    task.add_done_callback(batch_tasks.discard)
+
+    async def results():
+        while True:
+            item = await output.get()
+            if item is None:
+                return
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@router.get("/analysis_cache/stats")
+async def get_analysis_cache_stats(db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(analysis_cache.stats)
+
+
+@router.get("/vision_backends")
+def get_vision_backends():
+    return {"default": VISION_BACKEND, "available": available_backends()}
@@ -1,23 +1,62 @@
+import asyncio
 import hashlib
-
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query
-from sqlalchemy.orm import Session
-from starlette.responses import FileResponse
+import re
+
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import Select, delete, func, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 import base64
 from backend.models.uploaded_file import UploadedFile
 from backend.models.user import User
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, List, Tuple
 from datetime import datetime
-from backend.core.database import get_db
-from backend.core.logging_config import logger
-from backend.core.jwt_auth import JWTError, get_current_user
+from backend.core.database import AsyncSessionLocal, SessionLocal, get_async_db
+from backend.core.blob_store import BlobNotFoundError, ensure_blob, get_blob_store, read_file_data
+from backend.core.file_response import blob_response
+from backend.core.images import (MIME_TYPES, THUMBNAIL_FORMAT, create_thumbnail, detect_blob_mime_type,
+                                 ensure_image_variant, ensure_thumbnail, format_perceptual_hash, get_thumbnail,
+                                 perceptual_hash)
+from backend.core.logging_config import SAMPLED, logger
+from backend.core.metrics import FILE_PREVIEW_BYTES
+from backend.core.jwt_auth import CurrentUser, JWTError, get_current_user
+from backend.core.content_blobs import (ADD_REFERENCE_ATTEMPTS, BlobCollectingError, add_references, collect_garbage,
+                                        ensure_content_stored, release_references, shared_blobs)
+from backend.core.bulk_ingest import (ARCHIVE_HEAD_LENGTH, ARCHIVE_TYPE_ERROR, BULK_MAX_ARCHIVE_BYTES, BulkIngestor,
+                                      detect_archive_type, iter_archive_items)
+from backend.core.twitter_client import Tweet, TwitterError, twitter_client
+from backend.core.near_duplicates import NEAR_DUPLICATE_MIN_SIMILARITY, find_near_duplicates, similarity
+from backend.core.search import query_words, search_files
+from backend.core.embeddings import get_embedder
+from backend.core.semantic_search import embed_analyzed_files, file_vector, search_embeddings, semantic_index
+from backend.models.file_embedding import FileEmbedding
+from backend.models.analysis_job import AnalysisJob
+from backend.core.vision_backend import VisionBackendError, get_vision_backend
+from backend.core.uploads import (UPLOAD_MAX_FILE_BYTES, UPLOAD_USER_QUOTA_BYTES, SpooledUpload,
+                                  parse_content_sha256, receive_multipart_upload, too_large)
 import os
-import requests
 
 router = APIRouter()
 
 # --- DTO MODELS ---
+LIST_DEFAULT_LIMIT = 50
+LIST_MAX_LIMIT = 500
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_MAX_OFFSET = 1000
+SEMANTIC_SEARCH_MAX_LIMIT = 100
+SEMANTIC_SEARCH_OVERSAMPLING = 4  # Nearest neighbours fetched per result, the filters are applied to them
+TWITTER_IMPORT_MAX_TWEETS = int(os.getenv("TWITTER_IMPORT_MAX_TWEETS", "100"))
+TWITTER_IMPORT_CONCURRENCY = int(os.getenv("TWITTER_IMPORT_CONCURRENCY", "8"))
+TWEET_ID_PATTERN = re.compile(r"^\d{1,20}$|/status(?:es)?/(\d{1,20})")
+# Fields of UploadedFileRead stored as columns, the others are computed
+COLUMN_FIELDS = {"file_name", "uploaded_at", "analysis_result", "uploaded_text", "does_match"}
+
 class UploadedFileCreate(BaseModel):
     user_id: int
     file_name: str
@@ -34,11 +73,43 @@ class UploadedFileRead(BaseModel):
     uploaded_at: datetime
     analysis_result: Optional[str]
     uploaded_text: Optional[str]
-    file_preview: Optional[str]
+    does_match: Optional[bool] = None
+    file_preview: Optional[str] = None
+    thumbnail_url: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+class SimilarFileRead(BaseModel):
+    id: int
+    file_name: str
+    uploaded_at: datetime
+    analysis_result: Optional[str]
+    thumbnail_url: str
+    similarity: float  # 1 - differing bits / 64 of the perceptual hashes
+    distance: int
+
+class FileSearchResult(BaseModel):
+    id: int
+    file_name: str
+    uploaded_at: datetime
+    analysis_result: Optional[str]
+    uploaded_text: Optional[str]
+    does_match: Optional[bool] = None
+    thumbnail_url: str
+    score: float  # Relevance, higher is better, comparable within one query only
+    snippet: Optional[str]  # Matching text, HTML-escaped, matches enclosed in <mark></mark>
+
+class SemanticSearchResult(BaseModel):
+    id: int
+    file_name: str
+    uploaded_at: datetime
+    analysis_result: Optional[str]
+    uploaded_text: Optional[str]
+    does_match: Optional[bool] = None
+    thumbnail_url: str
+    similarity: float  # Cosine similarity of the embeddings
+
 class UploadFileRequest(BaseModel):
     user_id: int
     file_name: str
@@ -49,95 +120,525 @@ class TwitterDataRequest(BaseModel):
     url: str  # Full URL of the Twitter post
     tweet_id: str  # Extracted tweet ID from the URL
 
-@router.post("/twitter_data")
-def fetch_twitter_data(request: TwitterDataRequest):
+class TwitterImportRequest(BaseModel):
+    tweets: List[str] = Field(..., min_length=1, max_length=TWITTER_IMPORT_MAX_TWEETS)  # Tweet ids or post URLs
+
+class FileListParams:
     """
-    Fetch image and description from Twitter API.
+    Query parameters shared by the file listings. Results are ordered newest first and paginated by a cursor:
+    the ``X-Next-Cursor`` response header holds the value to pass as ``cursor`` for the next page.
     """
-    BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")  # Your Bearer Token from the environment
 
-    # Validate BEARER_TOKEN is present
-    if not BEARER_TOKEN:
-        raise HTTPException(
-            status_code=500, detail="Twitter API integration is not configured properly."
-        )
+    def __init__(self,
+                 limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+                 cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+                 does_match: Optional[bool] = None,
+                 analyzed: Optional[bool] = Query(None, description="Only files with (true) or without (false) "
+                                                                    "an analysis result"),
+                 uploaded_after: Optional[datetime] = None,
+                 uploaded_before: Optional[datetime] = None,
+                 fields: Optional[str] = Query(None, description="Comma separated fields to return, "
+                                                                 "e.g. id,file_name,thumbnail_url")):
+        self.limit = limit
+        self.cursor = decode_cursor(cursor) if cursor else None
+        self.does_match = does_match
+        self.analyzed = analyzed
+        self.uploaded_after = uploaded_after
+        self.uploaded_before = uploaded_before
+        self.fields = parse_fields(fields) if fields else None
+
+# --- AUXILIARY FUNCTIONS ---
+def encode_cursor(uploaded_at: datetime, file_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{uploaded_at.isoformat()}|{file_id}".encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        uploaded_at, file_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(uploaded_at), int(file_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+def parse_fields(fields: str) -> set:
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(UploadedFileRead.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested | {"id"}
+
+def filter_files(query: Select, does_match: Optional[bool], analyzed: Optional[bool],
+                 uploaded_after: Optional[datetime], uploaded_before: Optional[datetime]) -> Select:
+    if does_match is not None:
+        query = query.where(UploadedFile.does_match == does_match)
+    if analyzed is not None:
+        query = query.where(UploadedFile.analysis_result.isnot(None) if analyzed
+                            else UploadedFile.analysis_result.is_(None))
+    if uploaded_after is not None:
+        query = query.where(UploadedFile.uploaded_at >= uploaded_after)
+    if uploaded_before is not None:
+        query = query.where(UploadedFile.uploaded_at < uploaded_before)
+    return query
+
+async def list_files(db: AsyncSession, query: Select, params: FileListParams, fields: set) -> tuple:
+    """
+    Applies the filters and one page of keyset pagination to ``query``. Only the requested columns are loaded.
+    Returns the page and the cursor of the next one (None on the last page).
+    """
+    query = filter_files(query, params.does_match, params.analyzed, params.uploaded_after, params.uploaded_before)
+    if params.cursor is not None:
+        # Row value comparison, served by the (owner_id, uploaded_at, id) and (uploaded_at, id) indexes
+        query = query.where(tuple_(UploadedFile.uploaded_at, UploadedFile.id) < params.cursor)
+
+    columns = {"uploaded_at", "file_hash"} if "file_preview" in fields else {"uploaded_at"}
+    columns |= fields & COLUMN_FIELDS
+    files = (await db.execute(
+        query.options(load_only(*(getattr(UploadedFile, column) for column in columns)))
+        .order_by(UploadedFile.uploaded_at.desc(), UploadedFile.id.desc())
+        .limit(params.limit + 1)
+    )).scalars().all()
+    next_cursor = None
+    if len(files) > params.limit:
+        files = files[:params.limit]
+        next_cursor = encode_cursor(files[-1].uploaded_at, files[-1].id)
+    return files, next_cursor
+
+def file_list_response(files: list, fields: set, next_cursor: Optional[str]) -> JSONResponse:
+    """Builds the listing response, reads thumbnails from the blob store so it runs in the threadpool."""
+    items = []
+    for file in files:
+        item = {field: getattr(file, field) for field in fields & COLUMN_FIELDS}
+        item["id"] = file.id
+        if "thumbnail_url" in fields:
+            item["thumbnail_url"] = thumbnail_url(file.id)
+        if "file_preview" in fields:
+            item["file_preview"] = thumbnail_preview(get_thumbnail(file))
+        items.append(item)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return JSONResponse(jsonable_encoder(items), headers=headers)
+
+def thumbnail_url(file_id: int) -> str:
+    return f"/api/files/{file_id}/thumbnail"
+
+def thumbnail_preview(thumbnail: bytes) -> str:
+    preview = f"data:{MIME_TYPES[THUMBNAIL_FORMAT]};base64,{base64.b64encode(thumbnail).decode('utf-8')}"
+    FILE_PREVIEW_BYTES.labels("thumbnail").observe(len(preview))
+    return preview
+
+async def get_file_or_404(db: AsyncSession, file_id: int) -> UploadedFile:
+    uploaded_file = await db.get(UploadedFile, file_id)
+    if not uploaded_file:
+        logger.error('File with id %s not found', file_id)
+        raise HTTPException(status_code=404, detail='File not found.')
+    return uploaded_file
 
-    headers = {
-        "Authorization": f"Bearer {BEARER_TOKEN}"
-    }
+def store_uploaded_file(file_hash: str, file_data: bytes) -> Tuple[bytes, str]:
+    """Puts the bytes of a new upload in the blob store and returns its thumbnail and perceptual hash."""
+    try:
+        thumbnail = create_thumbnail(file_hash, file_data)
+        phash = format_perceptual_hash(perceptual_hash(file_data))
+    except Exception as e:
+        logger.error("Failed to create thumbnail: %s", e)
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid image")
+    get_blob_store().put(file_hash, file_data)
+    return thumbnail, phash
 
-    # Extract the Tweet ID from the request
-    tweet_id = request.tweet_id
+def store_spooled_upload(upload: SpooledUpload) -> Tuple[bytes, str]:
+    """Moves a spooled upload into the blob store and returns its thumbnail and perceptual hash."""
+    try:
+        thumbnail = create_thumbnail(upload.file_hash, upload.path)
+        phash = format_perceptual_hash(perceptual_hash(upload.path))
+    except Exception as e:
+        logger.error("Failed to create thumbnail: %s", e)
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid image")
+    get_blob_store().put_file(upload.file_hash, upload.path)
+    return thumbnail, phash
+
+def ensure_spooled_content_stored(upload: SpooledUpload) -> bool:
+    """Like ``ensure_content_stored``, False when the bytes are gone and the spool file was already moved."""
+    if get_blob_store().exists(upload.file_hash):
+        return True
+    if not os.path.exists(upload.path):
+        return False
+    get_blob_store().put_file(upload.file_hash, upload.path)
+    return True
+
+def uploaded_file_read(uploaded_file: UploadedFile, thumbnail: bytes) -> UploadedFileRead:
+    return UploadedFileRead(
+        id=uploaded_file.id,
+        file_name=uploaded_file.file_name,
+        uploaded_at=uploaded_file.uploaded_at,
+        analysis_result=uploaded_file.analysis_result,
+        file_preview=thumbnail_preview(thumbnail),
+        thumbnail_url=thumbnail_url(uploaded_file.id),
+        uploaded_text=uploaded_file.uploaded_text
+    )
+
+async def existing_file_read(uploaded_file: UploadedFile) -> UploadedFileRead:
+    logger.info("File with hash %s already exists in database: %s", uploaded_file.file_hash, uploaded_file,
+                extra=SAMPLED)
+    return uploaded_file_read(uploaded_file, await run_in_threadpool(get_thumbnail, uploaded_file))
+
+async def find_user_file(db: AsyncSession, owner_id: int, file_hash: str) -> Optional[UploadedFile]:
+    """The owner's upload of the given content. Uploads of other users are never returned."""
+    return (await db.execute(select(UploadedFile).where(
+        UploadedFile.owner_id == owner_id,
+        UploadedFile.file_hash == file_hash,
+    ))).scalars().first()
 
+async def is_shared_content(file_hash: str) -> bool:
+    async with AsyncSessionLocal() as db:
+        return file_hash in await db.run_sync(shared_blobs, [file_hash])
+
+async def insert_uploaded_file(values: dict, phash: Optional[str] = None) -> Tuple[UploadedFile, bool]:
+    """
+    Inserts an upload together with a reference to its content blob, ``phash`` is the perceptual hash of content
+    stored for the first time. Returns the row and whether it was created, when the owner uploaded the same content
+    concurrently their existing row is returned instead.
+    """
+    for attempt in range(ADD_REFERENCE_ATTEMPTS):
+        async with AsyncSessionLocal() as db:
+            uploaded_file = UploadedFile(**values)
+            try:
+                await db.run_sync(add_references, {uploaded_file.file_hash: uploaded_file.file_size},
+                                  {uploaded_file.file_hash: phash} if phash else None)
+                db.add(uploaded_file)
+                await db.commit()
+                return uploaded_file, True
+            except (IntegrityError, BlobCollectingError):
+                await db.rollback()
+                existing_file = await find_user_file(db, values["owner_id"], values["file_hash"])
+                if existing_file:
+                    return existing_file, False
+        # Another transaction is creating or collecting the same content blob
+        await asyncio.sleep(0.05 * (attempt + 1))
+    logger.warning("Could not reference content %s after %s attempts", values['file_hash'], ADD_REFERENCE_ATTEMPTS)
+    raise HTTPException(status_code=503, detail="File content is being updated, please retry the upload.")
+
+async def remove_uploaded_file(db: AsyncSession, uploaded_file: UploadedFile):
+    """Deletes an upload and its reference, the content is deleted with its last reference."""
+    file_hash, file_id = uploaded_file.file_hash, uploaded_file.id
+    # Also done by the foreign keys, which SQLite does not enforce
+    await db.execute(delete(FileEmbedding).where(FileEmbedding.file_id == file_id))
+    await db.execute(update(AnalysisJob).where(AnalysisJob.file_id == file_id).values(file_id=None))
+    await db.delete(uploaded_file)
+    await db.run_sync(release_references, [file_hash])
+    await db.commit()
+    semantic_index.remove([file_id])
+    await run_in_threadpool(collect_garbage, [file_hash])
+
+async def save_spooled_upload(upload: SpooledUpload, owner_id: int, file_name: str,
+                              uploaded_text: Optional[str]) -> Tuple[UploadedFile, Optional[bytes], bool]:
+    """
+    Stores a received upload for the owner unless they already have the same content. Returns the row, the
+    thumbnail if it was rendered for this upload and whether the row was created. The caller discards the spool file.
+    """
+    async with AsyncSessionLocal() as db:
+        existing_file = await find_user_file(db, owner_id, upload.file_hash)
+        if existing_file:
+            return existing_file, None, False
+
+    thumbnail, phash = None, None
+    if not await is_shared_content(upload.file_hash):
+        thumbnail, phash = await run_in_threadpool(store_spooled_upload, upload)
+    uploaded_file, created = await insert_uploaded_file(dict(
+        file_name=file_name[:255],
+        file_hash=upload.file_hash,
+        file_size=upload.size,
+        uploaded_text=uploaded_text,
+        owner_id=owner_id,
+        uploaded_at=datetime.now(),
+    ), phash)
+    if not created:
+        return uploaded_file, None, False
+    if not await run_in_threadpool(ensure_spooled_content_stored, upload):
+        # The bytes moved out of the spool were deleted by a concurrent collection of the same content
+        logger.warning("Content %s was collected during the upload of file %s", upload.file_hash, uploaded_file.id)
+        async with AsyncSessionLocal() as db:
+            await remove_uploaded_file(db, await db.get(UploadedFile, uploaded_file.id))
+        raise HTTPException(status_code=503, detail="File content is being updated, please retry the upload.")
+    return uploaded_file, thumbnail, True
+
+async def remaining_quota(db: AsyncSession, user_id: int) -> Optional[int]:
+    """Bytes the user may still upload, None without a quota. Raises 413 once the quota is used up."""
+    if UPLOAD_USER_QUOTA_BYTES <= 0:
+        return None
+    used = (await db.execute(
+        select(func.coalesce(func.sum(UploadedFile.file_size), 0)).where(UploadedFile.owner_id == user_id)
+    )).scalar()
+    remaining = UPLOAD_USER_QUOTA_BYTES - used
+    if remaining <= 0:
+        raise HTTPException(status_code=413, detail="Upload quota exceeded.")
+    return remaining
+
+async def upload_limit(db: AsyncSession, user_id: int) -> int:
+    """
+    Largest file the user may upload now: the per-file limit or what is left of their quota. Concurrent uploads of
+    one user are checked against the same remaining quota and may exceed it by at most one file each.
+    """
+    remaining = await remaining_quota(db, user_id)
+    return UPLOAD_MAX_FILE_BYTES if remaining is None else min(UPLOAD_MAX_FILE_BYTES, remaining)
+
+def find_similar_user_files(owner_id: int, file_hash: str, min_similarity: float, limit: int) -> List[dict]:
+    """The owner's files whose content is a near-duplicate of ``file_hash``, most similar first."""
+    with SessionLocal() as db:
+        matches = find_near_duplicates(db, file_hash, min_similarity)
+        distances = {other_hash: distance for distance, other_hash in matches}
+        if not distances:
+            return []
+        files = db.execute(select(UploadedFile).where(
+            UploadedFile.owner_id == owner_id,
+            UploadedFile.file_hash.in_(list(distances)),
+        )).scalars().all()
+    files.sort(key=lambda file: (distances[file.file_hash], -file.id))
+    return [{
+        "id": file.id,
+        "file_name": file.file_name,
+        "uploaded_at": file.uploaded_at,
+        "analysis_result": file.analysis_result,
+        "thumbnail_url": thumbnail_url(file.id),
+        "similarity": similarity(distances[file.file_hash]),
+        "distance": distances[file.file_hash],
+    } for file in files[:limit]]
+
+def find_semantic_matches(owner_id: int, q: Optional[str], file_id: Optional[int], limit: int,
+                          min_similarity: float, filters: dict) -> List[dict]:
+    """
+    The owner's files closest in meaning to the query text or to one of their files, most similar first. The
+    nearest neighbours are fetched from the index and then narrowed down by the ``filter_files`` filters.
+    """
+    with SessionLocal() as db:
+        if file_id is not None:
+            if db.execute(select(UploadedFile.id).where(UploadedFile.id == file_id,
+                                                        UploadedFile.owner_id == owner_id)).scalar() is None:
+                raise HTTPException(status_code=404, detail="File not found or you do not have access to this file.")
+            vector = file_vector(db, file_id)
+            if vector is None:
+                raise HTTPException(status_code=422, detail="The image of this file can not be read.")
+        else:
+            vector = get_embedder().embed_query(q)
+            if not vector.any():
+                raise HTTPException(status_code=400, detail="The search query contains no words.")
+        # The file searched by is its own nearest neighbour
+        k = limit * SEMANTIC_SEARCH_OVERSAMPLING + (file_id is not None)
+        matches = [(match_id, score) for match_id, score in search_embeddings(db, vector, k, owner_id)
+                   if match_id != file_id and score > min_similarity]
+        if not matches:
+            return []
+        query = select(UploadedFile).where(UploadedFile.owner_id == owner_id,
+                                           UploadedFile.id.in_([match_id for match_id, _ in matches]))
+        files = {file.id: file for file in db.execute(filter_files(query, **filters)).scalars()}
+    return [{
+        "id": match_id,
+        "file_name": files[match_id].file_name,
+        "uploaded_at": files[match_id].uploaded_at,
+        "analysis_result": files[match_id].analysis_result,
+        "uploaded_text": files[match_id].uploaded_text,
+        "does_match": files[match_id].does_match,
+        "thumbnail_url": thumbnail_url(match_id),
+        "similarity": round(score, 4),
+    } for match_id, score in matches if match_id in files][:limit]
+
+def parse_tweet_id(value: str) -> Optional[str]:
+    """The tweet id of an id or a post URL such as https://x.com/user/status/123."""
+    match = TWEET_ID_PATTERN.search(value.strip())
+    if not match:
+        return None
+    return match.group(1) or match.group(0)
+
+def form_flag(value: Optional[str]) -> bool:
+    return (value or "").strip().lower() in ("1", "true", "yes", "on")
+
+def file_content_response(request: Request, uploaded_file: UploadedFile, size: Optional[int],
+                          image_format: Optional[str], quality: int):
     try:
-        # Make request to Twitter API
-        twitter_api_url = (
-            f"https://api.twitter.com/2/tweets/{tweet_id}"
-            f"?expansions=attachments.media_keys&media.fields=url&tweet.fields=text"
-        )
-        response = requests.get(twitter_api_url, headers=headers)
+        if size or image_format:
+            key, media_type = ensure_image_variant(uploaded_file, size, (image_format or "png").upper(), quality)
+        else:
+            key = ensure_blob(uploaded_file)
+            media_type = detect_blob_mime_type(key)
+    except BlobNotFoundError:
+        logger.error('Content of file with id %s is missing in blob store', uploaded_file.id)
+        raise HTTPException(status_code=404, detail='File content not found.')
 
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail="Failed to fetch tweet details")
+    return blob_response(request, key, media_type, last_modified=uploaded_file.uploaded_at)
 
-        tweet_data = response.json()
 
-        # Extract the image URL and text
-        tweet_text = tweet_data["data"]["text"]
-        media = tweet_data.get("includes", {}).get("media", [])
-        if not media or media[0]["type"] != "photo":
-            raise HTTPException(status_code=404, detail="Image not found in the Twitter post.")
+@router.post("/twitter_data")
+def fetch_twitter_data(request: TwitterDataRequest):
+    """
+    Fetch image and description from Twitter API.
+    """
+    try:
+        tweet = twitter_client.get_tweet(request.tweet_id)
+    except TwitterError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if not tweet.photo_urls:
+        raise HTTPException(status_code=404, detail="Image not found in the Twitter post.")
 
-        image_url = media[0]["url"]
+    return {
+        "image_url": tweet.photo_urls[0],
+        "tweet_text": tweet.text,
+    }
 
-        return {
-            "image_url": image_url,
-            "tweet_text": tweet_text,
-        }
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+@router.post("/twitter/import")
+async def import_tweets(request: TwitterImportRequest, current_user: CurrentUser = Depends(get_current_user)):
+    """
+    Imports the photos of tweets, given by id or post URL, for the current user: the tweets are looked up in
+    batches (and cached), each photo is streamed from Twitter straight into the blob store and stored like an upload
+    with the tweet text as ``uploaded_text``. Photos the user already has are reported as duplicates, photos past
+    the user's quota as ``quota_exceeded``. Returns the counts and a result per photo, or per tweet when it could not
+    be imported.
+    """
+    async with AsyncSessionLocal() as db:
+        remaining = await remaining_quota(db, current_user.id)
+    quota = {"remaining": remaining}  # Shared by the photos downloaded concurrently
+    quota_lock = asyncio.Lock()
 
+    tweet_ids = {value: parse_tweet_id(value) for value in request.tweets}
+    try:
+        tweets = await run_in_threadpool(twitter_client.get_tweets,
+                                         [tweet_id for tweet_id in tweet_ids.values() if tweet_id])
+    except TwitterError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    results = []
+    semaphore = asyncio.Semaphore(TWITTER_IMPORT_CONCURRENCY)
+
+    async def import_photo(tweet: Tweet, index: int, url: str) -> dict:
+        result = {"tweet_id": tweet.tweet_id, "image_url": url, "file_id": None, "error": None}
+        quota_exceeded = {**result, "status": "quota_exceeded", "error": "Upload quota exceeded."}
+        async with semaphore:
+            remaining = quota["remaining"]
+            if remaining is not None and remaining <= 0:
+                return quota_exceeded
+            max_file_bytes = UPLOAD_MAX_FILE_BYTES if remaining is None else min(UPLOAD_MAX_FILE_BYTES, remaining)
+            try:
+                upload = await run_in_threadpool(twitter_client.download_photo, url, max_file_bytes)
+            except TwitterError as e:
+                if e.status_code == 413 and max_file_bytes < UPLOAD_MAX_FILE_BYTES:
+                    return {**quota_exceeded, "error": str(e)}
+                status = {413: "too_large", 415: "invalid"}.get(e.status_code, "failed")
+                return {**result, "status": status, "error": str(e)}
+            reserved, created = 0, False
+            try:
+                # The size is reserved before saving, photos downloaded meanwhile see what is left
+                async with quota_lock:
+                    if quota["remaining"] is not None:
+                        if upload.size > quota["remaining"]:
+                            return quota_exceeded
+                        quota["remaining"] -= upload.size
+                        reserved = upload.size
+                extension = upload.mime_type.split("/")[-1].replace("jpeg", "jpg")
+                uploaded_file, _, created = await save_spooled_upload(
+                    upload, current_user.id, f"tweet_{tweet.tweet_id}_{index + 1}.{extension}", tweet.text)
+            except HTTPException as e:
+                return {**result, "status": "invalid" if e.status_code == 400 else "failed", "error": e.detail}
+            finally:
+                if reserved and not created:
+                    async with quota_lock:
+                        quota["remaining"] += reserved
+                await run_in_threadpool(upload.discard)
+        return {**result, "status": "created" if created else "duplicate", "file_id": uploaded_file.id}
+
+    imports = []
+    for value, tweet_id in tweet_ids.items():
+        tweet = tweets.get(tweet_id) if tweet_id else None
+        if tweet_id is None:
+            results.append({"tweet_id": None, "status": "invalid", "error": f"Not a tweet id or URL: {value}"})
+        elif isinstance(tweet, TwitterError):
+            results.append({"tweet_id": tweet_id, "status": "not_found" if tweet.status_code == 404 else "failed",
+                            "error": str(tweet)})
+        elif not tweet.photo_urls:
+            results.append({"tweet_id": tweet_id, "status": "no_photo",
+                            "error": "Image not found in the Twitter post."})
+        else:
+            imports.extend(import_photo(tweet, index, url) for index, url in enumerate(tweet.photo_urls))
+    results.extend(await asyncio.gather(*imports))
+
+    created = sum(result["status"] == "created" for result in results)
+    duplicates = sum(result["status"] == "duplicate" for result in results)
+    logger.info("Twitter import of user %s: %s tweets, %s created, %s duplicates", current_user.email,
+                len(tweet_ids), created, duplicates)
+    return {"tweets": len(tweet_ids), "created": created, "duplicates": duplicates,
+            "failed": len(results) - created - duplicates, "results": results}
 
 
 @router.get("/user_files", response_model=list[UploadedFileRead])
-def get_user_files(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    logger.info(f"Fetching files for user: {current_user.email}")
-    user_files = db.query(UploadedFile).filter(UploadedFile.owner_id == current_user.id).all()
-
-    files_with_preview = []
-    for file in user_files:
-        file_preview = (
-            f"data:image/png;base64,{base64.b64encode(file.file_data).decode('utf-8')}"
-            if file.file_data else None
-        )
-        files_with_preview.append(
-            UploadedFileRead(
-                id=file.id,
-                file_name=file.file_name,
-                uploaded_at=file.uploaded_at,
-                analysis_result=file.analysis_result,
-                file_preview=file_preview,
-                uploaded_text=file.uploaded_text
-            )
-        )
-    return files_with_preview
+async def get_user_files(inline_thumbnails: bool = Query(True, description="Embed small thumbnails as file_preview"),
+                         params: FileListParams = Depends(), db: AsyncSession = Depends(get_async_db),
+                         current_user: CurrentUser = Depends(get_current_user)):
+    logger.info("Fetching files for user: %s", current_user.email, extra=SAMPLED)
+    fields = params.fields or set(UploadedFileRead.model_fields)
+    if not inline_thumbnails:
+        fields = fields - {"file_preview"}
+    query = select(UploadedFile).where(UploadedFile.owner_id == current_user.id)
+    files, next_cursor = await list_files(db, query, params, fields)
+    return await run_in_threadpool(file_list_response, files, fields, next_cursor)
+
+
+@router.get("/user_files/search", response_model=List[FileSearchResult])
+async def search_user_files(q: str = Query(..., min_length=1, max_length=200, description="Words to look for"),
+                            limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+                            offset: int = Query(0, ge=0, le=SEARCH_MAX_OFFSET),
+                            current_user: CurrentUser = Depends(get_current_user),
+                            db: AsyncSession = Depends(get_async_db)):
+    """
+    Full-text search of the user's files by file name, tweet text and analysis result. Files containing all words
+    are returned best match first, the last word also matches as a prefix. The ``X-Next-Offset`` response header
+    holds the offset of the next page.
+    """
+    words = query_words(q)
+    if not words:
+        raise HTTPException(status_code=400, detail="The search query contains no words.")
+    logger.info("Searching files of user %s for %r", current_user.email, q, extra=SAMPLED)
+    results = await search_files(db, current_user.id, words, limit + 1, offset)
+    headers = {"X-Next-Offset": str(offset + limit)} if len(results) > limit else {}
+    items = [{**result, "thumbnail_url": thumbnail_url(result["id"])} for result in results[:limit]]
+    return JSONResponse(jsonable_encoder(items), headers=headers)
+
+
+@router.get("/user_files/semantic_search", response_model=List[SemanticSearchResult])
+async def semantic_search_user_files(q: Optional[str] = Query(None, min_length=1, max_length=1000,
+                                                              description="Text describing the charts to find"),
+                                     file_id: Optional[int] = Query(None, description="Find charts like this file"),
+                                     limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEMANTIC_SEARCH_MAX_LIMIT),
+                                     min_similarity: float = Query(0.0, ge=-1.0, lt=1.0, description="Only files "
+                                                                   "more similar than this"),
+                                     does_match: Optional[bool] = None,
+                                     analyzed: Optional[bool] = None,
+                                     uploaded_after: Optional[datetime] = None,
+                                     uploaded_before: Optional[datetime] = None,
+                                     current_user: CurrentUser = Depends(get_current_user)):
+    """
+    Semantic search of the user's files by embeddings of their images and texts (see core/semantic_search.py):
+    charts about the ``q`` text, or charts like the ``file_id`` file. Files get their embedding when analyzed.
+    The filters are those of the file listings.
+    """
+    if (q is None) == (file_id is None):
+        raise HTTPException(status_code=400, detail="Provide either q or file_id.")
+    logger.info("Semantic search of files of user %s", current_user.email, extra=SAMPLED)
+    filters = {"does_match": does_match, "analyzed": analyzed, "uploaded_after": uploaded_after,
+               "uploaded_before": uploaded_before}
+    return await run_in_threadpool(find_semantic_matches, current_user.id, q, file_id, limit, min_similarity,
+                                   filters)
 
 
 @router.get("/user_files/{file_id}", response_model=UploadedFileRead)
-def get_file_details(file_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    logger.info(f"Fetching details for file ID: {file_id}, user: {current_user.email}")
+async def get_file_details(file_id: int, current_user: CurrentUser = Depends(get_current_user),
+                           db: AsyncSession = Depends(get_async_db)):
+    logger.info("Fetching details for file ID: %s, user: %s", file_id, current_user.email, extra=SAMPLED)
 
-    file_record = db.query(UploadedFile).filter(
+    file_record = (await db.execute(select(UploadedFile).where(
         UploadedFile.owner_id == current_user.id,
         UploadedFile.id == file_id,
-    ).first()
+    ))).scalars().first()
 
     if not file_record:
-        logger.error(f"File ID {file_id} not found for user {current_user.email}")
+        logger.error("File ID %s not found for user %s", file_id, current_user.email)
         raise HTTPException(status_code=404, detail="File not found or you do not have access to this file.")
 
-    file_preview = base64.b64decode(file_record.file_data).decode('utf-8') if file_record.file_data else None
+    file_preview = base64.b64encode(await run_in_threadpool(read_file_data, file_record)).decode('utf-8')
+    FILE_PREVIEW_BYTES.labels("full").observe(len(file_preview))
 
     return {
         "id": file_record.id,
@@ -145,122 +646,213 @@ def get_file_details(file_id: int, current_user: User = Depends(get_current_user
         "uploaded_at": file_record.uploaded_at,
         "analysis_result": file_record.analysis_result,
         "file_preview": f"data:image/png;base64,{file_preview}",
+        "thumbnail_url": thumbnail_url(file_record.id),
         "uploaded_text": file_record.uploaded_text
     }
 
+@router.get("/user_files/{file_id}/similar", response_model=List[SimilarFileRead])
+async def get_similar_files(file_id: int,
+                            min_similarity: float = Query(NEAR_DUPLICATE_MIN_SIMILARITY, ge=0.75, le=1.0),
+                            limit: int = Query(20, ge=1, le=100),
+                            current_user: CurrentUser = Depends(get_current_user),
+                            db: AsyncSession = Depends(get_async_db)):
+    """
+    The user's other files showing the same image as the given one: recompressed, resized or slightly cropped
+    copies, found by the Hamming distance of their perceptual hashes.
+    """
+    file_record = (await db.execute(select(UploadedFile).where(
+        UploadedFile.owner_id == current_user.id,
+        UploadedFile.id == file_id,
+    ))).scalars().first()
+    if not file_record:
+        raise HTTPException(status_code=404, detail="File not found or you do not have access to this file.")
+    return await run_in_threadpool(find_similar_user_files, current_user.id, file_record.file_hash,
+                                   min_similarity, limit)
+
+
 # --- CRUD ENDPOINTS ---
 
 # CREATE: Upload file
 @router.post('/files', response_model=UploadedFileRead)
-async def upload_image_to_database(request: UploadFileRequest, db: Session = Depends(get_db)):
+async def upload_image_to_database(request: UploadFileRequest, db: AsyncSession = Depends(get_async_db)):
     try:
         file_data = base64.b64decode(request.file)
     except Exception as e:
-        logger.error(f"Failed to decode base64 file: {e}")
+        logger.error("Failed to decode base64 file: %s", e)
         raise HTTPException(status_code=400, detail="Invalid base64 file format")
 
     file_hash = hashlib.sha256(file_data).hexdigest()
-    logger.info(f"File hash calculated: {file_hash}")
+    logger.info("File hash calculated: %s", file_hash, extra=SAMPLED)
 
-    existing_file = db.query(UploadedFile).filter(UploadedFile.file_hash == file_hash).first()
+    existing_file = await find_user_file(db, request.user_id, file_hash)
     if existing_file:
-        logger.info(f"File with hash {file_hash} already exists in database: {existing_file}")
-        return UploadedFileRead(
-            id=existing_file.id,
-            file_name=existing_file.file_name,
-            uploaded_at=existing_file.uploaded_at,
-            analysis_result=existing_file.analysis_result,
-            file_preview=f"data:image/png;base64,{base64.b64encode(existing_file.file_data).decode('utf-8')}",
-            uploaded_text=existing_file.uploaded_text
-        )
-
-    user = db.query(User).filter(User.id == request.user_id).first()
+        return await existing_file_read(existing_file)
+
+    user = await db.get(User, request.user_id)
     if not user:
-        logger.error(f"User with ID {request.user_id} not found")
+        logger.error("User with ID %s not found", request.user_id)
         raise HTTPException(status_code=404, detail="User not found")
-
-    uploaded_file = UploadedFile(
+    max_file_bytes = await upload_limit(db, request.user_id)
+    if len(file_data) > max_file_bytes:
+        raise too_large(max_file_bytes)
+
+    # Content another user already uploaded is stored once, only the new row references it
+    thumbnail, phash = None, None
+    if not await is_shared_content(file_hash):
+        thumbnail, phash = await run_in_threadpool(store_uploaded_file, file_hash, file_data)
+    uploaded_file, created = await insert_uploaded_file(dict(
         file_name=request.file_name,
-        file_data=file_data,
         file_hash=file_hash,
+        file_size=len(file_data),
         uploaded_text=request.uploaded_text,
         owner_id=request.user_id,
         uploaded_at=datetime.now(),
-    )
-    db.add(uploaded_file)
-    db.commit()
-    db.refresh(uploaded_file)
+    ), phash)
+    if not created:
+        return await existing_file_read(uploaded_file)
+    await run_in_threadpool(ensure_content_stored, file_hash, file_data)
 
-    logger.info(f"File uploaded successfully: {uploaded_file.id}")
-    return UploadedFileRead(
-        id=uploaded_file.id,
-        file_name=uploaded_file.file_name,
-        uploaded_at=uploaded_file.uploaded_at,
-        analysis_result=uploaded_file.analysis_result,
-        file_preview=f"data:image/png;base64,{base64.b64encode(uploaded_file.file_data).decode('utf-8')}",
-        uploaded_text=uploaded_file.uploaded_text
-    )
+    logger.info("File uploaded successfully: %s", uploaded_file.id)
+    return uploaded_file_read(uploaded_file, thumbnail or await run_in_threadpool(get_thumbnail, uploaded_file))
 
 
-# READ: Get file by ID
-@router.get('/files/{file_id}', response_model=UploadedFileRead)
-def get_file(file_id: int, db: Session = Depends(get_db)):
-    logger.info(f'Reading file with given id {file_id}')
-    uploaded_file = db.query(UploadedFile).filter(UploadedFile.id == file_id).first()
+# CREATE: Upload file as multipart/form-data
+@router.post('/files/upload', response_model=UploadedFileRead)
+async def upload_file_stream(request: Request, current_user: CurrentUser = Depends(get_current_user)):
+    """
+    Streaming upload of the ``file`` part of a multipart form, with optional ``file_name`` and ``uploaded_text``
+    fields. The body is hashed and spooled to disk as it arrives, so memory use is the same for any file size.
+    Clients may send the SHA-256 of the file in ``X-Content-SHA256``: files the user already uploaded are then
+    answered before the body is read. Database sessions are opened only around queries, never held while the
+    client is sending.
+    """
+    expected_hash = parse_content_sha256(request.headers.get("x-content-sha256"))
+    async with AsyncSessionLocal() as db:
+        if expected_hash:
+            existing_file = await find_user_file(db, current_user.id, expected_hash)
+            if existing_file:
+                return await existing_file_read(existing_file)
+        max_file_bytes = await upload_limit(db, current_user.id)
+
+    upload = await receive_multipart_upload(request, max_file_bytes)
+    try:
+        if expected_hash and upload.file_hash != expected_hash:
+            raise HTTPException(status_code=400, detail="Uploaded file does not match X-Content-SHA256.")
+        uploaded_file, thumbnail, created = await save_spooled_upload(
+            upload, current_user.id, upload.fields.get("file_name") or upload.file_name or "upload",
+            upload.fields.get("uploaded_text"))
+        if not created:
+            return await existing_file_read(uploaded_file)
+        if thumbnail is None:
+            thumbnail = await run_in_threadpool(get_thumbnail, uploaded_file)
+    finally:
+        await run_in_threadpool(upload.discard)
+
+    logger.info("File uploaded successfully: %s, %s bytes", uploaded_file.id, upload.size)
+    return uploaded_file_read(uploaded_file, thumbnail)
+
+
+# CREATE: Import the images of an archive
+@router.post('/files/bulk')
+async def bulk_upload(request: Request, current_user: CurrentUser = Depends(get_current_user)):
+    """
+    Imports every image of a zip or tar archive (plain, gzip, bzip2 or xz) sent as the ``file`` part of a multipart
+    form. A ``manifest.jsonl`` or ``manifest.csv`` at the root of the archive may set ``file_name`` and
+    ``uploaded_text`` per ``path``. Files already stored are reported as duplicates. With the ``analyze`` field set
+    to true an analysis job is enqueued for each new file, ``backend`` selects its vision backend. Returns the
+    counts, a result per file and the ids of the enqueued jobs.
+    """
+    async with AsyncSessionLocal() as db:
+        quota = await remaining_quota(db, current_user.id)
 
-    if not uploaded_file:
-        logger.error(f'File with id {file_id} not found')
-        raise HTTPException(status_code=404, detail='File not found.')
+    upload = await receive_multipart_upload(request, BULK_MAX_ARCHIVE_BYTES, detect_type=detect_archive_type,
+                                            head_length=ARCHIVE_HEAD_LENGTH, type_error=ARCHIVE_TYPE_ERROR)
+    try:
+        analyze = form_flag(upload.fields.get("analyze"))
+        backend = upload.fields.get("backend") or None
+        if analyze:
+            try:
+                get_vision_backend(backend)
+            except VisionBackendError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        ingestor = BulkIngestor(current_user.id, quota_bytes=quota,
+                                analysis_job="analyze_file" if analyze else None,
+                                job_parameters={"backend": backend})
+        summary = await run_in_threadpool(lambda: ingestor.run(iter_archive_items(upload.path)))
+    finally:
+        await run_in_threadpool(upload.discard)
+    if summary["error"] and not summary["files"]:
+        raise HTTPException(status_code=400, detail=f"Invalid archive: {summary['error']}")
+
+    logger.info("Bulk upload of user %s: %s created, %s duplicates, %s failed in %ss", current_user.email,
+                summary['created'], summary['duplicates'], summary['failed'], summary['seconds'])
+    return summary
 
-    temp_file_path = f'./temp_file.png'
-    with open(temp_file_path, "wb") as temp_file:
-        temp_file.write(uploaded_file.file_data)
 
-    return FileResponse(temp_file_path, media_type="image/png")
+# READ: Get file by ID
+@router.get('/files/{file_id}', response_model=UploadedFileRead)
+async def get_file(file_id: int, request: Request,
+                   size: Optional[int] = Query(None, ge=16, le=4096,
+                                               description="Maximum width/height of returned image"),
+                   image_format: Optional[str] = Query(None, alias="format", pattern="^(png|webp|jpeg)$"),
+                   quality: int = Query(85, ge=1, le=100),
+                   db: AsyncSession = Depends(get_async_db)):
+    logger.info('Reading file with given id %s', file_id, extra=SAMPLED)
+    uploaded_file = await get_file_or_404(db, file_id)
+    return await run_in_threadpool(file_content_response, request, uploaded_file, size, image_format, quality)
+
+
+# READ: Get thumbnail of file by ID
+@router.get('/files/{file_id}/thumbnail')
+async def get_file_thumbnail(file_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    uploaded_file = await get_file_or_404(db, file_id)
+    key = await run_in_threadpool(ensure_thumbnail, uploaded_file)
+    return await run_in_threadpool(blob_response, request, key, MIME_TYPES[THUMBNAIL_FORMAT],
+                                   last_modified=uploaded_file.uploaded_at)
 
 
 # UPDATE: Actualize analysis result for file
 @router.put('/files/{file_id}', response_model=UploadedFileRead)
-def update_file(file_id: int, updated_data: UploadedFileUpdate, db: Session = Depends(get_db)):
-    logger.info(f'Updating file with given id {file_id}')
-    uploaded_file = db.query(UploadedFile).filter(UploadedFile.id == file_id).first()
-
-    if not uploaded_file:
-        logger.error(f'File with id {file_id} not found')
-        raise HTTPException(status_code=404, detail='File not found.')
+async def update_file(file_id: int, updated_data: UploadedFileUpdate, db: AsyncSession = Depends(get_async_db)):
+    logger.info('Updating file with given id %s', file_id)
+    uploaded_file = await get_file_or_404(db, file_id)
 
     if updated_data.analysis_result is not None:
         uploaded_file.analysis_result = updated_data.analysis_result
+    if updated_data.does_match is not None:
+        uploaded_file.does_match = updated_data.does_match
 
-    db.commit()
-    db.refresh(uploaded_file)
-    logger.info(f'File with given id {file_id} updated successfully')
+    await db.commit()
+    await db.refresh(uploaded_file)
+    if updated_data.analysis_result is not None:
+        await run_in_threadpool(embed_analyzed_files, [file_id])
+    logger.info('File with given id %s updated successfully', file_id)
     return uploaded_file
 
 
 # DELETE: Delete file from database
 @router.delete('/files/{file_id}', response_model=dict)
-def delete_file(file_id: int, db: Session = Depends(get_db)):
-    logger.info(f'Deleting file with given id {file_id}')
-    uploaded_file = db.query(UploadedFile).filter(UploadedFile.id == file_id).first()
-
-    if not uploaded_file:
-        logger.error(f'File with id {file_id} not found.')
-        raise HTTPException(status_code=404, detail='File not found.')
-
-    db.delete(uploaded_file)
-    db.commit()
-    logger.info(f'File with given id {file_id} deleted successfully')
+async def delete_file(file_id: int, db: AsyncSession = Depends(get_async_db)):
+    logger.info('Deleting file with given id %s', file_id)
+    uploaded_file = await get_file_or_404(db, file_id)
+    await remove_uploaded_file(db, uploaded_file)
+    logger.info('File with given id %s deleted successfully', file_id)
     return {"detail": "File deleted successfully"}
 
 # READ ALL: Reads all file records
 @router.get('/files', response_model=List[UploadedFileRead])
-def read_all_files(db: Session = Depends(get_db)):
-    logger.info('Reading all files')
-    return db.query(UploadedFile).all()
+async def read_all_files(params: FileListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
+    logger.info('Reading all files', extra=SAMPLED)
+    fields = params.fields or set(UploadedFileRead.model_fields) - {"file_preview"}
+    files, next_cursor = await list_files(db, select(UploadedFile), params, fields)
+    return await run_in_threadpool(file_list_response, files, fields, next_cursor)
 
 # READ ALL USERS GRAPHS: Reads all User's graphs ordered by newest
 @router.get('/graphs/user/{user_id}', response_model=List[UploadedFileRead])
-def read_user_files(user_id: int, db: Session = Depends(get_db)):
-    logger.info(f"Reading all user's files with id: {user_id}")
-    return db.query(UploadedFile).filter(UploadedFile.owner_id == user_id).all()
\ No newline at end of file
+async def read_user_files(user_id: int, params: FileListParams = Depends(),
+                          db: AsyncSession = Depends(get_async_db)):
+    logger.info("Reading all user's files with id: %s", user_id, extra=SAMPLED)
+    fields = params.fields or set(UploadedFileRead.model_fields) - {"file_preview"}
+    query = select(UploadedFile).where(UploadedFile.owner_id == user_id)
+    files, next_cursor = await list_files(db, query, params, fields)
+    return await run_in_threadpool(file_list_response, files, fields, next_cursor)
\ No newline at end of file
@@ -0,0 +1,88 @@
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import StreamingResponse
+from backend.core.database import AsyncSessionLocal, get_async_db
+from backend.core.job_queue import TERMINAL_STATUSES, job_queue, job_to_dict
+from backend.core.logging_config import logger
+from backend.models.analysis_job import AnalysisJob
+from backend.models.uploaded_file import UploadedFile
+from backend.routers.analysis import (AnalyzeImageDescriptionRequest, DEFAULT_ANALYSIS_PROMPT,
+                                      resolve_backend, run_description_analysis, run_file_analysis)
+
+router = APIRouter()
+
+job_queue.register("analyze_file", run_file_analysis)
+job_queue.register("analyze_image_with_description", run_description_analysis)
+
+EVENTS_POLL_INTERVAL_SECONDS = 0.5
+
+
+# --- AUXILIARY FUNCTIONS ---
+async def get_job_or_404(db: AsyncSession, job_id: str) -> AnalysisJob:
+    job = await db.get(AnalysisJob, job_id)
+    if not job:
+        logger.error("Job with id %s not found", job_id)
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+async def ensure_file_exists(db: AsyncSession, file_id: int):
+    if (await db.execute(select(UploadedFile.id).where(UploadedFile.id == file_id))).first() is None:
+        raise HTTPException(status_code=404, detail=f"File not found with given id {file_id}")
+
+async def load_job(job_id: str) -> dict:
+    async with AsyncSessionLocal() as db:
+        return job_to_dict(await get_job_or_404(db, job_id))
+
+
+# --- ENDPOINTS ---
+@router.post("/jobs/analyze_file/{file_id}", status_code=202)
+async def enqueue_file_analysis(file_id: int, prompt_text: str = DEFAULT_ANALYSIS_PROMPT, use_cache: bool = True,
+                                backend: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    await ensure_file_exists(db, file_id)
+    resolve_backend(backend)
+    job = await db.run_sync(job_queue.enqueue, "analyze_file", file_id, prompt_text=prompt_text,
+                            use_cache=use_cache, backend=backend)
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.post("/jobs/analyze_image_with_description/{file_id}", status_code=202)
+async def enqueue_description_analysis(file_id: int, request: AnalyzeImageDescriptionRequest, use_cache: bool = True,
+                                       backend: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    await ensure_file_exists(db, file_id)
+    resolve_backend(backend)
+    job = await db.run_sync(job_queue.enqueue, "analyze_image_with_description", file_id,
+                            description=request.description, prompt_text=request.prompt_text,
+                            use_cache=use_cache, backend=backend)
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    return job_to_dict(await get_job_or_404(db, job_id))
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events stream reporting every change of job status or progress, closed once the job finishes.
+    """
+    job = await load_job(job_id)
+
+    async def events():
+        nonlocal job
+        last_state = None
+        while True:
+            state = (job["status"], job["progress"])
+            if state != last_state:
+                last_state = state
+                yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+            if job["status"] in TERMINAL_STATUSES or await request.is_disconnected():
+                return
+            await asyncio.sleep(EVENTS_POLL_INTERVAL_SECONDS)
+            job = await load_job(job_id)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
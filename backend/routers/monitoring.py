@@ -0,0 +1,51 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from starlette.routing import Match
+from backend.core.metrics import PROFILER_ENABLED, PROFILER_MAX_SECONDS, profiler
+
+router = APIRouter()
+
+
+# --- DTO MODELS ---
+class ProfilerStart(BaseModel):
+    route: str  # Path template as in the API docs, e.g. /api/user_files/{file_id}
+    method: str = "GET"
+    duration_seconds: float = Field(60, gt=0, le=PROFILER_MAX_SECONDS)
+    interval_ms: float = Field(5, ge=1, le=1000)
+
+
+# --- AUXILIARY FUNCTIONS ---
+def ensure_profiler_enabled():
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=403, detail="The profiler is disabled, set PROFILER_ENABLED=true to use it.")
+
+
+# --- ENDPOINTS ---
+@router.post("/profiler")
+async def start_profiler(request: ProfilerStart, http_request: Request):
+    ensure_profiler_enabled()
+    method = request.method.upper()
+    scope = {"type": "http", "method": method, "path": request.route}
+    route = next((route for route in http_request.app.routes
+                  if getattr(route, "path", None) == request.route and route.matches(scope)[0] == Match.FULL), None)
+    if route is None:
+        raise HTTPException(status_code=404, detail=f"No route {method} {request.route}")
+    profiler.start(request.route, method, route.path_regex, request.interval_ms / 1000, request.duration_seconds)
+    return profiler.report()
+
+
+@router.get("/profiler")
+async def get_profiler_report(format: str = "json", limit: int = 50):
+    """Samples collected so far, format=folded returns all stacks for flamegraph.pl or speedscope."""
+    ensure_profiler_enabled()
+    if format == "folded":
+        return PlainTextResponse(profiler.folded())
+    return profiler.report(limit)
+
+
+@router.delete("/profiler")
+async def stop_profiler():
+    ensure_profiler_enabled()
+    profiler.stop()
+    return profiler.report()
@@ -1,18 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException
-from backend.core.jwt_auth import create_access_token, get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Request
+from backend.core.jwt_auth import (CurrentUser, create_token_pair, decode_token, get_current_user, oauth2_scheme,
+                                   token_denylist, user_cache)
 from pydantic import BaseModel, EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from datetime import datetime
-from backend.core.database import get_db
+from sqlalchemy.exc import IntegrityError
+from backend.core.database import AsyncSessionLocal, get_async_db
+from backend.core.passwords import password_hasher
+from backend.core.rate_limit import KeyedRateLimiter
 from backend.models.user import User
-from passlib.context import CryptContext
-from backend.core.logging_config import logger
+from backend.core.logging_config import SAMPLED, logger
+from dotenv import load_dotenv
+import os
 
 router = APIRouter()
 
-# Configuration of hashing passwords
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+load_dotenv()
+LOGIN_RATE_PER_IP_PER_MINUTE = int(os.getenv("LOGIN_RATE_PER_IP_PER_MINUTE", "30"))
+LOGIN_RATE_PER_ACCOUNT_PER_MINUTE = int(os.getenv("LOGIN_RATE_PER_ACCOUNT_PER_MINUTE", "10"))
+LOGIN_BURST_PER_IP = int(os.getenv("LOGIN_BURST_PER_IP", "10"))
+LOGIN_BURST_PER_ACCOUNT = int(os.getenv("LOGIN_BURST_PER_ACCOUNT", "5"))
+
+# Login attempts are limited before any password is hashed
+ip_login_limiter = KeyedRateLimiter(LOGIN_RATE_PER_IP_PER_MINUTE, capacity=LOGIN_BURST_PER_IP)
+account_login_limiter = KeyedRateLimiter(LOGIN_RATE_PER_ACCOUNT_PER_MINUTE, capacity=LOGIN_BURST_PER_ACCOUNT)
 
 # --- DTO MODELS ---
 class UserCreate(BaseModel):
@@ -33,7 +46,15 @@ class UserRead(BaseModel):
 
 class Token(BaseModel):
     access_token: str
+    refresh_token: str
     token_type: str
+    expires_in: int
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
 
 class TokenData(BaseModel):
     email: Optional[str] = None
@@ -43,128 +64,171 @@ class UserLogin(BaseModel):
     password: str
 
 # --- AUXILIARY FUNCTIONS ---
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
+
+def check_login_rate(request: Request, email: str):
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = max(ip_login_limiter.check(client_ip), account_login_limiter.check(email.lower()))
+    if retry_after > 0:
+        logger.warning("Login rate limit exceeded for %s from %s", email, client_ip)
+        raise HTTPException(status_code=429, detail="Too many login attempts, please try again later.",
+                            headers={"Retry-After": str(int(retry_after) + 1)})
+
+# Sessions are opened only around the queries, never held while a password is being hashed
+async def find_user_by_email(email: str) -> Optional[User]:
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(User).where(User.email == email))).scalars().first()
+
+async def get_user_or_404(db: AsyncSession, user_id: int) -> User:
+    user = await db.get(User, user_id)
+    if not user:
+        logger.error('User with id %s not found.', user_id)
+        raise HTTPException(status_code=404, detail='User not found.')
+    return user
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def update_password_hash(user_id: int, hashed_password: str):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(User).where(User.id == user_id).values(hashed_password=hashed_password))
+        await db.commit()
+
+async def insert_user(email: str, hashed_password: str) -> User:
+    async with AsyncSessionLocal() as db:
+        new_user = User(
+            email=email,
+            hashed_password=hashed_password,
+            created_at=datetime.now()
+        )
+        db.add(new_user)
+        try:
+            await db.commit()
+        except IntegrityError:
+            logger.error("User with email %s already exists", email)
+            raise HTTPException(status_code=400, detail='Email already registered.')
+        await db.refresh(new_user)
+        return new_user
+
+async def create_user_with_password(user: UserCreate) -> User:
+    # Checked before hashing so taken e-mails do not cost a bcrypt round, the insert still guards against races
+    if await find_user_by_email(user.email):
+        logger.error("User with email %s already exists", user.email)
+        raise HTTPException(status_code=400, detail='Email already registered.')
+    return await insert_user(user.email, await hash_password(user.password))
+
+async def apply_user_update(user_id: int, email: Optional[str], hashed_password: Optional[str]) -> User:
+    async with AsyncSessionLocal() as db:
+        user = await get_user_or_404(db, user_id)
+        if email:
+            user.email = email
+        if hashed_password:
+            user.hashed_password = hashed_password
+
+        await db.commit()
+        await db.refresh(user)
+        return user
 
 # --- CRUD ENDPOINTS ---
 
 # GETTING CURRENT USER BASED ON JWT TOKEN
 @router.get("/users/me", response_model=UserRead)
-def get_current_user_details(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    logger.info(f"Getting current user details: {current_user}")
+async def get_current_user_details(current_user: CurrentUser = Depends(get_current_user)):
+    logger.info("Getting current user details: %s", current_user, extra=SAMPLED)
     if not current_user:
-        logger.error(f"User not found: {current_user}")
+        logger.error("User not found: %s", current_user)
         raise HTTPException(status_code=404, detail="User not found")
     return current_user
 
 # LOGIN: Authenticate user and teturn JWT Token
 @router.post('/login', response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    logger.info(f"Attempting to log in user: {user.email}")
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
-        logger.error(f"Invalid credentials for user: {user.email}")
+async def login(user: UserLogin, request: Request):
+    logger.info("Attempting to log in user: %s", user.email)
+    check_login_rate(request, user.email)
+    db_user = await find_user_by_email(user.email)
+    valid, new_hash = False, None
+    if db_user:
+        valid, new_hash = await password_hasher.verify_and_update(user.password, db_user.hashed_password)
+    if not valid:
+        logger.error("Invalid credentials for user: %s", user.email)
         raise HTTPException(status_code=401, detail="Incorrect email or password")
 
-    access_token = create_access_token(data={"sub": db_user.id})
-    logger.info(f"User {user.email} successfully logged in")
-    return {"access_token": access_token, "token_type": "bearer"}
+    if new_hash:
+        # Hash was created with other parameters (e.g. a lower BCRYPT_ROUNDS), store it with the current ones
+        await update_password_hash(db_user.id, new_hash)
+        logger.info("Password hash of user %s upgraded", user.email)
+
+    logger.info("User %s successfully logged in", user.email)
+    return create_token_pair(db_user)
+
+# REFRESH: Exchange a refresh token for a new token pair, the used refresh token is revoked
+@router.post('/refresh', response_model=Token)
+async def refresh(request: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    payload = decode_token(request.refresh_token, token_type="refresh")
+    db_user = await db.get(User, int(payload["sub"]))
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+    # Claimed in the database, a refresh token used twice (replayed, or two racing requests) fails the second time
+    if not await token_denylist.revoke(db, payload):
+        logger.warning("Revoked refresh token reused, user id: %s", payload["sub"])
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    return create_token_pair(db_user)
+
+# LOGOUT: Revoke the access token and optionally the refresh token
+@router.post('/logout', status_code=204)
+async def logout(request: Optional[LogoutRequest] = None, token: str = Depends(oauth2_scheme),
+                 db: AsyncSession = Depends(get_async_db)):
+    payload = decode_token(token)
+    await token_denylist.revoke(db, payload)
+    if request and request.refresh_token:
+        await token_denylist.revoke(db, decode_token(request.refresh_token, token_type="refresh"))
+    logger.info("User with id %s logged out", payload['sub'])
 
 # REGISTER: Create a new user
 @router.post('/register', response_model=UserRead)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    logger.info(f"Registering user: {user.email}")
-    existing_user = db.query(User).filter(User.email == user.email).first()
-    if existing_user:
-        logger.error(f"User with email {user.email} already exists")
-        raise HTTPException(status_code=400, detail='Email already registered.')
-
-    hashed_password = hash_password(user.password)
-    new_user = User(
-        email=user.email,
-        hashed_password=hashed_password,
-        created_at=datetime.now()
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    logger.info(f"User {user.email} successfully registered")
+async def register(user: UserCreate):
+    logger.info("Registering user: %s", user.email)
+    new_user = await create_user_with_password(user)
+    logger.info("User %s successfully registered", user.email)
     return new_user
 
 # CREATE: Creating User
 @router.post('/users', response_model=UserRead)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    logger.info(f"Creating user: {user}")
-    # Checking if email is not used already
-    existing_user = db.query(User).filter(User.email == user.email).first()
-    if existing_user:
-        logger.error(f"User with email {user.email} already exists")
-        raise HTTPException(status_code=400, detail='Email already registered.')
-
-    hashed_password = hash_password(user.password)
-    new_user = User(
-        email=user.email,
-        hashed_password=hashed_password,
-        created_at=datetime.now()
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-
-    return new_user
+async def create_user(user: UserCreate):
+    logger.info("Creating user: %s", user.email)
+    return await create_user_with_password(user)
 
 # READ: Get User by id
 @router.get('/users/{user_id}', response_model=UserRead)
-def get_user(user_id: int, db: Session = Depends(get_db)):
-    logger.info(f'Getting User with id: {user_id}')
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        logger.error(f'User with id {user_id} not found.')
-        raise HTTPException(status_code=404, detail='User not found.')
-
-    return user
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    logger.info('Getting User with id: %s', user_id, extra=SAMPLED)
+    return await get_user_or_404(db, user_id)
 
 # UPDATE: Update User's data
 @router.put('/users/{user_id}', response_model=UserRead)
-def update_user(user_id: int, user_data: UserUpdate, db: Session = Depends(get_db)):
-    logger.info(f'Updating user with given user id: {user_id}')
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        logger.error(f'User with id {user_id} not found.')
-        raise HTTPException(status_code=404, detail='User not found.')
-
-    if user_data.email:
-        user.email = user_data.email
-    if user_data.password:
-        user.hashed_password = hash_password(user_data.password)
-
-    db.commit()
-    db.refresh(user)
-    logger.info(f'User with id {user_id} updated successfully')
+async def update_user(user_id: int, user_data: UserUpdate):
+    logger.info('Updating user with given user id: %s', user_id)
+    hashed_password = await hash_password(user_data.password) if user_data.password else None
+    user = await apply_user_update(user_id, user_data.email, hashed_password)
+    user_cache.invalidate(user_id)
+    logger.info('User with id %s updated successfully', user_id)
 
     return user
 
 
 # DELETE: Delete User
 @router.delete('/users/{user_id}', response_model=UserRead)
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    logger.info(f'Deleting User with given user id: {user_id}')
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        logger.error(f'User with id {user_id} not found.')
-        raise HTTPException(status_code=404, detail='User not found.')
-
-    db.delete(user)
-    db.commit()
-    logger.info(f'User with id {user_id} deleted successfully')
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    logger.info('Deleting User with given user id: %s', user_id)
+    user = await get_user_or_404(db, user_id)
+    await db.delete(user)
+    await db.commit()
+    user_cache.invalidate(user_id)
+    logger.info('User with id %s deleted successfully', user_id)
     return user
 
 
 # READ ALL: Read all users
 @router.get('/users', response_model=List[UserRead])
-def get_all_users(db: Session = Depends(get_db)):
-    logger.info('Getting all users')
-    return db.query(User).all()
+async def get_all_users(db: AsyncSession = Depends(get_async_db)):
+    logger.info('Getting all users', extra=SAMPLED)
+    return (await db.execute(select(User))).scalars().all()
@@ -0,0 +1,49 @@
+"""
+Computes the embeddings of files analyzed before embeddings existed, or by another embedder than the configured
+``EMBEDDING_BACKEND``, so they are found by the semantic search. Analyses done from now on embed their files.
+
+Usage:
+    python -m backend.scripts.backfill_embeddings [--batch-size 100] [--all]
+"""
+import argparse
+from sqlalchemy import and_, select
+from backend.core.database import SessionLocal
+from backend.core.embeddings import get_embedder
+from backend.core.logging_config import logger
+from backend.core.semantic_search import embed_files
+from backend.models import FileEmbedding, UploadedFile
+
+
+def backfill(batch_size: int = 100, analyzed_only: bool = True) -> int:
+    embedded = 0
+    last_id = 0
+    model = get_embedder().model
+    with SessionLocal() as db:
+        while True:
+            query = (
+                select(UploadedFile.id)
+                .outerjoin(FileEmbedding, and_(FileEmbedding.file_id == UploadedFile.id, FileEmbedding.model == model))
+                .where(UploadedFile.id > last_id, FileEmbedding.file_id.is_(None))
+            )
+            if analyzed_only:
+                query = query.where(UploadedFile.analysis_result.isnot(None))
+            batch = db.execute(query.order_by(UploadedFile.id).limit(batch_size)).scalars().all()
+            if not batch:
+                break
+            last_id = batch[-1]
+            embedded += len(embed_files(db, batch))
+            logger.info("Embedded %s files (last id: %s)", embedded, last_id)
+    return embedded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute missing embeddings of analyzed files")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--all", action="store_true", help="Embed files without an analysis too (image only)")
+    args = parser.parse_args()
+    embedded = backfill(batch_size=args.batch_size, analyzed_only=not args.all)
+    logger.info("Embedding backfill finished, %s files embedded", embedded)
+
+
+if __name__ == "__main__":
+    main()
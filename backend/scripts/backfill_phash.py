@@ -0,0 +1,44 @@
+"""
+Computes the perceptual hash of content uploaded before hashes were computed at upload, so it is found by the
+near-duplicate search. Content without one is otherwise hashed the first time it is looked up.
+
+Usage:
+    python -m backend.scripts.backfill_phash [--batch-size 100]
+"""
+import argparse
+from sqlalchemy import select
+from backend.core.database import SessionLocal
+from backend.core.logging_config import logger
+from backend.core.near_duplicates import compute_perceptual_hashes
+from backend.models import ContentBlob
+
+
+def backfill(batch_size: int = 100) -> int:
+    computed = 0
+    last_hash = ""
+    with SessionLocal() as db:
+        while True:
+            batch = db.execute(
+                select(ContentBlob.file_hash)
+                .where(ContentBlob.file_hash > last_hash, ContentBlob.phash.is_(None), ContentBlob.ref_count > 0)
+                .order_by(ContentBlob.file_hash)
+                .limit(batch_size)
+            ).scalars().all()
+            if not batch:
+                break
+            last_hash = batch[-1]
+            computed += len(compute_perceptual_hashes(db, batch))
+            logger.info("Computed %s perceptual hashes (last hash: %s)", computed, last_hash)
+    return computed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute missing perceptual hashes of stored content")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    computed = backfill(batch_size=args.batch_size)
+    logger.info("Perceptual hash backfill finished, %s images hashed", computed)
+
+
+if __name__ == "__main__":
+    main()
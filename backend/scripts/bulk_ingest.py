@@ -0,0 +1,82 @@
+"""
+Imports a directory of images, a zip/tar archive or a manifest (``.jsonl``/``.csv`` with ``path`` and optional
+``file_name`` and ``uploaded_text`` per line) for one user. A directory may contain a ``manifest.jsonl`` or
+``manifest.csv`` that selects and describes its files. The per-user upload quota does not apply.
+
+Usage:
+    python -m backend.scripts.bulk_ingest PATH (--owner-email EMAIL | --owner-id ID) [--analyze [--backend NAME]]
+        [--batch-size 500] [--workers 8] [--results results.json]
+"""
+import argparse
+import json
+import sys
+from backend.core.bulk_ingest import (BULK_INGEST_BATCH_SIZE, BULK_INGEST_WORKERS, BulkIngestor,
+                                      iter_source_items)
+from backend.core.database import SessionLocal
+from backend.core.logging_config import logger
+from backend.core.vision_backend import VisionBackendError, get_vision_backend
+from backend.models import User
+
+
+def find_owner_id(email: str = None, user_id: int = None) -> int:
+    with SessionLocal() as db:
+        query = db.query(User.id)
+        user = query.filter(User.email == email).first() if email else query.filter(User.id == user_id).first()
+    if user is None:
+        raise SystemExit(f"User not found: {email or user_id}")
+    return user.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import many images for one user")
+    parser.add_argument("path", help="Directory, zip/tar archive or manifest file")
+    owner = parser.add_mutually_exclusive_group(required=True)
+    owner.add_argument("--owner-email")
+    owner.add_argument("--owner-id", type=int)
+    parser.add_argument("--analyze", action="store_true", help="Enqueue an analysis job for every new file")
+    parser.add_argument("--backend", help="Vision backend of the analysis jobs")
+    parser.add_argument("--batch-size", type=int, default=BULK_INGEST_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=BULK_INGEST_WORKERS)
+    parser.add_argument("--max-files", type=int, default=sys.maxsize)
+    parser.add_argument("--results", help="Write the result of every file to this JSON file")
+    args = parser.parse_args()
+
+    if args.analyze:
+        # Registers the analysis job handlers, the jobs are run by the API server's workers
+        import backend.routers.jobs  # noqa: F401
+        try:
+            get_vision_backend(args.backend)
+        except VisionBackendError as e:
+            raise SystemExit(str(e))
+
+    ingestor = BulkIngestor(
+        find_owner_id(args.owner_email, args.owner_id),
+        quota_bytes=None,
+        analysis_job="analyze_file" if args.analyze else None,
+        job_parameters={"backend": args.backend},
+        workers=args.workers,
+        batch_size=args.batch_size,
+        max_files=args.max_files,
+    )
+    try:
+        items = iter_source_items(args.path)
+    except (ValueError, OSError) as e:
+        raise SystemExit(f"Can not import {args.path}: {e}")
+    summary = ingestor.run(items)
+
+    results = summary.pop("results")
+    if args.results:
+        with open(args.results, "w") as file:
+            json.dump(results, file, indent=2)
+    summary["job_ids"] = len(summary["job_ids"])
+    logger.info("Bulk import finished: %s", summary)
+    print(json.dumps(summary, indent=2))
+    for result in results:
+        if result["status"] not in ("created", "duplicate"):
+            print(f"{result['status']}: {result['name']}: {result['error']}", file=sys.stderr)
+    if summary["error"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Upgrades the database schema to the latest Alembic revision (backend/migrations). Databases created with
+``create_all`` before migrations existed are adopted by the initial revision.
+
+Usage:
+    python -m backend.scripts.migrate [revision]
+"""
+import argparse
+from pathlib import Path
+from alembic import command
+from alembic.config import Config
+from backend.core.database import engine
+from backend.core.logging_config import logger
+
+ALEMBIC_INI = Path(__file__).resolve().parents[1] / "alembic.ini"
+
+
+def upgrade_database(revision: str = "head"):
+    config = Config(str(ALEMBIC_INI))
+    # Keeps the application's logging configuration when called on startup
+    config.attributes["configure_logger"] = False
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, revision)
+    logger.info("Database schema upgraded to %s", revision)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upgrade the database schema")
+    parser.add_argument("revision", nargs="?", default="head")
+    args = parser.parse_args()
+    upgrade_database(args.revision)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Moves file bytes of existing rows out of the ``uploaded_files.file_data`` column into the configured blob store.
+
+Usage:
+    python -m backend.scripts.migrate_blobs [--batch-size 100] [--vacuum]
+"""
+import argparse
+import hashlib
+import sys
+from sqlalchemy import text
+from sqlalchemy.orm import undefer
+from backend.core.blob_store import get_blob_store
+from backend.core.database import SessionLocal, engine
+from backend.core.logging_config import logger
+from backend.models import UploadedFile
+from backend.scripts.migrate import upgrade_database
+
+
+def migrate(batch_size: int = 100) -> tuple:
+    """
+    Moves the bytes batch by batch, returns the number of rows migrated and skipped. Rows whose bytes do not hash to
+    their ``file_hash`` are skipped and keep ``file_data``: the blob store is keyed by content, storing them under
+    that key would serve wrong bytes for it.
+    """
+    store = get_blob_store()
+    migrated = 0
+    skipped = 0
+    last_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            batch = (
+                db.query(UploadedFile)
+                .options(undefer(UploadedFile.file_data))
+                .filter(UploadedFile.id > last_id, UploadedFile.file_data.isnot(None))
+                .order_by(UploadedFile.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+
+            for uploaded_file in batch:
+                last_id = uploaded_file.id
+                if not uploaded_file.file_data:
+                    continue
+                actual_hash = hashlib.sha256(uploaded_file.file_data).hexdigest()
+                if actual_hash != uploaded_file.file_hash:
+                    logger.error("File %s has hash %s, stored as %s, not migrated", uploaded_file.id, actual_hash,
+                                 uploaded_file.file_hash)
+                    skipped += 1
+                    continue
+                store.put(uploaded_file.file_hash, uploaded_file.file_data)
+                uploaded_file.file_data = None
+                migrated += 1
+
+            db.commit()
+            logger.info("Migrated %s files to blob store (last id: %s)", migrated, last_id)
+    finally:
+        db.close()
+    return migrated, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move uploaded file bytes into the blob store")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--vacuum", action="store_true", help="Reclaim freed space in SQLite database afterwards")
+    args = parser.parse_args()
+
+    # Databases created before the blob store have file_data declared as NOT NULL, the schema migrations relax it
+    upgrade_database()
+    migrated, skipped = migrate(batch_size=args.batch_size)
+    if args.vacuum and engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM"))
+    logger.info("Blob migration finished, %s files moved", migrated)
+    if skipped:
+        logger.error("%s files were not moved because their content does not match their hash", skipped)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
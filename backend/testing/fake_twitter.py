@@ -0,0 +1,126 @@
+"""
+Local stand-in for the Twitter API v2 tweet lookup and the photo CDN, used by tests and benchmarks. Every numeric id
+is a tweet with a generated chart photo, except ids starting with 404 (not found), ids divisible by 10 (text only)
+and ids ending in 7 (two photos).
+
+Usage:
+    FAKE_TWITTER_LATENCY_MS=50 uvicorn backend.testing.fake_twitter:app --port 8002
+    TWITTER_API_BASE_URL=http://127.0.0.1:8002/2 TWITTER_BEARER_TOKEN=test uvicorn backend.app:app
+"""
+import asyncio
+import io
+import os
+import random
+from typing import Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from PIL import Image, ImageDraw
+
+FAKE_TWITTER_LATENCY_MS = int(os.getenv("FAKE_TWITTER_LATENCY_MS", "50"))
+FAKE_TWITTER_ERROR_RATE = float(os.getenv("FAKE_TWITTER_ERROR_RATE", "0"))  # Fraction of calls answered with 503
+
+app = FastAPI()
+stats = {"lookups": 0, "tweets": 0, "media": 0, "unavailable": 0}
+
+
+def photo_count(tweet_id: str) -> int:
+    if int(tweet_id) % 10 == 0:
+        return 0
+    return 2 if tweet_id.endswith("7") else 1
+
+
+def tweet_payload(tweet_id: str) -> dict:
+    media_keys = [f"3_{tweet_id}_{index}" for index in range(photo_count(tweet_id))]
+    tweet = {"id": tweet_id, "edit_history_tweet_ids": [tweet_id], "text": f"Chart of the day #{tweet_id}"}
+    if media_keys:
+        tweet["attachments"] = {"media_keys": media_keys}
+    return tweet
+
+
+def chart_png(media_key: str) -> bytes:
+    """A bar chart drawn from a seed, so every media key always returns the same bytes."""
+    generator = random.Random(media_key)
+    image = Image.new("RGB", (600, 400), "white")
+    draw = ImageDraw.Draw(image)
+    draw.line([(40, 360), (580, 360)], fill="black", width=2)
+    draw.line([(40, 20), (40, 360)], fill="black", width=2)
+    for index in range(8):
+        height = generator.randint(20, 320)
+        color = (generator.randint(0, 200), generator.randint(0, 200), generator.randint(100, 255))
+        draw.rectangle([60 + index * 64, 360 - height, 100 + index * 64, 360], fill=color)
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+async def simulate(request: Request) -> Optional[JSONResponse]:
+    """Adds latency and the configured share of 503 errors, checks the bearer token."""
+    await asyncio.sleep(FAKE_TWITTER_LATENCY_MS / 1000)
+    if random.random() < FAKE_TWITTER_ERROR_RATE:
+        stats["unavailable"] += 1
+        return JSONResponse(status_code=503, headers={"retry-after": "0"},
+                            content={"title": "Service Unavailable", "status": 503})
+    if not request.url.path.startswith("/media/") and \
+            not request.headers.get("authorization", "").startswith("Bearer "):
+        return JSONResponse(status_code=401, content={"title": "Unauthorized", "status": 401})
+    return None
+
+
+def lookup(request: Request, tweet_ids: list) -> dict:
+    stats["lookups"] += 1
+    data, media, errors = [], [], []
+    for tweet_id in tweet_ids:
+        if not tweet_id.isdigit() or tweet_id.startswith("404"):
+            errors.append({"value": tweet_id, "detail": f"Could not find tweet with ids: [{tweet_id}].",
+                           "title": "Not Found Error", "resource_type": "tweet", "parameter": "ids",
+                           "resource_id": tweet_id,
+                           "type": "https://api.twitter.com/2/problems/resource-not-found"})
+            continue
+        stats["tweets"] += 1
+        tweet = tweet_payload(tweet_id)
+        data.append(tweet)
+        for media_key in tweet.get("attachments", {}).get("media_keys", []):
+            media.append({"media_key": media_key, "type": "photo",
+                          "url": f"{str(request.base_url).rstrip('/')}/media/{media_key}.png"})
+    payload = {}
+    if data:
+        payload["data"] = data
+    if media:
+        payload["includes"] = {"media": media}
+    if errors:
+        payload["errors"] = errors
+    return payload
+
+
+@app.get("/2/tweets")
+async def get_tweets(request: Request, ids: str):
+    error = await simulate(request)
+    if error:
+        return error
+    return lookup(request, [tweet_id.strip() for tweet_id in ids.split(",") if tweet_id.strip()])
+
+
+@app.get("/2/tweets/{tweet_id}")
+async def get_tweet(request: Request, tweet_id: str):
+    error = await simulate(request)
+    if error:
+        return error
+    payload = lookup(request, [tweet_id])
+    if "data" not in payload:
+        return payload
+    payload["data"] = payload["data"][0]
+    return payload
+
+
+@app.get("/media/{media_key}.png")
+async def get_media(request: Request, media_key: str):
+    error = await simulate(request)
+    if error:
+        return error
+    stats["media"] += 1
+    return Response(chart_png(media_key), media_type="image/png")
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
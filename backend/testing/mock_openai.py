@@ -0,0 +1,95 @@
+"""
+Local stand-in for the OpenAI chat completions API, used by tests and benchmarks.
+
+Usage:
+    MOCK_OPENAI_LATENCY_MS=500 uvicorn backend.testing.mock_openai:app --port 8001
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=test uvicorn backend.app:app
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MOCK_OPENAI_LATENCY_MS = int(os.getenv("MOCK_OPENAI_LATENCY_MS", "200"))
+MOCK_OPENAI_RESPONSE = os.getenv("MOCK_OPENAI_RESPONSE", "The graph shows a steady upward trend. True")
+MOCK_OPENAI_ERROR_RATE = float(os.getenv("MOCK_OPENAI_ERROR_RATE", "0"))  # Fraction of calls answered with 429
+MOCK_OPENAI_TOKEN_DELAY_MS = int(os.getenv("MOCK_OPENAI_TOKEN_DELAY_MS", "20"))  # Delay between streamed tokens
+
+app = FastAPI()
+stats = {"requests": 0, "rate_limited": 0}
+
+
+def usage(content: str) -> dict:
+    return {"prompt_tokens": 800, "completion_tokens": len(content) // 4, "total_tokens": 800 + len(content) // 4}
+
+
+def completion(model: str, content: str) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": usage(content),
+    }
+
+
+async def completion_chunks(model: str, content: str, include_usage: bool):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    for index, word in enumerate(content.split(" ")):
+        token = word if index == 0 else f" {word}"
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(MOCK_OPENAI_TOKEN_DELAY_MS / 1000)
+    final = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+    }
+    yield f"data: {json.dumps(final)}\n\n"
+    if include_usage:
+        usage_chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [], "usage": usage(content)}
+        yield f"data: {json.dumps(usage_chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    await asyncio.sleep(MOCK_OPENAI_LATENCY_MS / 1000)
+
+    if random.random() < MOCK_OPENAI_ERROR_RATE:
+        stats["rate_limited"] += 1
+        return JSONResponse(status_code=429, headers={"retry-after": "0.1"},
+                            content={"error": {"message": "Rate limit reached", "type": "rate_limit_error"}})
+
+    model = body.get("model", "gpt-4o")
+    if body.get("stream"):
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(completion_chunks(model, MOCK_OPENAI_RESPONSE, include_usage),
+                                 media_type="text/event-stream")
+    return completion(model, MOCK_OPENAI_RESPONSE)
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
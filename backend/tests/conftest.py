@@ -0,0 +1,44 @@
+import os
+import tempfile
+import uuid
+
+# The settings are read when the backend modules are imported, so they are set before the first import
+TEST_DIRECTORY = tempfile.mkdtemp(prefix="graphs-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(TEST_DIRECTORY, 'db.sqlite3')}",
+    "BLOB_STORE_BACKEND": "local",
+    "BLOB_STORE_PATH": os.path.join(TEST_DIRECTORY, "blobs"),
+    "SECRET_KEY": "test-secret",
+    "OPENAI_API_KEY": "sk-test",
+    "VISION_BACKEND": "static",
+    "DB_AUTO_MIGRATE": "true",
+    "BCRYPT_ROUNDS": "4",
+    "PASSWORD_HASH_WORKERS": "1",
+    "LOG_FILE": "",
+    "LOG_LEVEL": "WARNING",
+})
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    from backend.app import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def credentials(client):
+    """E-mail and password of a new user."""
+    email, password = f"user-{uuid.uuid4().hex[:12]}@example.com", "password"
+    assert client.post("/api/register", json={"email": email, "password": password}).status_code == 200
+    return email, password
+
+
+@pytest.fixture
+def auth_headers(client, credentials):
+    email, password = credentials
+    token = client.post("/api/login", json={"email": email, "password": password}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
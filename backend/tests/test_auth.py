@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+from backend.core.jwt_auth import token_denylist
+
+
+def login(client, credentials) -> dict:
+    email, password = credentials
+    response = client.post("/api/login", json={"email": email, "password": password})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_refresh_token_reuse_is_rejected(client, credentials):
+    refresh_token = login(client, credentials)["refresh_token"]
+
+    response = client.post("/api/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 200
+    assert response.json()["refresh_token"] != refresh_token
+
+    assert client.post("/api/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+
+def test_refresh_token_reuse_is_rejected_by_other_workers(client, credentials):
+    refresh_token = login(client, credentials)["refresh_token"]
+    assert client.post("/api/refresh", json={"refresh_token": refresh_token}).status_code == 200
+
+    # Another worker has not loaded the revocation yet, the database still rejects the token
+    with token_denylist._lock:
+        token_denylist._revoked.clear()
+    assert client.post("/api/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+
+def test_concurrent_refreshes_succeed_once(client, credentials):
+    refresh_token = login(client, credentials)["refresh_token"]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        statuses = list(executor.map(
+            lambda _: client.post("/api/refresh", json={"refresh_token": refresh_token}).status_code, range(4)))
+    assert sorted(statuses) == [200, 401, 401, 401]
+
+
+def test_refreshed_access_token_is_valid(client, credentials):
+    tokens = client.post("/api/refresh", json={"refresh_token": login(client, credentials)["refresh_token"]}).json()
+    response = client.get("/api/users/me", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert response.status_code == 200
+    assert response.json()["email"] == credentials[0]
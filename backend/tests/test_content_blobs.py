@@ -0,0 +1,80 @@
+import hashlib
+import threading
+import time
+from sqlalchemy.exc import IntegrityError
+from backend.core.blob_store import get_blob_store
+from backend.core.content_blobs import (ADD_REFERENCE_ATTEMPTS, BlobCollectingError, add_references, collect_garbage,
+                                        ensure_content_stored, release_references)
+from backend.core.database import SessionLocal
+from backend.models import ContentBlob
+
+THREADS = 8
+ROUNDS = 15
+
+
+def acquire(file_hash: str, data: bytes):
+    """Adds a reference the way uploads do: retried while the blob is created or collected concurrently."""
+    for attempt in range(ADD_REFERENCE_ATTEMPTS * 4):
+        with SessionLocal() as db:
+            try:
+                add_references(db, {file_hash: len(data)})
+                db.commit()
+            except (IntegrityError, BlobCollectingError):
+                db.rollback()
+                time.sleep(0.005 * (attempt + 1))
+                continue
+        ensure_content_stored(file_hash, data)
+        return
+    raise AssertionError(f"Could not reference {file_hash}")
+
+
+def release(file_hash: str):
+    with SessionLocal() as db:
+        release_references(db, [file_hash])
+        db.commit()
+    collect_garbage([file_hash])
+
+
+def test_concurrent_add_release_collect_keeps_referenced_bytes(client):
+    data = b"content shared by every thread"
+    file_hash = hashlib.sha256(data).hexdigest()
+    store = get_blob_store()
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(ROUNDS):
+                acquire(file_hash, data)
+                # A held reference protects the bytes from every concurrent collection
+                if not store.exists(file_hash):
+                    errors.append("referenced bytes missing")
+                release(file_hash)
+        except Exception as e:
+            errors.append(repr(e))
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    collect_garbage()
+    with SessionLocal() as db:
+        assert db.get(ContentBlob, file_hash) is None
+    assert not store.exists(file_hash)
+
+
+def test_collect_skips_referenced_blob(client):
+    data = b"content with a reference left"
+    file_hash = hashlib.sha256(data).hexdigest()
+    acquire(file_hash, data)
+    acquire(file_hash, data)
+    release(file_hash)
+
+    with SessionLocal() as db:
+        assert db.get(ContentBlob, file_hash).ref_count == 1
+    assert get_blob_store().exists(file_hash)
+
+    release(file_hash)
+    assert not get_blob_store().exists(file_hash)
@@ -0,0 +1,58 @@
+import hashlib
+from datetime import datetime
+from backend.core.database import SessionLocal
+from backend.models import ContentBlob, UploadedFile
+
+FILES = 10
+
+
+def add_files(owner_id: int, uploaded_at: datetime) -> list:
+    with SessionLocal() as db:
+        files = []
+        for i in range(FILES):
+            file_hash = hashlib.sha256(f"{owner_id}-{uploaded_at}-{i}".encode()).hexdigest()
+            db.add(ContentBlob(file_hash=file_hash, size=1, ref_count=1))
+            files.append(UploadedFile(file_name=f"file-{i}.png", file_hash=file_hash, file_size=1,
+                                      owner_id=owner_id, uploaded_at=uploaded_at))
+        db.add_all(files)
+        db.commit()
+        return [file.id for file in files]
+
+
+def list_pages(client, auth_headers, limit: int) -> list:
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit, "fields": "id", "inline_thumbnails": "false"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/user_files", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        pages.append([file["id"] for file in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+def test_cursor_pagination_across_equal_uploaded_at(client, auth_headers):
+    owner_id = client.get("/api/users/me", headers=auth_headers).json()["id"]
+    file_ids = add_files(owner_id, datetime(2026, 1, 1, 12, 0, 0))
+
+    pages = list_pages(client, auth_headers, limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    # Ties on uploaded_at are broken by id, every file is listed once
+    assert [file_id for page in pages for file_id in page] == sorted(file_ids, reverse=True)
+
+
+def test_cursor_pagination_orders_newest_first(client, auth_headers):
+    owner_id = client.get("/api/users/me", headers=auth_headers).json()["id"]
+    older = add_files(owner_id, datetime(2026, 1, 1))
+    newer = add_files(owner_id, datetime(2026, 1, 2))
+
+    listed = [file_id for page in list_pages(client, auth_headers, limit=4) for file_id in page]
+    assert listed == sorted(newer, reverse=True) + sorted(older, reverse=True)
+
+
+def test_invalid_cursor_is_rejected(client, auth_headers):
+    response = client.get("/api/user_files", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
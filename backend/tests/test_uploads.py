@@ -0,0 +1,85 @@
+import io
+import os
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from backend.core.blob_store import get_blob_store
+from backend.core.uploads import MultipartUploadReader
+
+BOUNDARY = b"test-boundary"
+
+
+def png_bytes(color=(255, 0, 0), size=(64, 48)) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, "PNG")
+    return output.getvalue()
+
+
+def multipart_body(content: bytes, file_name: str = "image.png") -> bytes:
+    return (b"--" + BOUNDARY + b"\r\n"
+            b'Content-Disposition: form-data; name="file"; filename="' + file_name.encode() + b'"\r\n'
+            b"Content-Type: application/octet-stream\r\n\r\n" + content + b"\r\n"
+            b"--" + BOUNDARY + b"--\r\n")
+
+
+def spool_files() -> set:
+    return set(os.listdir(get_blob_store().spool_directory()))
+
+
+def test_upload_image(client, auth_headers):
+    response = client.post("/api/files/upload", headers=auth_headers,
+                           files={"file": ("chart.png", png_bytes((0, 128, 255)), "image/png")})
+    assert response.status_code == 200
+    assert response.json()["file_name"] == "chart.png"
+
+
+def test_upload_rejects_content_that_is_not_an_image(client, auth_headers):
+    spooled = spool_files()
+    # The declared content type is ignored, the type is detected from the magic bytes
+    response = client.post("/api/files/upload", headers=auth_headers,
+                           files={"file": ("chart.png", b"plain text, not a picture" * 10, "image/png")})
+    assert response.status_code == 415
+    assert spool_files() == spooled
+
+
+def test_upload_rejects_too_large_file(client, auth_headers, monkeypatch):
+    monkeypatch.setattr("backend.routers.file_upload.UPLOAD_MAX_FILE_BYTES", 1024)
+    spooled = spool_files()
+    response = client.post("/api/files/upload", headers=auth_headers,
+                           files={"file": ("noise.png", png_bytes(size=(64, 48)) + os.urandom(4096), "image/png")})
+    assert response.status_code == 413
+    assert spool_files() == spooled
+
+
+def test_reader_stops_streaming_at_the_size_limit(client):
+    body = multipart_body(png_bytes() + os.urandom(64 * 1024))
+    reader = MultipartUploadReader(BOUNDARY, max_file_bytes=16 * 1024)
+    with pytest.raises(HTTPException) as error:
+        for start in range(0, len(body), 1024):
+            reader.write(body[start:start + 1024])
+    assert error.value.status_code == 413
+    path = reader.upload.path
+    reader.abort()
+    assert not os.path.exists(path)
+
+
+def test_reader_rejects_magic_bytes_before_the_part_ends(client):
+    reader = MultipartUploadReader(BOUNDARY, max_file_bytes=1024 * 1024)
+    with pytest.raises(HTTPException) as error:
+        # Only the beginning of the part is sent, the type is checked as soon as enough bytes arrived
+        reader.write(multipart_body(b"GIF00" + b"x" * 4096)[:1024])
+    assert error.value.status_code == 415
+    reader.abort()
+
+
+def test_reader_accepts_image(client):
+    data = png_bytes()
+    reader = MultipartUploadReader(BOUNDARY, max_file_bytes=1024 * 1024)
+    reader.write(multipart_body(data))
+    upload = reader.finish()
+    try:
+        assert upload.size == len(data)
+        assert upload.mime_type == "image/png"
+        assert upload.file_name == "image.png"
+    finally:
+        upload.discard()
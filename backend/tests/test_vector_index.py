@@ -0,0 +1,82 @@
+import numpy as np
+from backend.core.vector_index import IVF_MIN_TRAIN_VECTORS, IVFIndex
+
+DIMENSION = 64
+CLUSTERS = 200
+VECTORS = 20000
+QUERIES = 100
+K = 10
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def clustered_vectors(generator: np.random.Generator, count: int) -> np.ndarray:
+    """Unit vectors around random centers, like embeddings of similar pictures."""
+    centers = unit(generator.standard_normal((CLUSTERS, DIMENSION)))
+    noise = generator.standard_normal((count, DIMENSION)) * 0.15
+    return unit(centers[generator.integers(CLUSTERS, size=count)] + noise)
+
+
+def build_index(vectors: np.ndarray, owners: np.ndarray) -> IVFIndex:
+    index = IVFIndex(DIMENSION)
+    for file_id, (vector, owner_id) in enumerate(zip(vectors, owners), start=1):
+        index.add(file_id, int(owner_id), vector)
+    assert index.needs_training()
+    index.train()
+    assert index.centroids is not None
+    return index
+
+
+def exact_search(vectors: np.ndarray, query: np.ndarray, k: int, rows: np.ndarray = None) -> set:
+    rows = np.arange(len(vectors)) if rows is None else rows
+    scores = vectors[rows] @ query
+    return {int(rows[i]) + 1 for i in np.argsort(-scores)[:k]}
+
+
+def test_ivf_recall_against_exact_search():
+    generator = np.random.default_rng(1)
+    vectors = clustered_vectors(generator, VECTORS)
+    index = build_index(vectors, np.zeros(VECTORS, np.int64))
+    queries = unit(vectors[generator.choice(VECTORS, QUERIES, replace=False)]
+                   + generator.standard_normal((QUERIES, DIMENSION)) * 0.05)
+
+    found = 0
+    for query in queries:
+        results = index.search(query, K)
+        assert len(results) == K
+        scores = [score for _, score in results]
+        assert scores == sorted(scores, reverse=True)
+        found += len({file_id for file_id, _ in results} & exact_search(vectors, query, K))
+    assert found / (QUERIES * K) >= 0.9
+
+
+def test_ivf_owner_filter_and_remove():
+    generator = np.random.default_rng(2)
+    vectors = clustered_vectors(generator, IVF_MIN_TRAIN_VECTORS)
+    owners = generator.integers(1, 4, size=len(vectors))
+    index = build_index(vectors, owners)
+
+    query = vectors[0]
+    results = index.search(query, K, owner_id=int(owners[0]), exact_below=len(vectors))
+    assert {file_id for file_id, _ in results} == exact_search(vectors, query, K, np.flatnonzero(owners == owners[0]))
+    assert results[0][0] == 1
+
+    index.remove(1)
+    assert len(index) == len(vectors) - 1
+    assert 1 not in {file_id for file_id, _ in index.search(query, K)}
+    # The row of the removed vector is reused by the last one, which is still found
+    last = len(vectors)
+    assert index.search(vectors[last - 1], 1)[0][0] == last
+
+
+def test_small_index_searches_exactly():
+    generator = np.random.default_rng(3)
+    vectors = clustered_vectors(generator, 500)
+    index = IVFIndex(DIMENSION)
+    for file_id, vector in enumerate(vectors, start=1):
+        index.add(file_id, 1, vector)
+    index.train()
+    assert index.centroids is None
+    assert {file_id for file_id, _ in index.search(vectors[7], K)} == exact_search(vectors, vectors[7], K)
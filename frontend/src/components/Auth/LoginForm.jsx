@@ -26,6 +26,7 @@ const LoginForm = () => {
 
             const data = await response.json();
             localStorage.setItem("token", data.access_token); // Zapis tokena JWT
+            localStorage.setItem("refreshToken", data.refresh_token);
             navigate("/dashboard"); // Przekierowanie po zalogowaniu
         } catch (error) {
             setServerError(error.message);
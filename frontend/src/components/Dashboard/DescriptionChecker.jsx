@@ -121,33 +121,18 @@ const DescriptionChecker = () => {
 
     try {
       const token = localStorage.getItem("token");
-      const userResponse = await fetch("http://127.0.0.1:8000/api/users/me", {
-        headers: { Authorization: `Bearer ${token}` },
-      });
-
-      if (!userResponse.ok) {
-        const errorResponse = await userResponse.json();
-        throw new Error(errorResponse.detail || "Failed to fetch user details");
-      }
-
-      const userData = await userResponse.json();
-      const userId = userData.id;
-
-      const payload = {
-        user_id: userId,
-        file_name: inputType === "file" ? selectedFile.name : "twitter_image",
-        uploaded_text: textInput.trim(),
-        file: await fetchImageAsBase64(previewUrl),
-      };
-
-      console.log("Payload being sent:", payload);
+      const formData = new FormData();
+      formData.append(
+        "file",
+        inputType === "file" ? selectedFile : await fetchImageAsBlob(previewUrl),
+        inputType === "file" ? selectedFile.name : "twitter_image"
+      );
+      formData.append("uploaded_text", textInput.trim());
 
-      const response = await fetch("http://127.0.0.1:8000/api/files", {
+      const response = await fetch("http://127.0.0.1:8000/api/files/upload", {
         method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify(payload),
+        headers: { Authorization: `Bearer ${token}` },
+        body: formData,
       });
 
       if (!response.ok) {
@@ -200,15 +185,12 @@ const DescriptionChecker = () => {
     }
   };
 
-  const fetchImageAsBase64 = async (url) => {
+  const fetchImageAsBlob = async (url) => {
     const response = await fetch(url);
-    const blob = await response.blob();
-    return new Promise((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onloadend = () => resolve(reader.result.split(",")[1]);
-      reader.onerror = reject;
-      reader.readAsDataURL(blob);
-    });
+    if (!response.ok) {
+      throw new Error("Failed to fetch the image.");
+    }
+    return await response.blob();
   };
 
   return (
@@ -87,31 +87,16 @@ const GenerateDescription = () => {
         }
     };
 
-    const convertFileToBase64 = (file) => {
-        return new Promise((resolve, reject) => {
-            const reader = new FileReader();
-            reader.onloadend = () => resolve(reader.result.split(",")[1]);
-            reader.onerror = reject;
-            reader.readAsDataURL(file);
-        });
-    };
-
-    const convertUrlToBase64 = async (url) => {
+    const fetchImageAsBlob = async (url) => {
         try {
             const response = await fetch(url);
             if (!response.ok) {
                 throw new Error("Failed to fetch the image from the URL.");
             }
-            const blob = await response.blob();
-            return new Promise((resolve, reject) => {
-                const reader = new FileReader();
-                reader.onloadend = () => resolve(reader.result.split(",")[1]);
-                reader.onerror = reject;
-                reader.readAsDataURL(blob);
-            });
+            return await response.blob();
         } catch (error) {
-            console.log("Error converting URL to Base64: ", error.message);
-            throw new Error("Failed to convert URL to Base64.");
+            console.log("Error fetching image from URL: ", error.message);
+            throw new Error("Failed to fetch the image from the URL.");
         }
     };
 
@@ -126,40 +111,18 @@ const GenerateDescription = () => {
 
         try {
             const token = localStorage.getItem("token");
-            const userResponse = await fetch("http://127.0.0.1:8000/api/users/me", {
-                headers: { Authorization: `Bearer ${token}` },
-            });
-
-            if (!userResponse.ok) {
-                throw new Error("Failed to fetch user details");
-            }
-
-            const userData = await userResponse.json();
-            const userId = userData.id;
-
-            let base64File;
-
+            const formData = new FormData();
             if (selectedFile) {
-                base64File = await convertFileToBase64(selectedFile);
-            } else if (imageUrl.trim()) {
-                base64File = await convertUrlToBase64(imageUrl.trim());
+                formData.append("file", selectedFile, selectedFile.name);
+            } else {
+                formData.append("file", await fetchImageAsBlob(imageUrl.trim()), "image_from_url");
             }
+            formData.append("uploaded_text", "");
 
-            const payload = {
-                user_id: userId,
-                file_name: selectedFile ? selectedFile.name : "image_from_url",
-                uploaded_text: "",
-                file: base64File,
-            };
-
-            console.log("Payload being sent:", payload);
-
-            const response = await fetch("http://127.0.0.1:8000/api/files", {
+            const response = await fetch("http://127.0.0.1:8000/api/files/upload", {
                 method: "POST",
-                headers: {
-                    "Content-Type": "application/json",
-                },
-                body: JSON.stringify(payload),
+                headers: { Authorization: `Bearer ${token}` },
+                body: formData,
             });
 
             if (!response.ok) {
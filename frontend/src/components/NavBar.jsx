@@ -5,8 +5,22 @@ import {Button} from "@mui/material";
 const NavBar = () => {
     const navigate = useNavigate();
 
-    const handleLogout = () => {
+    const handleLogout = async () => {
+        const token = localStorage.getItem("token");
+        const refreshToken = localStorage.getItem("refreshToken");
+        if (token) {
+            // Revokes both tokens on the server, the user is logged out locally even if this fails
+            await fetch("http://127.0.0.1:8000/api/logout", {
+                method: "POST",
+                headers: {
+                    "Content-Type": "application/json",
+                    Authorization: `Bearer ${token}`,
+                },
+                body: JSON.stringify({ refresh_token: refreshToken }),
+            }).catch(() => {});
+        }
         localStorage.removeItem("token");
+        localStorage.removeItem("refreshToken");
         navigate("/login");
     }
     return (
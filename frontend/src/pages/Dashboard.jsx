@@ -7,15 +7,19 @@ const Dashboard = () => {
     const [selectedFile, setSelectedFile] = useState(null);
     const [error, setError] = useState("");
     const [isModalOpen, setIsModalOpen] = useState(false);
+    const [nextCursor, setNextCursor] = useState(null);
 
 
     const analysisResultRef = useRef(null);
     const uploadedTextRef = useRef(null);
 
-    const fetchUserFiles = async () => {
+    const fetchUserFiles = async (cursor = null) => {
         try {
             const token = localStorage.getItem("token");
-            const response = await fetch("http://127.0.0.1:8000/api/user_files", {
+            const url = cursor
+                ? `http://127.0.0.1:8000/api/user_files?cursor=${encodeURIComponent(cursor)}`
+                : "http://127.0.0.1:8000/api/user_files";
+            const response = await fetch(url, {
                 headers: {
                     Authorization: `Bearer ${token}`,
                 },
@@ -26,7 +30,9 @@ const Dashboard = () => {
             }
 
             const data = await response.json();
-            setUserFiles(data);
+            // Files are returned page by page, the next page is requested with the cursor from this header
+            setNextCursor(response.headers.get("X-Next-Cursor"));
+            setUserFiles((files) => (cursor ? [...files, ...data] : data));
         } catch (err) {
             console.error("Error fetching user files:", err.message);
             setError(err.message);
@@ -121,6 +127,13 @@ const Dashboard = () => {
                         </div>
                     ))}
                 </div>
+                {nextCursor && (
+                    <div className="text-center">
+                        <button className="btn btn-outline-light" onClick={() => fetchUserFiles(nextCursor)}>
+                            Load more
+                        </button>
+                    </div>
+                )}
             </div>
             {isModalOpen && selectedFile && (
                 <div className="modal-overlay">
@@ -132,7 +145,7 @@ const Dashboard = () => {
                         <div className="modal-body">
                             <div className="image-container">
                                 <img
-                                    src={selectedFile.file_preview}
+                                    src={`http://127.0.0.1:8000/api/files/${selectedFile.id}?size=1024&format=webp`} // Full image is loaded on demand
                                     alt={selectedFile.file_name}
                                     className="modal-image"
                                 />